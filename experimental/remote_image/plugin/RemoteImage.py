@@ -36,10 +36,11 @@ class RemoteImage(AstroImage):
         # this will set our local wcs
         self.update_keywords(ahdr)
 
-    def _set_minmax(self, noinf=False):
-        self.minval, self.maxval = self._proxy.get_minmax(self.id, noinf=False)
-        (self.minval_noinf,
-         self.maxval_noinf) = self._proxy.get_minmax(self.id, noinf=True)
+    def _calc_minmax(self, stats):
+        stats.minval, stats.maxval = self._proxy.get_minmax(self.id,
+                                                            noinf=False)
+        (stats.minval_noinf,
+         stats.maxval_noinf) = self._proxy.get_minmax(self.id, noinf=True)
 
     def _get_data(self):
         if self._data is None:
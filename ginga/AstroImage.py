@@ -22,6 +22,15 @@ class AstroHeader(Header):
     pass
 
 
+def to_native_byteorder(data):
+    """Return `data`, or a copy of it in native byte order if it is
+    not already (FITS data, for example, is big-endian).
+    """
+    if data.dtype.isnative:
+        return data
+    return data.astype(data.dtype.newbyteorder('='))
+
+
 class AstroImage(BaseImage):
     """
     Abstraction of an astronomical data (image).
@@ -42,7 +51,8 @@ class AstroImage(BaseImage):
 
     def __init__(self, data_np=None, metadata=None, logger=None,
                  name=None, wcsclass=None, ioclass=None,
-                 inherit_primary_header=False, save_primary_header=True):
+                 inherit_primary_header=False, save_primary_header=True,
+                 native_byteorder=False):
 
         BaseImage.__init__(self, data_np=data_np, metadata=metadata,
                            logger=logger, name=name)
@@ -77,12 +87,16 @@ class AstroImage(BaseImage):
             header = self.get_header()
             self.wcs.load_header(header)
 
+        # byte swap non-native (e.g. big-endian FITS) data on loading
+        self.native_byteorder = native_byteorder
+
         # For navigating multidimensional data
         self.naxispath = []
         self.revnaxis = []
         self._md_data = None
+        self._swap_slices = False
 
-    def setup_data(self, data, naxispath=None):
+    def setup_data(self, data, naxispath=None, native_byteorder=None):
         # initialize data attribute to something reasonable
         if data is None:
             data = np.zeros((0, 0))
@@ -94,6 +108,18 @@ class AstroImage(BaseImage):
             # Expand 1D arrays into 1xN array
             data = data.reshape((1, data.shape[0]))
 
+        if native_byteorder is None:
+            native_byteorder = self.native_byteorder
+        self._swap_slices = False
+        if native_byteorder and not data.dtype.isnative:
+            if len(data.shape) <= 2:
+                # swap the whole image once
+                data = to_native_byteorder(data)
+            else:
+                # leave (possibly memory mapped) cubes alone and swap
+                # only the slices that are accessed
+                self._swap_slices = True
+
         # this is a handle to the full data array
         self._md_data = data
 
@@ -111,7 +137,7 @@ class AstroImage(BaseImage):
         self.set_naxispath(naxispath)
 
     def load_hdu(self, hdu, fobj=None, naxispath=None,
-                 inherit_primary_header=None):
+                 inherit_primary_header=None, native_byteorder=None):
 
         if self.io is None:
             # need image loader for the fromHDU() call below
@@ -137,7 +163,8 @@ class AstroImage(BaseImage):
 
             self.io.fromHDU(fobj[0], self._primary_hdr)
 
-        self.setup_data(hdu.data, naxispath=naxispath)
+        self.setup_data(hdu.data, naxispath=naxispath,
+                        native_byteorder=native_byteorder)
 
         # Try to make a wcs object on the header
         if hasattr(self, 'wcs') and self.wcs is not None:
@@ -190,11 +217,13 @@ class AstroImage(BaseImage):
 
         self.io.load_file(filespec, dstobj=self, **kwargs)
 
-    def load_data(self, data_np, naxispath=None, metadata=None):
+    def load_data(self, data_np, naxispath=None, metadata=None,
+                  native_byteorder=None):
 
         self.clear_metadata()
 
-        self.setup_data(data_np, naxispath=naxispath)
+        self.setup_data(data_np, naxispath=naxispath,
+                        native_byteorder=native_byteorder)
 
         if metadata is not None:
             self.update_metadata(metadata)
@@ -225,6 +254,9 @@ class AstroImage(BaseImage):
             raise ImageError(
                 "naxispath does not lead to a 2D slice: {}".format(naxispath))
 
+        if self._swap_slices:
+            data = to_native_byteorder(data)
+
         self.naxispath = naxispath
         self.revnaxis = revnaxis
 
@@ -538,11 +570,18 @@ class AstroImage(BaseImage):
 
         scale_x, scale_y = math.fabs(cdelt1_ref), math.fabs(cdelt2_ref)
 
+        # update the min/max with those of the pieces, rather than scan
+        # the whole mosaic again; unless they have not been computed yet
+        minmax = None
+        if update_minmax and self.has_stats():
+            minmax = list(self.get_minmax())
+
         # drop each image in the right place in the new data array
         mydata = self._get_data()
 
         count = 1
         res = []
+        expanded = False
         for image in imagelist:
             name = image.get('name', 'image%d' % (count))
             count += 1
@@ -573,11 +612,11 @@ class AstroImage(BaseImage):
                 data_np = data_np + bg_inc
 
             # Determine max/min to update our values
-            if update_minmax:
+            if minmax is not None:
                 maxval = np.nanmax(data_np)
                 minval = np.nanmin(data_np)
-                self.maxval = max(self.maxval, maxval)
-                self.minval = min(self.minval, minval)
+                minmax = [np.fmin(minmax[0], minval),
+                          np.fmax(minmax[1], maxval)]
 
             # Get rotation and scale of piece
             header = image.get_header()
@@ -707,6 +746,7 @@ class AstroImage(BaseImage):
                     mydata
                 self._data = new_data
                 mydata = new_data
+                expanded = True
 
                 if (nx1_off > 0) or (ny1_off > 0):
                     # Adjust our WCS for relocation of the reference pixel
@@ -730,15 +770,19 @@ class AstroImage(BaseImage):
 
             res.append((xlo, ylo, xhi, yhi))
 
-        # TODO: recalculate min and max values
-        # Can't use usual techniques because it adds too much time to the
-        # mosacing
-        #self._set_minmax()
-
-        # Notify watchers that our data has changed
-        if not suppress_callback:
+        # Notify watchers that our data has changed, and where
+        regions = None if expanded else list(res)
+        if suppress_callback:
+            self.bump_generation(regions=regions)
+        else:
+            if regions is not None:
+                for region in regions:
+                    self.note_modified_region(*region)
             self.make_callback('modified')
 
+        if minmax is not None:
+            self.set_minmax(minmax[0], minmax[1])
+
         return res
 
     def info_xy(self, data_x, data_y, settings):
@@ -4,8 +4,13 @@
 # This is open-source software licensed under a BSD license.
 # Please see the file LICENSE.txt for details.
 #
-import numpy as np
+import math
 import threading
+import warnings
+import weakref
+from collections import OrderedDict
+
+import numpy as np
 
 from ginga.misc import Bunch
 #from ginga.misc.ParamSet import Param
@@ -24,15 +29,122 @@ except ImportError:
 # Lock to work around a non-threadsafe bug in scipy
 _lock = threading.RLock()
 
+# Cut levels calculated for images, keyed by the image data generation and
+# the parameters of the method (see AutoCutsBase.get_cached_levels())
+_levels_cache = OrderedDict()
+_levels_cache_size = 64
+_levels_cache_lock = threading.RLock()
+
 
 class Param(Bunch.Bunch):
     pass
 
 
+def sample_data(data, num_points, method='stratified', seed=0):
+    """Take a sample of about `num_points` pixels spread over all of
+    `data`, in bounded time regardless of the size of the data.
+
+    Parameters
+    ----------
+    data : ndarray
+        The data (2D, or greater with the sampled axes first).
+
+    num_points : int or None
+        The sample budget.  The sample has at most this many pixels; if
+        `None` or at least the size of the data, `data` is returned.
+
+    method : str (optional, defaults to 'stratified')
+        'grid' takes an evenly strided view of the data.  'stratified'
+        divides the data into cells of the same size and picks a (seeded)
+        random row and column within each, which avoids aliasing with
+        periodic structure in the data.
+
+    seed : int (optional, defaults to 0)
+        Random seed, so that repeated samples of the same data are equal.
+
+    Returns
+    -------
+    sample : ndarray
+        A 2D (or greater) array of sampled pixels.
+    """
+    ht, wd = data.shape[:2]
+    total_px = ht * wd
+    if (num_points is None) or (total_px <= num_points):
+        return data
+
+    num_points = max(num_points, 1)
+    step = int(np.ceil(np.sqrt(total_px / float(num_points))))
+    while -(-ht // step) * -(-wd // step) > num_points:
+        step += 1
+    if method == 'grid':
+        return data[::step, ::step]
+
+    if method != 'stratified':
+        raise AutoCutsError("Sampling method '%s' is not supported" % (
+            method))
+
+    rs = np.random.RandomState(seed)
+    rows = np.arange(0, ht, step)
+    rows += rs.randint(0, step, len(rows))
+    cols = np.arange(0, wd, step)
+    cols += rs.randint(0, step, len(cols))
+    return data[np.ix_(np.minimum(rows, ht - 1), np.minimum(cols, wd - 1))]
+
+
 class AutoCutsError(Exception):
     pass
 
 
+# largest range of integer values counted with np.bincount
+max_bincount_span = 1 << 22
+
+
+def histogram_fixed(data, numbins, lo, hi):
+    """Histogram `data` in `numbins` equal bins over the fixed range
+    `lo` to `hi`, as ``np.histogram(data, bins=numbins, range=(lo, hi))``
+    does, in a single pass and without copying the data: NaNs (and any
+    values outside the range) are not counted.  Integer data is counted
+    with `np.bincount` when the range of values is not much larger than
+    the data, for which the range must cover all of the values.
+
+    Returns
+    -------
+    (dist, bins) : tuple of ndarray
+        The counts and the bin edges.
+    """
+    if data.dtype.kind in 'iu':
+        lo_i, hi_i = int(math.floor(lo)), int(math.ceil(hi))
+        span = hi_i - lo_i + 1
+        if span <= min(max_bincount_span, max(data.size, numbins)):
+            idx = data.ravel().astype(np.intp)
+            if lo_i != 0:
+                idx -= lo_i
+            counts = np.bincount(idx, minlength=span)
+            # bin the counts of each value exactly as np.histogram would
+            # bin the values themselves
+            values = np.arange(lo_i, hi_i + 1)
+            dist, bins = np.histogram(values, bins=numbins, range=(lo, hi),
+                                      weights=counts)
+            return dist.astype(np.int64), bins
+
+    return np.histogram(data, bins=numbins, range=(lo, hi))
+
+
+# funky boolean converter
+_bool = lambda st: str(st).lower() == 'true'  # noqa
+
+# sampling parameters shared by methods that sample the whole image
+sample_params = [
+    Param(name='sample_points', type=int,
+          default=250000, allow_none=True,
+          description="Number of pixels to sample when not using the crop "
+          "(None: use all)"),
+    Param(name='sample_method', type=str,
+          valid=['stratified', 'grid'], default='stratified',
+          description="How to sample the whole image"),
+]
+
+
 class AutoCutsBase(object):
 
     @classmethod
@@ -45,6 +157,9 @@ class AutoCutsBase(object):
         self.logger = logger
         self.kind = 'base'
         self.crop_radius = 512
+        # shared whole image sampling (see get_sample())
+        self.sample_points = 250000
+        self.sample_method = 'stratified'
 
     def update_params(self, **param_dict):
         # TODO: find a cleaner way to update these
@@ -57,6 +172,27 @@ class AutoCutsBase(object):
         loval, hival = self.calc_cut_levels(image)
         return loval, hival
 
+    def get_cached_levels(self, image, params, calc_fn):
+        """Return the cut levels calculated by `calc_fn()`, caching them
+        by the generation of the image data (which is unique within the
+        process) and `params`, a tuple of the parameters that affect them.
+        The cache is shared by all instances, so it survives channel
+        switches and the objects being recreated when preferences change.
+        """
+        key = (self.kind, image.get_generation()) + tuple(params)
+        with _levels_cache_lock:
+            if key in _levels_cache:
+                _levels_cache.move_to_end(key)
+                return _levels_cache[key]
+
+        levels = calc_fn()
+
+        with _levels_cache_lock:
+            _levels_cache[key] = levels
+            while len(_levels_cache) > _levels_cache_size:
+                _levels_cache.popitem(last=False)
+        return levels
+
     def get_crop(self, image, crop_radius=None):
         # Even with numpy, it's kind of slow for some of the autocut
         # methods on a large image, so in those cases we can optionally
@@ -70,10 +206,42 @@ class AutoCutsBase(object):
                                                      crop_radius)
         return data
 
-    def cut_levels(self, data, loval, hival, vmin=0.0, vmax=255.0):
+    def get_sample(self, image, num_points=None, method=None):
+        """Take a sample of the image data with :func:`sample_data`,
+        with the budget and method given by the `sample_points` and
+        `sample_method` attributes, unless they are passed.
+        """
+        if num_points is None:
+            num_points = self.sample_points
+        if method is None:
+            method = self.sample_method
+        return sample_data(image.get_data(), num_points, method=method)
+
+    def cut_levels(self, data, loval, hival, vmin=0.0, vmax=255.0,
+                   dtype=None):
+        """Scale `data` between cut levels `loval` and `hival` to the
+        range 0..`vmax`.  If `dtype` (e.g. np.float32) is given, the
+        result is of that floating point type and no larger intermediate
+        arrays are made; otherwise it is float64, or the type of floating
+        point data.
+        """
         loval, hival = float(loval), float(hival)
         self.logger.debug("loval=%.2f hival=%.2f" % (loval, hival))
         delta = hival - loval
+        if dtype is not None:
+            # subtract at the precision of the data, keeping only the
+            # result in the requested type
+            f = np.empty(data.shape, dtype=dtype)
+            np.subtract(data, loval, out=f)
+            if delta != 0.0:
+                f *= vmax / delta
+                f.clip(0.0, vmax, out=f)
+            else:
+                # threshold
+                np.copyto(f, vmax, where=(f > 0) | np.isnan(f))
+                f.clip(0.0, vmax, out=f)
+            return f
+
         if delta != 0.0:
             data = data.clip(loval, hival)
             f = ((data - loval) / delta)
@@ -105,7 +273,10 @@ class Clip(AutoCutsBase):
 
         return (float(loval), float(hival))
 
-    def cut_levels(self, data, loval, hival, vmin=0.0, vmax=255.0):
+    def cut_levels(self, data, loval, hival, vmin=0.0, vmax=255.0,
+                   dtype=None):
+        if dtype is not None:
+            return np.clip(data, vmin, vmax, out=np.empty(data.shape, dtype))
         return data.clip(vmin, vmax)
 
 
@@ -137,15 +308,25 @@ class Histogram(AutoCutsBase):
             Param(name='numbins', type=int,
                   min=100, max=10000, default=2048,
                   description="Number of bins for the histogram"),
-        ]
+            Param(name='incremental', type=_bool,
+                  valid=[True, False],
+                  default=False,
+                  description="Keep the histogram of the whole image and "
+                  "update just the modified parts (when not sampling)"),
+        ] + sample_params
 
-    def __init__(self, logger, usecrop=True, pct=0.999, numbins=2048):
+    def __init__(self, logger, usecrop=True, pct=0.999, numbins=2048,
+                 incremental=False):
         super(Histogram, self).__init__(logger)
 
         self.kind = 'histogram'
         self.usecrop = usecrop
         self.pct = pct
         self.numbins = numbins
+        self.incremental = incremental
+        # histograms of tiles of the last image, for incremental updates
+        self.tile_size = 512
+        self._tiles = None
 
     def calc_cut_levels(self, image):
         if self.usecrop:
@@ -155,17 +336,43 @@ class Histogram(AutoCutsBase):
                 # if we have less than 50% finite pixels then fall back
                 # to using the whole array
                 self.logger.debug("too many non-finite values in crop--"
-                                  "falling back to full image data")
-                data = image.get_data()
+                                  "falling back to sampling whole image")
+                data = None
         else:
-            data = image.get_data()
-        bnch = self.calc_histogram(data, pct=self.pct, numbins=self.numbins)
+            data = None
+
+        if data is None:
+            data = self.get_sample(image)
+            if self.incremental and data is image.get_data() and \
+               len(data.shape) == 2:
+                bnch = self.calc_histogram_incremental(image, pct=self.pct,
+                                                       numbins=self.numbins)
+                return bnch.loval, bnch.hival
+
+            # use the image's statistics, if we have them or are going
+            # to look at all of the data anyway, to skip scans of the data
+            data_range = None
+            if image.has_stats() or data is image.get_data():
+                stats = image.get_stats()
+                if stats.minval == stats.minval_noinf and \
+                   stats.maxval == stats.maxval_noinf and \
+                   image.get_nan_count() == 0:
+                    data_range = (stats.minval, stats.maxval)
+            bnch = self.calc_histogram(data, pct=self.pct,
+                                       numbins=self.numbins,
+                                       data_range=data_range)
+        else:
+            bnch = self.calc_histogram(data, pct=self.pct,
+                                       numbins=self.numbins)
         loval, hival = bnch.loval, bnch.hival
 
         return loval, hival
 
-    def calc_histogram(self, data, pct=1.0, numbins=2048):
-
+    def calc_histogram(self, data, pct=1.0, numbins=2048, data_range=None):
+        """Calculate the cut levels retaining `pct` of the histogram of
+        `data`.  If `data_range` is given, it is the (min, max) of `data`,
+        which is then known to be all finite.
+        """
         self.logger.debug("Computing histogram, pct=%.4f numbins=%d" % (
             pct, numbins))
         height, width = data.shape[:2]
@@ -173,13 +380,32 @@ class Histogram(AutoCutsBase):
             width, height))
 
         total_px = width * height
-        dsum = np.sum(data)
-        if np.isnan(dsum) or np.isinf(dsum):
-            # Oh crap, the array has a NaN or Inf value.
+        if data_range is not None:
+            # known finite, with known range: no scans needed
+            dist, bins = histogram_fixed(data, numbins, *data_range)
+            return self.calc_cuts_from_histogram(dist, bins, total_px, pct)
+
+        with warnings.catch_warnings():
+            # all NaN data is handled below
+            warnings.simplefilter('ignore', RuntimeWarning)
+            minval, maxval = np.nanmin(data), np.nanmax(data)
+
+        if np.isfinite(minval) and np.isfinite(maxval):
+            # NaNs fall outside the range and are not counted in this
+            # single pass; count them as the midpoint of the range, as
+            # the workaround below does
+            dist, bins = histogram_fixed(data, numbins, minval, maxval)
+            num_nan = total_px - dist.sum()
+            if num_nan > 0:
+                dist += num_nan * self._get_nan_bin(numbins, minval, maxval,
+                                                    data.dtype)
+
+        else:
+            # Oh crap, the array has an Inf value (or nothing but NaNs).
             # We have to workaround this by making a copy of the array
             # and substituting for the problem values, otherwise numpy's
             # histogram() cannot handle it
-            self.logger.warning("NaN's found in data, using workaround for histogram")
+            self.logger.warning("Inf's found in data, using workaround for histogram")
             data = data.copy()
             # TODO: calculate a reasonable replacement value
             data[np.isinf(data)] = 0.0
@@ -188,16 +414,112 @@ class Histogram(AutoCutsBase):
             substval = (minval + maxval) / 2.0
             data[np.isnan(data)] = substval
             data[np.isinf(data)] = substval
-            ## dsum = np.sum(data)
-            ## if np.isnan(dsum) or np.isinf(dsum):
-            ##     print "NaNs STILL PRESENT"
 
             dist, bins = np.histogram(data, bins=numbins,
                                       density=False)
-        else:
-            dist, bins = np.histogram(data, bins=numbins,
-                                      density=False)
 
+        return self.calc_cuts_from_histogram(dist, bins, total_px, pct)
+
+    def _get_nan_bin(self, numbins, minval, maxval, dtype):
+        # the bin that NaNs are counted in
+        substval = np.array([(minval + maxval) / 2.0], dtype=dtype)
+        return np.histogram(substval, bins=numbins,
+                            range=(minval, maxval))[0]
+
+    def calc_histogram_incremental(self, image, pct=1.0, numbins=2048):
+        """Like `calc_histogram` on all of the (2D) data of `image`, but
+        keeping histograms of tiles of the image.  When the image is next
+        modified in place (see
+        `~ginga.BaseImage.BaseImage.note_modified_region`), only the tiles
+        that changed are counted again, as long as their values stay
+        within the range of the histogram.
+        """
+        data = image.get_data()
+        ht, wd = data.shape[:2]
+        tiles = self._update_tiles(image, data, numbins)
+        if tiles is None:
+            return self.calc_histogram(data, pct=pct, numbins=numbins)
+
+        dist = tiles.counts.sum(axis=(0, 1), dtype=np.int64)
+        num_nan = tiles.nans.sum()
+        if num_nan > 0:
+            dist += num_nan * self._get_nan_bin(numbins, tiles.lo, tiles.hi,
+                                                data.dtype)
+        return self.calc_cuts_from_histogram(dist, tiles.bins, wd * ht, pct)
+
+    def _count_tile(self, tiles, j, i, data):
+        ts = self.tile_size
+        tile = data[j * ts:(j + 1) * ts, i * ts:(i + 1) * ts]
+        tiles.counts[j, i], bins = histogram_fixed(tile, tiles.numbins,
+                                                   tiles.lo, tiles.hi)
+        tiles.nans[j, i] = tile.size - tiles.counts[j, i].sum()
+        return bins
+
+    def _update_tiles(self, image, data, numbins):
+        ht, wd = data.shape[:2]
+        ts = self.tile_size
+        generation = image.get_generation()
+
+        tiles = self._tiles
+        regions = None
+        if (tiles is not None and tiles.image_ref() is image and
+                tiles.shape == data.shape and tiles.numbins == numbins):
+            if tiles.generation == generation:
+                return tiles
+            regions = image.get_modified_regions(tiles.generation)
+
+        if regions is not None:
+            # count just the tiles touched by the modified regions again
+            indexes = set([])
+            for x1, y1, x2, y2 in regions:
+                x1, y1 = max(x1, 0), max(y1, 0)
+                x2, y2 = min(x2, wd), min(y2, ht)
+                for j in range(y1 // ts, (y2 - 1) // ts + 1):
+                    for i in range(x1 // ts, (x2 - 1) // ts + 1):
+                        indexes.add((j, i))
+
+            in_range = True
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                for j, i in indexes:
+                    tile = data[j * ts:(j + 1) * ts, i * ts:(i + 1) * ts]
+                    minval, maxval = np.nanmin(tile), np.nanmax(tile)
+                    if not (np.isnan(minval) or
+                            (tiles.lo <= minval and maxval <= tiles.hi)):
+                        in_range = False
+                        break
+
+            if in_range:
+                for j, i in indexes:
+                    self._count_tile(tiles, j, i, data)
+                tiles.generation = generation
+                return tiles
+
+        # count all the tiles
+        self._tiles = None
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            minval, maxval = np.nanmin(data), np.nanmax(data)
+        if not (np.isfinite(minval) and np.isfinite(maxval)):
+            return None
+
+        ny, nx = -(-ht // ts), -(-wd // ts)
+        tiles = Bunch.Bunch(image_ref=weakref.ref(image),
+                            generation=generation, shape=data.shape,
+                            numbins=numbins, lo=minval, hi=maxval,
+                            counts=np.zeros((ny, nx, numbins), dtype=np.int32),
+                            nans=np.zeros((ny, nx), dtype=np.int64),
+                            bins=np.zeros(numbins + 1))
+        for j in range(ny):
+            for i in range(nx):
+                tiles.bins = self._count_tile(tiles, j, i, data)
+        self._tiles = tiles
+        return tiles
+
+    def calc_cuts_from_histogram(self, dist, bins, total_px, pct):
+        """Calculate the cut levels that retain `pct` of the `total_px`
+        pixels counted in the histogram `dist` with bin edges `bins`.
+        """
         cutoff = int((float(total_px) * (1.0 - pct)) / 2.0)
         top = len(dist) - 1
         self.logger.debug("top=%d cutoff=%d" % (top, cutoff))
@@ -274,7 +596,7 @@ class StdDev(AutoCutsBase):
             ##             description="Low subtraction factor"),
             ## Param(name='hensa_hi', type=float, default=90.0,
             ##             description="High subtraction factor"),
-        ]
+        ] + sample_params
 
     def __init__(self, logger, usecrop=True):
         super(StdDev, self).__init__(logger)
@@ -294,10 +616,10 @@ class StdDev(AutoCutsBase):
                 # if we have less than 50% finite pixels then fall back
                 # to using the whole array
                 self.logger.info("too many non-finite values in crop--"
-                                 "falling back to full image data")
-                data = image.get_data()
+                                 "falling back to sampling whole image")
+                data = self.get_sample(image)
         else:
-            data = image.get_data()
+            data = self.get_sample(image)
 
         loval, hival = self.calc_stddev(data, hensa_lo=self.hensa_lo,
                                         hensa_hi=self.hensa_hi)
@@ -333,6 +655,9 @@ class MedianFilter(AutoCutsBase):
                   description="Number of points to sample"),
             Param(name='length', type=int, default=5,
                   description="Median kernel length"),
+            Param(name='sample_method', type=str,
+                  valid=['grid', 'stratified'], default='grid',
+                  description="How to sample the image"),
         ]
 
     def __init__(self, logger, num_points=2000, length=5):
@@ -341,19 +666,12 @@ class MedianFilter(AutoCutsBase):
         self.kind = 'median'
         self.num_points = num_points
         self.length = length
+        self.sample_method = 'grid'
 
     def calc_cut_levels(self, image):
-        wd, ht = image.get_size()
-
-        # sample the data
-        xmax = wd - 1
-        ymax = ht - 1
-        # evenly spaced sampling over rows and cols
-        xskip = int(max(1.0, np.sqrt(xmax * ymax / float(self.num_points))))
-        yskip = xskip
-
-        cutout = image.cutout_data(0, 0, xmax, ymax,
-                                   xstep=xskip, ystep=yskip)
+        # sample the data; the grid keeps neighboring samples adjacent
+        # for the median filter
+        cutout = self.get_sample(image, num_points=self.num_points)
 
         loval, hival = self.calc_medianfilter(cutout, length=self.length)
         return loval, hival
@@ -386,6 +704,9 @@ class ZScale(AutoCutsBase):
             Param(name='num_points', type=int,
                   default=1000, allow_none=True,
                   description="Number of points to sample"),
+            Param(name='sample_method', type=str,
+                  valid=['grid', 'stratified'], default='grid',
+                  description="How to sample the image"),
         ]
 
     def __init__(self, logger, contrast=0.25, num_points=1000):
@@ -394,8 +715,14 @@ class ZScale(AutoCutsBase):
         self.kind = 'zscale'
         self.contrast = contrast
         self.num_points = num_points
+        self.sample_method = 'grid'
 
     def calc_cut_levels(self, image):
+        params = (self.contrast, self.num_points, self.sample_method)
+        return self.get_cached_levels(image, params,
+                                      lambda: self._calc_cut_levels(image))
+
+    def _calc_cut_levels(self, image):
         wd, ht = image.get_size()
 
         # calculate num_points parameter, if omitted
@@ -411,18 +738,11 @@ class ZScale(AutoCutsBase):
         assert (0 < num_points <= total_points), \
             AutoCutsError("num_points not in range 0-%d" % (total_points))
 
-        # sample the data
-        xmax = wd - 1
-        ymax = ht - 1
-        # evenly spaced sampling over rows and cols
-        xskip = int(max(1.0, np.sqrt(xmax * ymax / float(num_points))))
-        yskip = xskip
-
-        cutout = image.cutout_data(0, 0, xmax, ymax,
-                                   xstep=xskip, ystep=yskip)
+        # sample the data, evenly spaced over rows and cols by default
+        cutout = self.get_sample(image, num_points=num_points)
 
         loval, hival = self.calc_zscale(cutout, contrast=self.contrast,
-                                        num_points=self.num_points)
+                                        num_points=num_points)
         return loval, hival
 
     def calc_zscale(self, data, contrast=0.25, num_points=1000):
@@ -651,9 +971,6 @@ class ZScale2(AutoCutsBase):
         return (float(locut), float(hicut))
 
 
-# funky boolean converter
-_bool = lambda st: str(st).lower() == 'true'  # noqa
-
 autocuts_table = {
     'clip': Clip,
     'minmax': Minmax,
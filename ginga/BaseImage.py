@@ -4,13 +4,21 @@
 # This is open-source software licensed under a BSD license.
 # Please see the file LICENSE.txt for details.
 #
+import itertools
+from collections import deque
+
 import numpy as np
 import logging
+import threading
 
 from ginga.misc import Bunch, Callback
 from ginga import trcalc, AutoCuts
 
 
+# source of the generation numbers of images, unique within the process
+_generations = itertools.count(1)
+
+
 class ImageError(Exception):
     pass
 
@@ -90,6 +98,25 @@ class BaseImage(ViewerObjectBase):
         self.order = ''
         self.name = name
 
+        # multi-resolution pyramid of block reduced copies of the data,
+        # built on demand (see get_pyramid_level())
+        self.pyramid_min_size = 512
+        self._pyramid = []
+        self._pyramid_gen = 0
+        self._pyramid_building = False
+        self._pyramid_lock = threading.RLock()
+
+        # changes whenever the data does (see get_generation()), with a
+        # short log of the regions changed by each new generation
+        self._generation = next(_generations)
+        self._changes = deque([(self._generation, None)], maxlen=32)
+        self._pending_regions = []
+        self._replacing_data = False
+        self.add_callback('modified', self._modified_cb)
+
+        # statistics of the data, computed on demand (see get_stats())
+        self._stats_lock = threading.RLock()
+        self._stats = Bunch.Bunch(generation=None)
         self._set_minmax()
         self._calc_order(order)
 
@@ -179,8 +206,16 @@ class BaseImage(ViewerObjectBase):
             self.update_metadata(metadata)
 
         self._set_minmax()
+        self.drop_pyramid()
 
-        self.make_callback('modified')
+        self._pending_regions = []
+        self.bump_generation()
+        # the 'modified' callback need not do the above again
+        self._replacing_data = True
+        try:
+            self.make_callback('modified')
+        finally:
+            self._replacing_data = False
 
     def clear_all(self):
         # clear metadata
@@ -188,6 +223,7 @@ class BaseImage(ViewerObjectBase):
 
         # unreference data array
         self._data = np.zeros((1, 1))
+        self.drop_pyramid()
 
     def _slice(self, view):
         view = tuple(view)
@@ -244,37 +280,196 @@ class BaseImage(ViewerObjectBase):
     def has_valid_wcs(self):
         return hasattr(self, 'wcs') and self.wcs.has_valid_wcs()
 
-    def _set_minmax(self):
+    def _set_minmax(self, noinf=False):
+        """Discard the cached statistics of the data; they are computed
+        again when next asked for.  Subclasses that know the statistics
+        without a scan of the data should override `_calc_minmax` instead.
+        """
+        with self._stats_lock:
+            self._stats = Bunch.Bunch(generation=None)
+
+    def _get_stats_cache(self):
+        with self._stats_lock:
+            if self._stats.generation != self._generation:
+                self._stats = Bunch.Bunch(generation=self._generation)
+            return self._stats
+
+    def _calc_minmax(self, stats):
         data = self._get_fast_data()
         try:
-            self.maxval = np.nanmax(data)
-            self.minval = np.nanmin(data)
+            maxval = np.nanmax(data)
+            minval = np.nanmin(data)
         except Exception:
-            self.maxval = 0
-            self.minval = 0
+            maxval = 0
+            minval = 0
 
-        # TODO: see if there is a faster way to ignore infinity
+        maxval_noinf, minval_noinf = maxval, minval
         try:
-            if np.isfinite(self.maxval):
-                self.maxval_noinf = self.maxval
-            else:
-                self.maxval_noinf = np.nanmax(data[np.isfinite(data)])
+            if not (np.isfinite(maxval) and np.isfinite(minval)):
+                finite = data[np.isfinite(data)]
+                if not np.isfinite(maxval):
+                    maxval_noinf = np.nanmax(finite)
+                if not np.isfinite(minval):
+                    minval_noinf = np.nanmin(finite)
         except Exception:
-            self.maxval_noinf = self.maxval
-
-        try:
-            if np.isfinite(self.minval):
-                self.minval_noinf = self.minval
+            pass
+
+        stats.minval, stats.maxval = minval, maxval
+        stats.minval_noinf, stats.maxval_noinf = minval_noinf, maxval_noinf
+
+    def _get_minmax_stats(self):
+        with self._stats_lock:
+            stats = self._get_stats_cache()
+            keys = ('minval', 'maxval', 'minval_noinf', 'maxval_noinf')
+            if not all(key in stats for key in keys):
+                # keep any of them that were set explicitly
+                given = {key: stats[key] for key in keys if key in stats}
+                self._calc_minmax(stats)
+                stats.update(given)
+            return stats
+
+    def _calc_nan_count(self, stats):
+        if 'nan_count' not in stats:
+            data = self._get_data()
+            if data.dtype.kind in 'biu':
+                # integer data is always finite
+                stats.nan_count = 0
             else:
-                self.minval_noinf = np.nanmin(data[np.isfinite(data)])
-        except Exception:
-            self.minval_noinf = self.minval
+                stats.nan_count = np.count_nonzero(np.isnan(data))
+        return stats.nan_count
 
     def get_minmax(self, noinf=False):
+        """Get the minimum and maximum values of the data, ignoring NaNs.
+
+        Parameters
+        ----------
+        noinf : bool (optional, defaults to False)
+            Ignore infinite values as well.
+
+        Returns
+        -------
+        (minval, maxval) : tuple
+            The minimum and maximum values.
+        """
+        stats = self._get_minmax_stats()
         if not noinf:
-            return (self.minval, self.maxval)
-        else:
-            return (self.minval_noinf, self.maxval_noinf)
+            return (stats.minval, stats.maxval)
+        return (stats.minval_noinf, stats.maxval_noinf)
+
+    def get_nan_count(self):
+        """Get the number of NaN values in the data."""
+        with self._stats_lock:
+            return self._calc_nan_count(self._get_stats_cache())
+
+    def get_finite_mask(self):
+        """Get a boolean mask of the finite values in the data.
+
+        Returns
+        -------
+        mask : ndarray or None
+            The mask, or `None` if all values in the data are finite.
+            The mask is computed on each call; only the count of NaNs
+            is kept with the statistics (see `get_nan_count`).
+        """
+        data = self._get_data()
+        if data.dtype.kind in 'biu':
+            # integer data is always finite
+            return None
+        mask = np.isfinite(data)
+        if mask.all():
+            return None
+        return mask
+
+    def get_stats(self, finite_mask=False):
+        """Get statistics of the data.  They are computed on first use and
+        cached until the data changes (see `get_generation`), so this can
+        be called from a background thread to have them ready ahead of use.
+
+        Parameters
+        ----------
+        finite_mask : bool (optional, defaults to False)
+            Include the NaN count and the mask of finite values (which is
+            not cached, see `get_finite_mask`).
+
+        Returns
+        -------
+        stats : `~ginga.misc.Bunch.Bunch`
+            With items ``minval``, ``maxval``, ``minval_noinf``,
+            ``maxval_noinf`` and, if requested, ``nan_count`` and
+            ``finite_mask``.
+        """
+        with self._stats_lock:
+            stats = self._get_minmax_stats()
+            if finite_mask:
+                self._calc_nan_count(stats)
+            res = Bunch.Bunch(stats)
+        del res['generation']
+        if finite_mask:
+            res.finite_mask = self.get_finite_mask()
+        return res
+
+    def has_stats(self):
+        """Return True if the min/max statistics of the current data have
+        already been computed.
+        """
+        with self._stats_lock:
+            stats = self._get_stats_cache()
+            return all(key in stats for key in ('minval', 'maxval',
+                                                'minval_noinf',
+                                                'maxval_noinf'))
+
+    def set_minmax(self, minval, maxval, minval_noinf=None,
+                   maxval_noinf=None):
+        """Set the cached min/max of the current data, for callers that
+        already know them (e.g. after pasting new data into an image) and
+        want to spare a scan of the data.
+        """
+        if minval_noinf is None:
+            minval_noinf = minval
+        if maxval_noinf is None:
+            maxval_noinf = maxval
+        with self._stats_lock:
+            stats = self._get_stats_cache()
+            stats.minval, stats.maxval = minval, maxval
+            stats.minval_noinf, stats.maxval_noinf = minval_noinf, maxval_noinf
+
+    def _set_stat(self, key, value):
+        with self._stats_lock:
+            self._get_stats_cache()[key] = value
+
+    # the min/max can still be assigned, which sets them in the cached
+    # statistics of the current data (like set_minmax())
+    @property
+    def minval(self):
+        return self.get_minmax()[0]
+
+    @minval.setter
+    def minval(self, value):
+        self._set_stat('minval', value)
+
+    @property
+    def maxval(self):
+        return self.get_minmax()[1]
+
+    @maxval.setter
+    def maxval(self, value):
+        self._set_stat('maxval', value)
+
+    @property
+    def minval_noinf(self):
+        return self.get_minmax(noinf=True)[0]
+
+    @minval_noinf.setter
+    def minval_noinf(self, value):
+        self._set_stat('minval_noinf', value)
+
+    @property
+    def maxval_noinf(self):
+        return self.get_minmax(noinf=True)[1]
+
+    @maxval_noinf.setter
+    def maxval_noinf(self, value):
+        self._set_stat('maxval_noinf', value)
 
     # kwargs is needed so subclasses can interoperate with optional keywords.
     def get_header(self, **kwargs):
@@ -442,7 +637,15 @@ class BaseImage(ViewerObjectBase):
                                            method=method)
 
     def get_scaled_cutout(self, x1, y1, x2, y2, scale_x, scale_y,
-                          method='basic', logger=None):
+                          method='basic', logger=None, dtype=None):
+        """Extract a region of the image defined by corners (x1, y1) and
+        (x2, y2) and scale it by scale factors (scale_x, scale_y).
+
+        `method` describes the method of interpolation used.  For methods
+        other than "basic", `dtype` (e.g. np.float32) gives the type of the
+        result, and for a floating point type the precision that it is
+        interpolated at; it defaults to the type of the data.
+        """
         if method in ('basic', 'view'):
             return self.get_scaled_cutout_basic(x1, y1, x2, y2,
                                                 scale_x, scale_y,
@@ -451,19 +654,19 @@ class BaseImage(ViewerObjectBase):
         data = self._get_data()
         newdata, (scale_x, scale_y) = trcalc.get_scaled_cutout_basic(
             data, x1, y1, x2, y2, scale_x, scale_y, interpolation=method,
-            logger=logger)
+            logger=logger, dtype=dtype)
 
         res = Bunch.Bunch(data=newdata, scale_x=scale_x, scale_y=scale_y)
         return res
 
     def get_scaled_cutout2(self, p1, p2, scales,
-                           method='basic', logger=None):
+                           method='basic', logger=None, dtype=None):
 
         if method not in ('basic', 'view') and len(scales) == 2:
             # for 2D images with alternate interpolation requirements
             return self.get_scaled_cutout(p1[0], p1[1], p2[0], p2[1],
                                           scales[0], scales[1],
-                                          method=method)
+                                          method=method, dtype=dtype)
 
         shp = self.shape
 
@@ -479,6 +682,173 @@ class BaseImage(ViewerObjectBase):
 
         return res
 
+    def get_generation(self):
+        """Get the generation number of the image data.
+
+        The number is unique within the process and changes whenever the
+        data is replaced or reported as modified, so it can be used along
+        with the identity of the image to key caches of derived data.
+        """
+        return self._generation
+
+    def bump_generation(self, regions=None):
+        """Give the image data a new generation number.  This is done
+        automatically by `set_data` and on the ``modified`` callback;
+        call it if the data array is modified in place with that
+        callback blocked or suppressed.
+
+        Parameters
+        ----------
+        regions : list of tuple or None (optional)
+            The regions (x1, y1, x2, y2), with exclusive upper bounds,
+            that were modified; `None` (the default) if it is not known
+            or all of the data changed.
+        """
+        self._generation = next(_generations)
+        self._changes.append((self._generation, regions))
+
+    def note_modified_region(self, x1, y1, x2, y2):
+        """Record that the data in a region (with exclusive upper bounds)
+        was modified in place.  Call this before making the ``modified``
+        callback, so that consumers of the data can update just the
+        regions that changed (see `get_modified_regions`).
+        """
+        self._pending_regions.append((x1, y1, x2, y2))
+
+    def get_modified_regions(self, generation):
+        """Get the regions of the data modified since `generation`.
+
+        Returns
+        -------
+        regions : list of tuple or None
+            The regions (x1, y1, x2, y2) that changed, or `None` if that is
+            not known (e.g. the data was replaced, or `generation` is too
+            old) and all of the data should be assumed changed.
+        """
+        res = []
+        known = False
+        for gen, regions in self._changes:
+            if gen == generation:
+                known = True
+            elif gen > generation:
+                if regions is None:
+                    return None
+                res.extend(regions)
+        if not known:
+            return None
+        return res
+
+    def _modified_cb(self, image):
+        if self._replacing_data:
+            # set_data() has already done this
+            return
+        regions, self._pending_regions = self._pending_regions, []
+        self.bump_generation(regions=regions if len(regions) > 0 else None)
+        self._set_minmax()
+        self.drop_pyramid()
+
+    def drop_pyramid(self):
+        """Discard any reduced resolution levels built for this image.
+        Any build of the pyramid that is currently in progress is abandoned.
+        """
+        with self._pyramid_lock:
+            self._pyramid_gen += 1
+            self._pyramid = []
+            self._pyramid_building = False
+
+    def build_pyramid(self):
+        """Build the reduced resolution levels of the image pyramid.
+
+        Each level is reduced by a factor of 2 in each dimension from the
+        previous one, until the smaller dimension of a level would fall
+        below `pyramid_min_size`.  The levels are added as they become
+        available, so this can be run in a separate thread.
+        """
+        with self._pyramid_lock:
+            gen = self._pyramid_gen
+            self._pyramid_building = True
+            levels = list(self._pyramid)
+
+        try:
+            if len(levels) > 0:
+                data, factor = levels[-1].data, levels[-1].factor
+            else:
+                data, factor = self._get_data(), 1
+
+            while True:
+                ht, wd = data.shape[:2]
+                if min(wd, ht) // 2 < self.pyramid_min_size:
+                    break
+                data = trcalc.block_reduce(data, 2, 2)
+                factor *= 2
+
+                with self._pyramid_lock:
+                    if gen != self._pyramid_gen:
+                        # image was modified while we were building--
+                        # the results are stale
+                        return
+                    if len(self._pyramid) > 0:
+                        if self._pyramid[-1].factor >= factor:
+                            # another build got here first
+                            continue
+                    self._pyramid.append(Bunch.Bunch(data=data,
+                                                     factor=factor))
+                self.logger.debug("built pyramid level 1/%d (%dx%d)" % (
+                    factor, data.shape[1], data.shape[0]))
+
+        finally:
+            with self._pyramid_lock:
+                if gen == self._pyramid_gen:
+                    self._pyramid_building = False
+
+    def _build_pyramid_bg(self):
+        try:
+            self.build_pyramid()
+
+        except Exception as e:
+            self.logger.error("Error building image pyramid: %s" % (str(e)))
+
+    def get_pyramid_level(self, scale):
+        """Get the coarsest level of the image pyramid that can still be
+        scaled to `scale` without upsampling.
+
+        If the pyramid has not been built yet, its construction is started
+        in the background and `None` is returned until suitable levels
+        are available.
+
+        Returns
+        -------
+        level : `~ginga.misc.Bunch.Bunch` or `None`
+            A bunch with attributes ``data`` (the reduced data array) and
+            ``factor`` (the reduction factor relative to the full
+            resolution data), or `None` if the full resolution data
+            should be used.
+        """
+        if scale > 0.5:
+            # no reduced level can cover this scale
+            return None
+
+        with self._pyramid_lock:
+            levels = self._pyramid
+            if len(levels) == 0 and not self._pyramid_building:
+                wd, ht = self.get_size()
+                if min(wd, ht) // 2 < self.pyramid_min_size:
+                    # image is too small to benefit from a pyramid
+                    return None
+
+                self._pyramid_building = True
+                task = threading.Thread(target=self._build_pyramid_bg)
+                task.daemon = True
+                task.start()
+
+            res = None
+            for level in levels:
+                if level.factor * scale > 1.0:
+                    break
+                res = level
+
+        return res
+
     def get_thumbnail(self, length):
         wd, ht = self.get_size()
         if ht == 0:
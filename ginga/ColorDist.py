@@ -13,6 +13,8 @@ These algorithms are modeled after the ones described for ds9 here:
 import math
 import numpy as np
 
+from ginga.AutoCuts import histogram_fixed
+
 
 class ColorDistError(Exception):
     pass
@@ -20,6 +22,12 @@ class ColorDistError(Exception):
 
 class ColorDistBase(object):
 
+    # True if the hash table depends on the data being hashed
+    data_dependent = False
+    # True if the hash table is computed from the data, and can be fixed
+    # for some data with set_hash_data()
+    hash_from_data = False
+
     def __init__(self, hashsize, colorlen=None):
         super(ColorDistBase, self).__init__()
 
@@ -39,6 +47,27 @@ class ColorDistBase(object):
         arr = self.hash[idx]
         return arr
 
+    def update_hash(self, idx):
+        """Update the hash table for the index array `idx` that is about
+        to be hashed.  Only distributions that depend on the data need to
+        override this.
+        """
+        pass
+
+    def set_hash_data(self, idx, key):
+        """Compute the hash table from `idx`, a representative sample of
+        the index array of some data, and keep it for hashing that data
+        until called with a different `key` identifying the data.  Only
+        distributions that depend on the data need to override this.
+        """
+        pass
+
+    def get_hash_key(self):
+        """Return the `key` passed to `set_hash_data` for the current
+        hash table, or `None`.
+        """
+        return None
+
     def get_hash_size(self):
         return self.hashsize
 
@@ -267,29 +296,59 @@ class HistogramEqualizationDist(ColorDistBase):
     """
     The histogram equalization distribution function distributes colors
     based on the frequency of each data value.
+
+    The hash table is computed from the data being hashed, unless it has
+    been fixed for some data by `set_hash_data` (as the viewer does for
+    each image and set of cut levels), after which hashing is a plain
+    table lookup like that of the other distributions.
     """
 
+    hash_from_data = True
+
     def __init__(self, hashsize, colorlen=None):
+        self._hash_key = None
         super(HistogramEqualizationDist, self).__init__(hashsize,
                                                         colorlen=colorlen)
 
+    @property
+    def data_dependent(self):
+        # the table depends on the data being hashed unless it is fixed
+        return self._hash_key is None
+
     def calc_hash(self):
-        pass
+        # a linear table until there is some data
+        self._hash_key = None
+        self.hash = np.linspace(0, self.colorlen - 1,
+                                self.hashsize).astype(np.uint)
 
-    # TODO: this method has a lot more overhead compared to the other
-    # scaling methods because the hash array must be computed each time
-    # the data is delivered to hash_array()--in the other scaling
-    # methods it is precomputed in calc_hash().  Investigate whether
-    # there is a way to make this more efficient.
-    #
     def hash_array(self, idx):
         # NOTE: data could be assumed to be in the range 0..hashsize-1
         # at this point but clip as a precaution
         idx = idx.clip(0, self.hashsize - 1)
 
+        if self._hash_key is None:
+            self._calc_hash_from_data(idx)
+
+        arr = self.hash[idx]
+        return arr
+
+    def update_hash(self, idx):
+        if self._hash_key is None:
+            self._calc_hash_from_data(idx.clip(0, self.hashsize - 1))
+
+    def set_hash_data(self, idx, key):
+        self._calc_hash_from_data(idx.clip(0, self.hashsize - 1))
+        self._hash_key = key
+
+    def get_hash_key(self):
+        return self._hash_key
+
+    def _calc_hash_from_data(self, idx):
         #get image histogram
-        hist, bins = np.histogram(idx.flatten(),
-                                  self.hashsize, density=False)
+        if idx.size == 0:
+            return
+        hist, bins = histogram_fixed(idx, self.hashsize,
+                                     idx.min(), idx.max())
         cdf = hist.cumsum()
 
         # normalize to color range
@@ -298,9 +357,6 @@ class HistogramEqualizationDist(ColorDistBase):
         self.hash = l.astype(np.uint, copy=False)
         self.check_hash()
 
-        arr = self.hash[idx]
-        return arr
-
     def get_dist_pct(self, pct):
         # TODO: this is wrong but we need a way to invert the hash
         return pct
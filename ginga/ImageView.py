@@ -7,6 +7,7 @@
 """This module handles image viewers."""
 
 from io import BytesIO
+from collections import OrderedDict
 
 import math
 import logging
@@ -17,7 +18,7 @@ import time
 
 import numpy as np
 
-from ginga.misc import Callback, Settings
+from ginga.misc import Callback, Settings, Task, Bunch
 from ginga import BaseImage, AstroImage
 from ginga import RGBMap, AutoCuts, ColorDist, zoom
 from ginga import colors, trcalc
@@ -40,6 +41,32 @@ class ImageViewNoDataError(ImageViewError):
     pass
 
 
+class _RenderAttr(object):
+    """An attribute of the view geometry or the frame buffers of a viewer
+    (e.g. ``_org_x``).  A thread rendering or presenting a frame in the
+    background sees, and changes, the values in the state of that frame
+    instead of the live ones (see `ImageViewBase._get_render_state`).
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        state = getattr(obj._render_local, 'state', None)
+        if state is not None:
+            return state.attrs[self.name]
+        return obj.__dict__[self.name]
+
+    def __set__(self, obj, value):
+        state = getattr(obj._render_local, 'state', None)
+        if state is not None:
+            state.attrs[self.name] = value
+        else:
+            obj.__dict__[self.name] = value
+
+
 class ImageViewBase(Callback.Callbacks):
     """An abstract base class for displaying images represented by
     Numpy data arrays.
@@ -69,6 +96,10 @@ class ImageViewBase(Callback.Callbacks):
     def __init__(self, logger=None, rgbmap=None, settings=None):
         Callback.Callbacks.__init__(self)
 
+        # state of the viewer for a frame rendered in the background, as
+        # seen by the rendering thread (see _get_render_state())
+        self._render_local = threading.local()
+
         if logger is not None:
             self.logger = logger
         else:
@@ -135,6 +166,49 @@ class ImageViewBase(Callback.Callbacks):
         self.t_.get_setting('interpolation').add_callback(
             'set', self.interpolation_change_cb)
 
+        # for rendering zoomed out views of large images
+        self.t_.add_defaults(image_pyramid=False)
+        self.t_.get_setting('image_pyramid').add_callback(
+            'set', self.image_pyramid_change_cb)
+
+        # for mapping integer data directly to RGB with a lookup table
+        self.t_.add_defaults(image_direct_lut=True)
+        self.t_.get_setting('image_direct_lut').add_callback(
+            'set', self.image_direct_lut_change_cb)
+
+        # for scaling images in single precision floating point
+        self.t_.add_defaults(image_float32=False)
+        self.t_.get_setting('image_float32').add_callback(
+            'set', self.image_float32_change_cb)
+
+        # number of threads for rendering images in horizontal strips
+        self.t_.add_defaults(image_render_threads=1)
+
+        # for caching scaled cutouts of images (see set_cutout_cache())
+        self.t_.add_defaults(image_cutout_cache=False,
+                             image_cutout_cache_frames=4)
+        for name in ['image_cutout_cache', 'image_cutout_cache_frames']:
+            self.t_.get_setting(name).add_callback(
+                'set', self.cutout_cache_change_cb)
+
+        # for rendering in a background thread (see set_render_threadpool())
+        self.t_.add_defaults(render_background=False)
+
+        # for redrawing only the changed stages in timed refresh frames
+        self.t_.add_defaults(refresh_dirty_only=False)
+
+        # for rendering images straight into the window with one mapping
+        self.t_.add_defaults(image_warp=False)
+        self.t_.get_setting('image_warp').add_callback(
+            'set', self.image_warp_change_cb)
+
+        # coarse previews of slow frames during interactive gestures,
+        # refined once input has been idle for a while
+        self.t_.add_defaults(image_progressive=False,
+                             progressive_frame_time=0.05,
+                             progressive_idle_time=0.25,
+                             progressive_max_decimation=8)
+
         # max/min scaling
         self.t_.add_defaults(scale_max=None, scale_min=None)
 
@@ -178,7 +252,8 @@ class ImageViewBase(Callback.Callbacks):
         # ICC profile support
         d = dict(icc_output_profile=None, icc_output_intent='perceptual',
                  icc_proof_profile=None, icc_proof_intent='perceptual',
-                 icc_black_point_compensation=False)
+                 icc_black_point_compensation=False,
+                 icc_output_lut=True)
         self.t_.add_defaults(**d)
         for key in d:
             # Note: transform_cb will redraw enough to pick up
@@ -249,8 +324,13 @@ class ImageViewBase(Callback.Callbacks):
         self._org_scale_z = 1.0
 
         self._rgbarr = None
-        self._rgbarr2 = None
+        self._rgbarr_buf = 'rgbarr'
         self._rgbobj = None
+        # preallocated buffers reused across redraws
+        self._bufpool = RenderBufferPool()
+        # cache of scaled image cutouts (see set_cutout_cache())
+        self._cutout_cache = CutoutCache()
+        self._cutout_cache_own = True
 
         # optimization of redrawing
         self.defer_redraw = self.t_.get('defer_redraw', True)
@@ -262,6 +342,27 @@ class ImageViewBase(Callback.Callbacks):
         self._defer_flag = False
         self._hold_redraw_cnt = 0
         self.suppress_redraw = SuppressRedraw(self)
+        # progressive rendering: time of the last full resolution frame
+        # and the decimation of the current one
+        self._full_frame_time = 0.0
+        self._decimation = 1
+        self._refine_pending = False
+        # rendering in a background thread: pool and GUI thread handoff,
+        # lowest whence requested since the worker last started a frame,
+        # last frame handed to the GUI thread and the buffer to render into
+        self._render_tpool = None
+        self._gui_do = None
+        self._bg_lock = threading.RLock()
+        self._bg_whence = self._defer_whence_reset
+        self._bg_busy = False
+        self._bg_presented = threading.Event()
+        self._bg_present_timeout = 1.0
+        self._bg_state = None
+        self._bg_attrs = None
+        self._bg_queued = []
+        self._front = None
+        self._rgbobj_buf = 'rgbobj'
+        self._rgbobj_name = None
 
         # last known window mouse position
         self.last_win_x = 0
@@ -346,6 +447,10 @@ class ImageViewBase(Callback.Callbacks):
         self.rf_early_total = 0.0
         self.rf_early_count = 0
         self.rf_skip_total = 0.0
+        # lowest whence requested since the last timed refresh frame
+        self._rf_whence = self._defer_whence_reset
+        self.rf_whence_counts = {}
+        self.rf_idle_count = 0
         if self.rf_timer is not None:
             self.rf_timer.add_callback('expired', self.refresh_timer_cb,
                                        self.rf_flags)
@@ -379,6 +484,7 @@ class ImageViewBase(Callback.Callbacks):
         self._ctr_x = width // 2
         self._ctr_y = height // 2
         self.logger.debug("widget resized to %dx%d" % (width, height))
+        self._set_cutout_cache_limit()
 
         self.make_callback('configure', width, height)
         self.redraw(whence=0)
@@ -405,6 +511,19 @@ class ImageViewBase(Callback.Callbacks):
         """
         return self._desired_size
 
+    @property
+    def t_(self):
+        # a frame rendered in the background sees the settings as they
+        # were when it was requested
+        state = getattr(self._render_local, 'state', None)
+        if state is not None:
+            return state.settings
+        return self.settings
+
+    @t_.setter
+    def t_(self, settings):
+        self.settings = settings
+
     def get_window_size(self):
         """Get the window size in the underlying implementation.
 
@@ -414,6 +533,9 @@ class ImageViewBase(Callback.Callbacks):
             Window size in the form of ``(width, height)``.
 
         """
+        state = getattr(self._render_local, 'state', None)
+        if state is not None:
+            return state.win_size
         ## if not self._imgwin_set:
         ##     raise ImageViewError("Dimensions of actual window are not yet determined")
         return (self._imgwin_wd, self._imgwin_ht)
@@ -1032,6 +1154,13 @@ class ImageViewBase(Callback.Callbacks):
 
         """
         with self._defer_lock:
+            if self.is_refreshing() and self.t_.get('refresh_dirty_only',
+                                                    False):
+                # timed refresh is running: just note what needs to be
+                # redrawn, the next refresh frame will take care of it
+                self._rf_whence = min(self._rf_whence, whence)
+                return
+
             whence = min(self._defer_whence, whence)
 
             if not self.defer_redraw:
@@ -1120,6 +1249,11 @@ class ImageViewBase(Callback.Callbacks):
             # If a redraw was scheduled, do it now
             self.redraw_now(whence=whence)
 
+        elif self._refine_pending:
+            # input has gone idle after a coarse preview: redraw at full
+            # resolution
+            self.redraw_now(whence=0, refine=True)
+
     def set_redraw_lag(self, lag_sec):
         """Set lag time for redrawing the canvas.
 
@@ -1149,6 +1283,15 @@ class ImageViewBase(Callback.Callbacks):
 
     def start_refresh(self):
         """Start redrawing the canvas at the previously set timed interval.
+
+        Each refresh frame redraws everything, so that image data that is
+        updated in place is shown.  With the "refresh_dirty_only" setting,
+        calls to :meth:`redraw` while the timed refresh is running do not
+        redraw immediately; instead each refresh frame redraws only the
+        stages that were requested since the previous frame (and nothing
+        at all if there were none).  Code that updates image data in place
+        must then signal it, with the image's "modified" callback or by
+        calling ``redraw(whence=0)``, to have it shown.
         """
         self.logger.debug("starting timed refresh interval")
         self.rf_flags['done'] = False
@@ -1160,6 +1303,11 @@ class ImageViewBase(Callback.Callbacks):
         self.rf_early_total = 0.0
         self.rf_delta_total = 0.0
         self.rf_skip_total = 0.0
+        self.rf_whence_counts = {}
+        self.rf_idle_count = 0
+        with self._defer_lock:
+            # first frame is always a full redraw
+            self._rf_whence = 0
         self.rf_start_time = time.time()
         self.rf_deadline = self.rf_start_time
         self.refresh_timer_cb(self.rf_timer, self.rf_flags)
@@ -1171,13 +1319,35 @@ class ImageViewBase(Callback.Callbacks):
         self.rf_flags['done'] = True
         self.rf_timer.clear()
 
+        # don't lose any changes that were waiting for the next frame
+        with self._defer_lock:
+            whence = self._rf_whence
+            self._rf_whence = self._defer_whence_reset
+        if whence < self._defer_whence_reset:
+            self.redraw(whence=whence)
+
+    def is_refreshing(self):
+        """Indicates whether the canvas is being redrawn at a timed interval.
+
+        Returns
+        -------
+        refreshing : bool
+            True if timed refresh is running, False otherwise.
+
+        """
+        return not self.rf_flags.get('done', True)
+
     def get_refresh_stats(self):
         """Return the measured statistics for timed refresh intervals.
 
         Returns
         -------
-        stats : float
-            The measured rate of actual back end updates in frames per second.
+        stats : dict
+            The measured rate of actual back end updates in frames per
+            second (``fps``), timing statistics and the number of frames
+            redrawn at each ``whence`` level (``whence_counts``; see
+            :meth:`get_rgb_object`).  Timer intervals in which nothing
+            needed to be redrawn are counted in ``idle``.
 
         """
         if self.rf_draw_count == 0:
@@ -1199,7 +1369,9 @@ class ImageViewBase(Callback.Callbacks):
         stats = dict(fps=fps, jitter=jitter,
                      early_avg=early_avg, early_pct=early_pct,
                      late_avg=late_avg, late_pct=late_pct,
-                     balance=balance)
+                     balance=balance,
+                     whence_counts=dict(self.rf_whence_counts),
+                     idle=self.rf_idle_count)
         return stats
 
     def refresh_timer_cb(self, timer, flags):
@@ -1237,9 +1409,7 @@ class ImageViewBase(Callback.Callbacks):
             adjust = - (late_avg / 2.0)
             self.rf_skip_total += delta
             if self.rf_skip_total < self.rf_rate:
-                self.rf_draw_count += 1
-                # TODO: can we optimize whence?
-                self.redraw_now(whence=0)
+                self._refresh_redraw()
             else:
                 # <-- we are behind by amount of time equal to one frame.
                 # skip a redraw and attempt to catch up some time
@@ -1253,14 +1423,29 @@ class ImageViewBase(Callback.Callbacks):
                 early_avg = self.rf_early_total / self.rf_early_count
                 adjust = early_avg / 4.0
 
-            self.rf_draw_count += 1
-            # TODO: can we optimize whence?
-            self.redraw_now(whence=0)
+            self._refresh_redraw()
 
         delay = max(0.0, self.rf_deadline - time.time() + adjust)
         timer.start(delay)
 
-    def redraw_now(self, whence=0):
+    def _refresh_redraw(self):
+        with self._defer_lock:
+            whence = self._rf_whence
+            self._rf_whence = self._defer_whence_reset
+        if not self.t_.get('refresh_dirty_only', False):
+            whence = 0
+        # else redraw only the stages that changed since the last frame
+
+        if whence >= self._defer_whence_reset:
+            # nothing has changed
+            self.rf_idle_count += 1
+            return
+
+        self.rf_draw_count += 1
+        self.rf_whence_counts[whence] = self.rf_whence_counts.get(whence, 0) + 1
+        self.redraw_now(whence=whence)
+
+    def redraw_now(self, whence=0, refine=False):
         """Redraw the displayed image.
 
         Parameters
@@ -1268,18 +1453,40 @@ class ImageViewBase(Callback.Callbacks):
         whence
             See :meth:`get_rgb_object`.
 
+        refine : bool
+            If True, render at full resolution even during an interactive
+            gesture (see :meth:`get_render_decimation`).
+
         """
+        if self.is_background_rendering():
+            # frames are not progressive here: the GUI does not wait
+            self._decimation = 1
+            self._request_bg_render(whence)
+            return
+
         try:
             time_start = time.time()
+            time_delta = time_start - self.time_last_redraw
+            if whence <= 0:
+                self._decimation = 1
+                if not refine:
+                    self._decimation = self._calc_decimation(time_delta)
+
             self.redraw_data(whence=whence)
 
             # finally update the window drawable from the offscreen surface
             self.update_image()
 
             time_done = time.time()
-            time_delta = time_start - self.time_last_redraw
             time_elapsed = time_done - time_start
             self.time_last_redraw = time_done
+
+            if whence <= 0:
+                self._refine_pending = self._decimation > 1
+                if not self._refine_pending:
+                    self._full_frame_time = time_elapsed
+            if self._refine_pending:
+                self._schedule_refinement()
             self.logger.debug(
                 "widget '%s' redraw (whence=%d) delta=%.4f elapsed=%.4f sec" % (
                     self.name, whence, time_delta, time_elapsed))
@@ -1295,6 +1502,49 @@ class ImageViewBase(Callback.Callbacks):
                 tb_str = "Traceback information unavailable."
                 self.logger.error(tb_str)
 
+    def _calc_decimation(self, time_delta):
+        """Decide how coarsely to sample images in the next full redraw
+        (setting "image_progressive").  Frames that follow each other
+        within "progressive_idle_time" seconds are taken to be part of an
+        interactive gesture; if full resolution frames take longer than
+        "progressive_frame_time", those are rendered by sampling only
+        every n'th pixel in each direction, n chosen to meet that target.
+        """
+        t_ = self.t_
+        if (not t_.get('image_progressive', False) or
+                time_delta >= t_.get('progressive_idle_time', 0.25)):
+            return 1
+
+        target = t_.get('progressive_frame_time', 0.05)
+        if target <= 0.0 or self._full_frame_time <= target:
+            return 1
+
+        decimation = int(np.ceil(np.sqrt(self._full_frame_time / target)))
+        return min(decimation, t_.get('progressive_max_decimation', 8))
+
+    def _schedule_refinement(self):
+        """Schedule a full resolution redraw after a coarse one, for when
+        input has been idle for "progressive_idle_time" seconds.
+        """
+        with self._defer_lock:
+            if self._defer_flag:
+                # a deferred redraw is due first; we will be called again
+                return
+        self.reschedule_redraw(self.t_.get('progressive_idle_time', 0.25))
+
+    def get_render_decimation(self):
+        """Get the step at which images are sampled in the current redraw;
+        1 except for coarse previews during interactive gestures (setting
+        "image_progressive").
+
+        Returns
+        -------
+        decimation : int
+            Sampling step in window pixels.
+
+        """
+        return self._decimation
+
     def redraw_data(self, whence=0):
         """Render image from RGB map and redraw private canvas.
 
@@ -1313,6 +1563,8 @@ class ImageViewBase(Callback.Callbacks):
             return
 
         if not self._self_scaling:
+            self._front = None
+            self._bg_attrs = None
             rgbobj = self.get_rgb_object(whence=whence)
             self.renderer.render_image(rgbobj, self._dst_x, self._dst_y)
 
@@ -1323,6 +1575,236 @@ class ImageViewBase(Callback.Callbacks):
         if whence < 2:
             self.check_cursor_location()
 
+    def get_cutout_cache(self):
+        """Get the cache of scaled image cutouts used by this viewer.
+
+        Returns
+        -------
+        cache : `CutoutCache`
+            The cutout cache.
+
+        """
+        return self._cutout_cache
+
+    def set_cutout_cache(self, cache):
+        """Set the cache of scaled image cutouts used by this viewer, when
+        the ``image_cutout_cache`` setting is on.
+
+        By default each viewer has its own cache, whose budget is the size
+        of ``image_cutout_cache_frames`` window sized cutouts in double
+        precision.  Viewers of the same images at the same scale (e.g. a
+        channel viewer and the ``Pan`` or ``Zoom`` plugins) can share a
+        cache, whose budget is then up to the caller.
+
+        Parameters
+        ----------
+        cache : `CutoutCache` or `None`
+            The cache to use, or `None` to go back to a cache of our own.
+
+        """
+        self._cutout_cache_own = cache is None
+        if cache is None:
+            cache = CutoutCache()
+        self._cutout_cache = cache
+        self._set_cutout_cache_limit()
+
+    def _set_cutout_cache_limit(self):
+        if not self._cutout_cache_own:
+            return
+        limit = 0
+        if self.settings.get('image_cutout_cache', False):
+            wd, ht = self._imgwin_wd, self._imgwin_ht
+            limit = (self.settings.get('image_cutout_cache_frames', 4) *
+                     wd * ht * np.dtype(np.float64).itemsize)
+        self._cutout_cache.set_limit(limit)
+
+    def set_render_threadpool(self, threadpool, gui_do):
+        """Set up rendering in a background thread (setting
+        "render_background").
+
+        While enabled, :meth:`redraw_now` only queues a request for a
+        frame.  A worker from `threadpool` renders it into a back buffer,
+        and the GUI thread only draws the finished frame into the window
+        and the overlays on top of it.  Requests that arrive while a frame
+        is being rendered are merged into a single next frame, which is
+        rendered with a snapshot of the viewer settings, window geometry
+        and image objects taken in the GUI thread.  The view geometry
+        computed for the frame is kept in the frame, and its overlays are
+        drawn with it, so the worker never changes the live view.
+
+        Parameters
+        ----------
+        threadpool : `~ginga.misc.Task.ThreadPool`
+            A started thread pool.
+
+        gui_do : callable
+            Called as ``gui_do(method, *args)`` from the worker thread to
+            have ``method(*args)`` called in the GUI thread, e.g. the
+            ``gui_do`` method of the reference viewer.
+
+        """
+        self._render_tpool = threadpool
+        self._gui_do = gui_do
+
+    def is_background_rendering(self):
+        """Indicates whether frames are rendered in a background thread.
+
+        Returns
+        -------
+        background : bool
+            True if background rendering is enabled and set up (see
+            :meth:`set_render_threadpool`), False otherwise.
+
+        """
+        return (self.t_.get('render_background', False) and
+                self._render_tpool is not None and self._gui_do is not None and
+                self._imgwin_set and not self._self_scaling)
+
+    def _request_bg_render(self, whence):
+        with self._bg_lock:
+            front = self._front
+            if whence >= 3 and not self._bg_busy and front is not None:
+                # only the overlays have changed: show the last frame again
+                present = front
+            else:
+                present = None
+                self._bg_whence = min(self._bg_whence, whence)
+                if self._bg_attrs is None:
+                    # start from the live view
+                    self._bg_attrs = self._get_render_attrs()
+                self._bg_state = self._get_render_state()
+                self._bg_state.attrs = self._bg_attrs
+                if self._bg_busy:
+                    # the worker picks this up after its current frame
+                    return
+                self._bg_busy = True
+
+        if present is not None:
+            self._present_frame(Bunch.Bunch(present, whence=whence))
+            return
+
+        task = Task.FuncTask(self._bg_render, (), {}, logger=self.logger)
+        task.initialize(None)
+        self._render_tpool.addTask(task)
+
+    def _bg_render(self):
+        """Render frames in a background thread until no more have been
+        requested.
+        """
+        while True:
+            with self._bg_lock:
+                whence = self._bg_whence
+                self._bg_whence = self._defer_whence_reset
+                if whence >= self._defer_whence_reset:
+                    self._bg_busy = False
+                    return
+                state, self._bg_state = self._bg_state, None
+
+                # render into a buffer that is neither being shown nor in
+                # a frame still waiting to be shown
+                in_use = set([frame.buf for frame in self._bg_queued])
+                if self._front is not None:
+                    in_use.add(self._front.buf)
+                bufs = ['rgbobj_bg0', 'rgbobj_bg1']
+                while bufs[-1] in in_use:
+                    bufs.append('rgbobj_bg%d' % len(bufs))
+                buf = [name for name in bufs if name not in in_use][0]
+
+            # the geometry and buffers computed for the frame go into its
+            # state, not into the live view
+            self._render_local.state = state
+            try:
+                self._rgbobj_buf = buf
+                rgbobj = self.get_rgb_object(whence=whence)
+
+            except Exception as e:
+                self.logger.error("Error rendering image: %s" % (str(e)))
+                continue
+
+            finally:
+                self._render_local.state = None
+
+            attrs = dict(state.attrs)
+            frame = Bunch.Bunch(rgbobj=rgbobj, buf=attrs['_rgbobj_name'],
+                                dst_x=attrs['_dst_x'], dst_y=attrs['_dst_y'],
+                                state=Bunch.Bunch(state, attrs=attrs),
+                                whence=whence)
+            with self._bg_lock:
+                self._bg_queued.append(frame)
+                self._bg_presented.clear()
+            self._gui_do(self._present_frame, frame)
+
+            # wait for the frame to be shown, after which the next one
+            # can be rendered into the other buffer; if it takes too
+            # long, the next one goes into a new buffer instead
+            if not self._bg_presented.wait(self._bg_present_timeout):
+                self.logger.debug("frame not presented in time")
+
+    def _get_render_state(self):
+        """Get the state of the viewer that a frame rendered in the
+        background uses.  This is called in the GUI thread when the frame
+        is requested, so that changes made while it is being rendered do
+        not affect it.  The view geometry and frame buffers of the frame
+        (see `_get_render_attrs`) are added as "attrs".
+        """
+        return Bunch.Bunch(settings=self.settings.get_snapshot(),
+                           win_size=self.get_window_size(),
+                           center=self.get_center(),
+                           img_bg=self.get_bg(),
+                           images=self._get_image_objects(self.private_canvas),
+                           attrs=None)
+
+    def _get_render_attrs(self):
+        """Get a copy of the live view geometry, for frames rendered in the
+        background to start from.  These keep their own geometry and frame
+        buffers from one frame to the next.
+        """
+        attrs = dict([(name, self.__dict__[name])
+                      for name in _render_attr_names])
+        # with buffers of their own
+        attrs.update(_rgbarr=None, _rgbarr_buf='rgbarr_bg', _rgbobj=None,
+                     _rgbobj_name=None)
+        return attrs
+
+    def _present_frame(self, frame):
+        """Show a frame rendered in the background thread.  This is
+        called in the GUI thread.
+        """
+        try:
+            with self._bg_lock:
+                self._front = frame
+                # frames are shown in the order they were rendered
+                for i, queued in enumerate(self._bg_queued):
+                    if queued is frame:
+                        self._bg_queued = self._bg_queued[i + 1:]
+                        break
+
+                # release any extra buffers that are no longer used
+                in_use = set([frame.buf for frame in self._bg_queued])
+                in_use.add(frame.buf)
+                self._bufpool.release(lambda name: (
+                    name.startswith('rgbobj_bg') and
+                    name not in ('rgbobj_bg0', 'rgbobj_bg1') and
+                    name not in in_use))
+            self._bg_presented.set()
+
+            self.renderer.render_image(frame.rgbobj, frame.dst_x, frame.dst_y)
+            # the overlays are drawn with the view of the frame
+            self._render_local.state = frame.state
+            try:
+                self.private_canvas.draw(self)
+            finally:
+                self._render_local.state = None
+            self.make_callback('redraw', frame.whence)
+            if frame.whence < 2:
+                self.check_cursor_location()
+
+            self.update_image()
+            self.time_last_redraw = time.time()
+
+        except Exception as e:
+            self.logger.error("Error presenting image: %s" % (str(e)))
+
     def check_cursor_location(self):
         """Check whether the data location of the last known position
         of the cursor has changed.  If so, issue a callback.
@@ -1345,7 +1827,7 @@ class ImageViewBase(Callback.Callbacks):
 
         return data_x, data_y
 
-    def getwin_array(self, order='RGB', alpha=1.0, dtype=None):
+    def getwin_array(self, order='RGB', alpha=1.0, dtype=None, pooled=False):
         """Get Numpy data array for display window.
 
         Parameters
@@ -1359,6 +1841,12 @@ class ImageViewBase(Callback.Callbacks):
         dtype : numpy dtype
             Numpy data type desired; defaults to rgb mapper setting.
 
+        pooled : bool
+            If `True`, the result is written into a buffer from the
+            viewer's buffer pool instead of a newly allocated array.
+            The buffer is overwritten by the next call, so only use this
+            if the result is consumed immediately (e.g. by a renderer).
+
         Returns
         -------
         outarr : ndarray
@@ -1366,27 +1854,87 @@ class ImageViewBase(Callback.Callbacks):
 
         """
         order = order.upper()
-        depth = len(order)
 
         if dtype is None:
             rgbmap = self.get_rgbmap()
             dtype = rgbmap.dtype
 
-        # Prepare data array for rendering
-        data = self._rgbobj.get_array(order, dtype=dtype)
+        imgwin_wd, imgwin_ht = self.get_window_size()
+        shape = (imgwin_ht, imgwin_wd, len(order))
+        if pooled:
+            outarr = self._bufpool.get('getwin', shape, dtype)
+        else:
+            outarr = np.empty(shape, dtype=dtype)
+
+        return self.getwin_into(outarr, order=order, alpha=alpha,
+                                dtype=dtype)
+
+    def getwin_into(self, buf, order='RGB', alpha=1.0, dtype=None):
+        """Render the display window contents into a caller supplied buffer.
+
+        This is like :meth:`getwin_array`, but writes the final window
+        sized image directly into memory owned by the caller (e.g. a
+        backend drawing surface), avoiding an intermediate array and
+        the copy needed to hand it off.
+
+        Parameters
+        ----------
+        buf : object supporting the buffer protocol
+            Writable memory (numpy array, memoryview, bytearray, ...)
+            big enough to hold exactly ``height * width * len(order)``
+            elements of type `dtype`, in C (row-major) order.
+
+        order : str
+            The desired order of RGB color layers.
+
+        alpha : float
+            Opacity.
+
+        dtype : numpy dtype
+            Numpy data type desired; defaults to rgb mapper setting.
+
+        Returns
+        -------
+        outarr : ndarray
+            A Numpy view of `buf` with shape ``(height, width, depth)``.
+
+        """
+        order = order.upper()
+        depth = len(order)
 
-        # NOTE [A]
-        height, width, depth = data.shape
+        if dtype is None:
+            rgbmap = self.get_rgbmap()
+            dtype = rgbmap.dtype
 
         imgwin_wd, imgwin_ht = self.get_window_size()
+        shape = (imgwin_ht, imgwin_wd, depth)
 
-        # create RGBA image array with the background color for output
+        if isinstance(buf, np.ndarray):
+            outarr = buf
+        else:
+            outarr = np.frombuffer(buf, dtype=dtype)
+        if outarr.dtype != np.dtype(dtype) or outarr.size != np.prod(shape):
+            raise ImageViewError("Buffer (%d x %s) does not match window "
+                                 "(%s x %s)" % (outarr.size, outarr.dtype,
+                                                str(shape), np.dtype(dtype)))
+        if not (outarr.flags.writeable and outarr.flags['C_CONTIGUOUS']):
+            raise ImageViewError("Buffer must be writable and contiguous")
+        outarr = outarr.reshape(shape)
+
+        # Prepare data array for rendering--the last frame shown, when
+        # rendering in the background
+        rgbobj, dst_x, dst_y = self._rgbobj, self._dst_x, self._dst_y
+        front = self._front
+        if front is not None:
+            rgbobj, dst_x, dst_y = front.rgbobj, front.dst_x, front.dst_y
+        data = rgbobj.get_array(order, dtype=dtype)
+
+        # fill with the background color
         r, g, b = self.img_bg
-        outarr = trcalc.make_filled_array((imgwin_ht, imgwin_wd, len(order)),
-                                          dtype, order, r, g, b, alpha)
+        trcalc.fill_array(outarr, order, r, g, b, alpha)
 
         # overlay our data
-        trcalc.overlay_image(outarr, (self._dst_x, self._dst_y),
+        trcalc.overlay_image(outarr, (dst_x, dst_y),
                              data, dst_order=order, src_order=order,
                              flipy=False, fill=False, copy=False)
 
@@ -1397,7 +1945,9 @@ class ImageViewBase(Callback.Callbacks):
         to C-order Python bytes.
 
         """
-        outarr = self.getwin_array(order=order, alpha=alpha, dtype=dtype)
+        # tobytes() makes a copy, so we can use a pooled buffer
+        outarr = self.getwin_array(order=order, alpha=alpha, dtype=dtype,
+                                   pooled=True)
 
         if not hasattr(outarr, 'tobytes'):
             # older versions of numpy
@@ -1513,41 +2063,59 @@ class ImageViewBase(Callback.Callbacks):
                                               pan_x, pan_y,
                                               win_wd, win_ht)
 
-            # create backing image
+            # get backing image from the buffer pool--it is only
+            # reallocated if the window size changes
             depth = len(order)
             rgbmap = self.get_rgbmap()
-            # make backing image with the background color
-            r, g, b = self.img_bg
-            rgba = trcalc.make_filled_array((ht, wd, depth), rgbmap.dtype,
-                                            order, r, g, b, 1.0)
-
-            self._rgbarr = rgba
+            self._rgbarr = self._bufpool.get(self._rgbarr_buf, (ht, wd, depth),
+                                             rgbmap.dtype)
             t2 = time.time()
 
-        if (whence <= 2.0) or (self._rgbarr2 is None):
+        if (whence <= 2.0) or (self._rgbobj is None):
+            # conversion to the output ICC profile, if one is specified,
+            # done by the images as they are drawn
+            icc_lut = self.get_output_profile_lut()
+
+            # fill backing image with the background color
+            r, g, b = self.get_bg()
+            if icc_lut is not None:
+                rgb = np.array([r, g, b]) * 255.0
+                rgb = icc_lut.convert_colors(np.round(rgb).clip(0, 255))
+                r, g, b = rgb / 255.0
+            trcalc.fill_array(self._rgbarr, order, r, g, b, 1.0)
+
             # Apply any RGB image overlays
-            self._rgbarr2 = np.copy(self._rgbarr)
-            self.overlay_images(self.private_canvas, self._rgbarr2,
+            self.overlay_images(self.private_canvas, self._rgbarr,
                                 whence=whence)
 
-            # convert to output ICC profile, if one is specified
+            # otherwise convert the whole frame to the output ICC profile
             output_profile = self.t_.get('icc_output_profile', None)
             working_profile = rgb_cms.working_profile
-            if (working_profile is not None) and (output_profile is not None):
-                self.convert_via_profile(self._rgbarr2, order,
+            if ((icc_lut is None) and (working_profile is not None) and
+                    (output_profile is not None)):
+                self.convert_via_profile(self._rgbarr, order,
                                          working_profile, output_profile)
             t3 = time.time()
 
         if (whence <= 2.5) or (self._rgbobj is None):
-            rotimg = self._rgbarr2
+            rotimg = self._rgbarr
+
+            if self.t_.get('image_warp', False):
+                # images were warped straight into window coordinates
+                self._dst_x, self._dst_y = 0, 0
+            else:
+                # Apply any viewing transformations or rotations
+                # if not applied earlier
+                rotimg = self.apply_transforms(rotimg,
+                                               self.t_['rot_deg'])
 
-            # Apply any viewing transformations or rotations
-            # if not applied earlier
-            rotimg = self.apply_transforms(rotimg,
-                                           self.t_['rot_deg'])
-            rotimg = np.ascontiguousarray(rotimg)
+            # copy result into a contiguous buffer from the pool
+            outarr = self._bufpool.get(self._rgbobj_buf, rotimg.shape,
+                                       rotimg.dtype)
+            outarr[...] = rotimg
 
-            self._rgbobj = RGBMap.RGBPlanes(rotimg, order)
+            self._rgbobj = RGBMap.RGBPlanes(outarr, order)
+            self._rgbobj_name = self._rgbobj_buf
 
         time_end = time.time()
         ## self.logger.debug("times: total=%.4f" % (
@@ -1609,10 +2177,23 @@ class ImageViewBase(Callback.Callbacks):
         self._org_x2 = x2
         self._org_y2 = y2
 
-        # Make a square from the scaled cutout, with room to rotate
         slop = 20
-        side = int(math.sqrt(win_wd**2 + win_ht**2) + slop)
-        wd = ht = side
+        rot_deg = self.t_['rot_deg']
+        if self.t_.get('image_warp', False):
+            # images are warped straight into window coordinates
+            wd, ht = win_wd, win_ht
+        elif math.fmod(rot_deg, 90.0) == 0.0:
+            # not rotated, or rotated by a multiple of 90 deg, which is
+            # done by transposing--no need for room to rotate
+            swapped = self.t_['swap_xy'] != (int(rot_deg // 90) % 2 == 1)
+            if swapped:
+                wd, ht = win_ht + slop, win_wd + slop
+            else:
+                wd, ht = win_wd + slop, win_ht + slop
+        else:
+            # Make a square from the scaled cutout, with room to rotate
+            side = int(math.sqrt(win_wd**2 + win_ht**2) + slop)
+            wd = ht = side
 
         # Find center of new array
         ncx, ncy = wd // 2, ht // 2
@@ -1676,7 +2257,20 @@ class ImageViewBase(Callback.Callbacks):
             split_time - start_time))
 
         # Rotate the image as necessary
-        if rot_deg != 0:
+        if math.fmod(rot_deg, 90.0) == 0.0:
+            # no rotation, or a multiple of 90 deg: rotate by transposing
+            # and flipping, and track where the center pixel goes
+            wd, ht = self.get_dims(data)
+            k = int(round(-rot_deg / 90.0)) % 4
+            if k == 1:
+                xoff, yoff = yoff, wd - xoff
+            elif k == 2:
+                xoff, yoff = wd - xoff, ht - yoff
+            elif k == 3:
+                xoff, yoff = ht - yoff, xoff
+            data = np.rot90(data, k)
+
+        else:
             # This is the slowest part of the rendering--install the OpenCv or pyopencl
             # packages to speed it up
             data = np.ascontiguousarray(data)
@@ -1697,7 +2291,7 @@ class ImageViewBase(Callback.Callbacks):
         # dimensions may have changed in transformations
         wd, ht = self.get_dims(data)
 
-        ctr_x, ctr_y = self._ctr_x, self._ctr_y
+        ctr_x, ctr_y = self.get_center()
         dst_x, dst_y = ctr_x - xoff, ctr_y - (ht - yoff)
         self._dst_x, self._dst_y = dst_x, dst_y
         self.logger.debug("ctr=%d,%d off=%d,%d dst=%d,%d cutout=%dx%d" % (
@@ -1724,15 +2318,66 @@ class ImageViewBase(Callback.Callbacks):
              See :meth:`get_rgb_object`.
 
         """
+        state = getattr(self._render_local, 'state', None)
+        if state is not None and canvas is self.private_canvas:
+            # the image objects when the frame was requested
+            objs = state.images
+        else:
+            objs = self._get_image_objects(canvas)
+
+        for obj in objs:
+            obj.draw_image(self, data, whence=whence)
+
+    def _get_image_objects(self, canvas, res=None):
+        """Get the image objects of `canvas`, in drawing order."""
+        if res is None:
+            res = []
         #if not canvas.is_compound():
         if not hasattr(canvas, 'objects'):
-            return
+            return res
 
         for obj in canvas.get_objects():
             if hasattr(obj, 'draw_image'):
-                obj.draw_image(self, data, whence=whence)
+                res.append(obj)
             elif obj.is_compound() and (obj != canvas):
-                self.overlay_images(obj, data, whence=whence)
+                self._get_image_objects(obj, res=res)
+        return res
+
+    def get_output_profile_lut(self):
+        """Get the lookup table for converting colors to the output ICC
+        profile.
+
+        With the "icc_output_lut" setting, images convert their colors as
+        they are drawn: color mapped images through the lookup table of
+        their RGB mapper, and true color images through this table.
+
+        Returns
+        -------
+        icc_lut : `~ginga.util.rgb_cms.ColorLUT` or `None`
+            The lookup table, or `None` if there is no output profile or
+            the whole frame is to be converted instead (see
+            :meth:`convert_via_profile`).
+
+        """
+        output_profile = self.t_.get('icc_output_profile', None)
+        working_profile = rgb_cms.working_profile
+        if ((working_profile is None) or (output_profile is None) or
+                not self.t_.get('icc_output_lut', True)):
+            return None
+
+        try:
+            return rgb_cms.get_transform_lut(
+                working_profile, output_profile,
+                to_intent=self.t_.get('icc_output_intent', 'perceptual'),
+                proof_name=self.t_.get('icc_proof_profile', None),
+                proof_intent=self.t_.get('icc_proof_intent', 'perceptual'),
+                use_black_pt=self.t_.get('icc_black_point_compensation',
+                                         False))
+
+        except Exception as e:
+            self.logger.debug("No lookup table for output profile: %s" % (
+                str(e)))
+            return None
 
     def convert_via_profile(self, data_np, order, inprof_name, outprof_name):
         """Convert the given RGB data from the working ICC profile
@@ -1755,6 +2400,7 @@ class ImageViewBase(Callback.Callbacks):
         proofprof_name = self.t_.get('icc_proof_profile', None)
         proof_intent = self.t_.get('icc_proof_intent', 'perceptual')
         use_black_pt = self.t_.get('icc_black_point_compensation', False)
+        use_lut = self.t_.get('icc_output_lut', True)
 
         try:
             rgbobj = RGBMap.RGBPlanes(data_np, order)
@@ -1765,7 +2411,8 @@ class ImageViewBase(Callback.Callbacks):
                                                  proof_name=proofprof_name,
                                                  proof_intent=proof_intent,
                                                  use_black_pt=use_black_pt,
-                                                 logger=self.logger)
+                                                 logger=self.logger,
+                                                 use_lut=use_lut)
             ri, gi, bi = rgbobj.get_order_indexes('RGB')
 
             out = data_np
@@ -1918,6 +2565,23 @@ class ImageViewBase(Callback.Callbacks):
         x, y = int(float(xpct) * width), int(float(ypct) * height)
         return (x, y)
 
+    def get_window_affine(self):
+        """Get the affine mapping from window pixels to data coordinates,
+        as used for warping images straight into the window (setting
+        "image_warp").
+
+        Returns
+        -------
+        origin, dx, dy : tuple
+            Data coordinates (x, y) of the center of window pixel (0, 0),
+            and the change in data coordinates for a step of one pixel in
+            window X and Y.
+
+        """
+        win_pts = np.array([(0.5, 0.5), (1.5, 0.5), (0.5, 1.5)])
+        org, pt_x, pt_y = self.tform['data_to_window'].from_(win_pts)
+        return org[:2], (pt_x - org)[:2], (pt_y - org)[:2]
+
     def get_pan_rect(self):
         """Get the coordinates in the actual data corresponding to the
         area shown in the display for the current zoom level and pan.
@@ -2355,6 +3019,31 @@ class ImageViewBase(Callback.Callbacks):
         canvas_img.reset_optimize()
         self.redraw(whence=0)
 
+    def image_pyramid_change_cb(self, setting, value):
+        """Handle callback related to changes in use of image pyramids."""
+        self.redraw(whence=0)
+
+    def image_warp_change_cb(self, setting, value):
+        """Handle callback related to changes in warping images straight
+        into the window."""
+        self._reset_bbox()
+        self.redraw(whence=0)
+
+    def image_direct_lut_change_cb(self, setting, value):
+        """Handle callback related to changes in direct mapping of integer
+        data."""
+        self.redraw(whence=1)
+
+    def image_float32_change_cb(self, setting, value):
+        """Handle callback related to changes in the floating point
+        precision of image scaling."""
+        self.redraw(whence=0)
+
+    def cutout_cache_change_cb(self, setting, value):
+        """Handle callback related to changes in the caching of scaled
+        image cutouts."""
+        self._set_cutout_cache_limit()
+
     def set_name(self, name):
         """Set viewer name."""
         self.name = name
@@ -2869,6 +3558,9 @@ class ImageViewBase(Callback.Callbacks):
             X and Y positions, in that order.
 
         """
+        state = getattr(self._render_local, 'state', None)
+        if state is not None:
+            return state.center
         return (self._ctr_x, self._ctr_y)
 
     def get_rgb_order(self):
@@ -3029,6 +3721,9 @@ class ImageViewBase(Callback.Callbacks):
             RGB values.
 
         """
+        state = getattr(self._render_local, 'state', None)
+        if state is not None:
+            return state.img_bg
         return self.img_bg
 
     def set_fg(self, r, g, b):
@@ -3548,6 +4243,129 @@ class ImageViewBase(Callback.Callbacks):
         addons.show_focus_indicator(self, tf, color=color)
 
 
+# the view geometry and frame buffers of a viewer, which frames rendered
+# in the background keep in their own state
+_render_attr_names = ('_org_x', '_org_y', '_org_z', '_org_xoff', '_org_yoff',
+                      '_org_x1', '_org_y1', '_org_x2', '_org_y2',
+                      '_org_scale_x', '_org_scale_y', '_org_scale_z',
+                      '_dst_x', '_dst_y', '_rgbarr', '_rgbarr_buf',
+                      '_rgbobj', '_rgbobj_buf', '_rgbobj_name')
+for _name in _render_attr_names:
+    setattr(ImageViewBase, _name, _RenderAttr(_name))
+
+
+class RenderBufferPool(object):
+    """A pool of preallocated arrays that can be reused from one redraw
+    to the next, in order to avoid allocating (and garbage collecting)
+    large arrays for every frame.
+
+    Buffers are looked up by name and are only reallocated when the
+    requested shape or type changes (e.g. when the window is resized).
+    """
+
+    def __init__(self):
+        self._buffers = {}
+        self._lock = threading.RLock()
+
+    def get(self, name, shape, dtype):
+        """Get the buffer called `name`, with the given shape and type.
+        The contents of the buffer are undefined.
+        """
+        shape, dtype = tuple(shape), np.dtype(dtype)
+        with self._lock:
+            arr = self._buffers.get(name, None)
+            if arr is None or arr.shape != shape or arr.dtype != dtype:
+                arr = np.empty(shape, dtype=dtype)
+                self._buffers[name] = arr
+        return arr
+
+    def get_nbytes(self):
+        """Return the total size in bytes of the buffers in the pool."""
+        with self._lock:
+            return sum([arr.nbytes for arr in self._buffers.values()])
+
+    def release(self, pred):
+        """Release the buffers whose names satisfy `pred`."""
+        with self._lock:
+            for name in [name for name in self._buffers if pred(name)]:
+                del self._buffers[name]
+
+    def clear(self):
+        """Release all buffers in the pool."""
+        with self._lock:
+            self._buffers = {}
+
+
+class CutoutCache(object):
+    """A cache of scaled cutouts of images, with a budget in bytes and
+    least recently used eviction.
+
+    Redraws of an image at the same pan position and scale (e.g. blinked
+    channels, or viewers sharing a cache) then make each cutout only once
+    per change of the image.  Entries are keyed on the identity and
+    generation of the image (see
+    `~ginga.BaseImage.BaseImage.get_generation`), so a modified image
+    never matches older ones; these simply age out of the cache.  Data
+    changed in place must therefore be followed by the ``'modified'``
+    callback of the image.  Cutouts that are only views onto a larger
+    array are not cached, as they would keep the whole array (e.g. a
+    released image) alive.
+
+    Cached arrays are shared and must not be modified in place.
+    """
+
+    def __init__(self, limit=0):
+        self.limit = limit
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def set_limit(self, limit):
+        """Set the budget of the cache in bytes, evicting entries as
+        needed.  A limit of 0 disables the cache.
+        """
+        with self._lock:
+            self.limit = limit
+            self._evict()
+
+    def get(self, key):
+        """Return the value cached under `key`, or `None`."""
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def put(self, key, value, nbytes):
+        """Cache `value`, which holds `nbytes` bytes, under `key`."""
+        if nbytes > self.limit:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key).nbytes
+            self._entries[key] = Bunch.Bunch(value=value, nbytes=nbytes)
+            self.nbytes += nbytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def _evict(self):
+        while self.nbytes > self.limit and len(self._entries) > 0:
+            key, entry = self._entries.popitem(last=False)
+            self.nbytes -= entry.nbytes
+
+    def __len__(self):
+        return len(self._entries)
+
+
 class SuppressRedraw(object):
     def __init__(self, viewer):
         self.viewer = viewer
@@ -4,6 +4,8 @@
 # This is open-source software licensed under a BSD license.
 # Please see the file LICENSE.txt for details.
 #
+import threading
+
 import numpy as np
 
 from ginga.misc import Callback, Settings
@@ -120,6 +122,14 @@ class RGBMapper(Callback.Callbacks):
         self.carr = None
         self.sarr = None
         self.scale_pct = 1.0
+        # precomposed lookup tables from index to output pixel by output
+        # order, with the inputs each was built from; the lock is for
+        # rendering in a background thread
+        self.use_lut = True
+        self._luts = {}
+        self._lut_lock = threading.RLock()
+        # conversion of the output colors to an ICC output profile
+        self._icc_lut = None
 
         # targeted bit depth per-pixel band of the output RGB array
         # (can be less than the data size of the output array)
@@ -439,6 +449,113 @@ class RGBMapper(Callback.Callbacks):
             out[..., gi] = self.arr[1][idx[..., gj]]
             out[..., bi] = self.arr[2][idx[..., bj]]
 
+    def set_output_profile_lut(self, icc_lut):
+        """Set the conversion of the output colors to an ICC output
+        profile.
+
+        Parameters
+        ----------
+        icc_lut : `~ginga.util.rgb_cms.ColorLUT` or `None`
+            Lookup table of the transform to the output profile, which is
+            then baked into the precomposed lookup table (see `get_lut`);
+            `None` for no conversion.  Only 8-bit output is converted.
+        """
+        self._icc_lut = icc_lut
+
+    def get_output_profile_lut(self):
+        return self._icc_lut
+
+    def get_lut(self, order):
+        """Return the precomposed lookup table for output order `order`.
+
+        The table combines the color distribution, shift array, intensity
+        map and color map (and any conversion to an output profile, see
+        `set_output_profile_lut`), and maps an index value directly to an
+        output pixel.  It is only rebuilt when one of those inputs has
+        changed.
+
+        Parameters
+        ----------
+        order : str
+            The order of the color planes in the output (e.g. "RGBA")
+
+        Returns
+        -------
+        lut : ndarray
+            Array of shape (hashsize, len(order)) of the output dtype.
+        """
+        order = order.upper()
+        maxc = self.maxc
+        icc_lut = self._icc_lut if maxc == 255 else None
+        src = (self.dist.hash, self.sarr, self.arr, icc_lut, maxc)
+        with self._lut_lock:
+            lut_src, lut = self._luts.get(order, (None, None))
+            if (lut_src is not None and src[4:] == lut_src[4:] and
+                    all(a is b for a, b in zip(src[:4], lut_src[:4]))):
+                return lut
+
+            # compose dist -> shift array -> intensity/color map
+            hash, sarr, arr = src[:3]
+            hash = hash.clip(0, maxc)
+            sidx = sarr[hash]
+            sidx.clip(0, maxc, out=sidx)
+
+            lut = np.empty((len(hash), len(order)), dtype=self.dtype)
+            for i, ch in enumerate(order):
+                if ch == 'A':
+                    lut[:, i] = maxc
+                else:
+                    lut[:, i] = arr['RGB'.index(ch)][sidx]
+
+            if icc_lut is not None:
+                # convert the colors of the table, rather than every pixel
+                rgb_idx = self.get_order_indexes(order, 'RGB')
+                lut[:, rgb_idx] = icc_lut.convert_colors(lut[:, rgb_idx])
+
+            self._luts[order] = (src, lut)
+            return lut
+
+    def _get_rgbarray_lut(self, idx, order, out=None):
+        """Map index array `idx` to output pixels of order `order` with a
+        single gather from the precomposed lookup table, into `out` if it
+        is given.  Returns the output array.
+        """
+        self.dist.update_hash(idx)
+        lut = self.get_lut(order)
+        num, depth = lut.shape
+        packed = depth * lut.itemsize == 4
+        if packed:
+            # packed 32-bit pixels: one gather of whole pixels
+            lut = lut.view(np.uint32)[:, 0]
+
+        if idx.dtype in (np.int64, np.uint64):
+            # NOTE: data is assumed to be in the range 0..hashsize-1 at
+            # this point; indexing is much faster than np.take() but does
+            # not clip, so check and clip only if needed.  Huge values
+            # (e.g. from NaNs) still map to the top of the table.
+            if idx.size > 0 and (idx.max() >= num or
+                                 (idx.dtype == np.int64 and idx.min() < 0)):
+                idx = idx.clip(0, num - 1)
+            res = lut[idx.view(np.int64)]
+            if packed:
+                res = np.ascontiguousarray(res).view(self.dtype).reshape(
+                    idx.shape + (depth,))
+            if out is None:
+                return res
+            out[...] = res
+            return out
+
+        if out is None:
+            out = np.empty(idx.shape + (depth,), dtype=self.dtype)
+        if packed and out.flags['C_CONTIGUOUS']:
+            np.take(lut, idx, mode='clip', out=out.view(np.uint32)[..., 0])
+        elif packed:
+            out[...] = lut.take(idx, mode='clip').view(self.dtype).reshape(
+                out.shape)
+        else:
+            np.take(lut, idx, axis=0, mode='clip', out=out)
+        return out
+
     def get_rgbarray(self, idx, out=None, order='RGB', image_order=''):
         """
         Parameters
@@ -465,14 +582,21 @@ class RGBMapper(Callback.Callbacks):
         else:
             res_shape = shape + (depth, )
 
-        if out is None:
-            out = np.empty(res_shape, dtype=self.dtype, order='C')
-        else:
+        if out is not None:
             # TODO: assertion check on shape of out
             assert res_shape == out.shape, \
                 RGBMapError("Output array shape %s doesn't match result "
                             "shape %s" % (str(out.shape), str(res_shape)))
 
+        if (self.use_lut and res_shape[:-1] == shape and
+                np.issubdtype(idx.dtype, np.integer)):
+            # single gather from the precomposed lookup table
+            out = self._get_rgbarray_lut(idx, order.upper(), out=out)
+            return RGBPlanes(out, order)
+
+        if out is None:
+            out = np.empty(res_shape, dtype=self.dtype, order='C')
+
         res = RGBPlanes(out, order)
 
         # set alpha channel
@@ -484,6 +608,10 @@ class RGBMapper(Callback.Callbacks):
 
         self._get_rgbarray(idx, res, image_order=image_order)
 
+        if self._icc_lut is not None and self.maxc == 255:
+            rgb_idx = self.get_order_indexes(order, 'RGB')
+            out[..., rgb_idx] = self._icc_lut.convert(out[..., rgb_idx])
+
         return res
 
     def get_hasharray(self, idx):
@@ -580,6 +708,8 @@ class NonColorMapper(RGBMapper):
     """
     def __init__(self, logger, dist=None, bpp=None):
         super(NonColorMapper, self).__init__(logger, dist=dist, bpp=bpp)
+        # data is already colored, so no color lookup table
+        self.use_lut = False
 
         maxlen = self.maxc + 1
         self.dist.set_hash_size(maxlen)
@@ -616,6 +746,7 @@ class PassThruRGBMapper(RGBMapper):
     """
     def __init__(self, logger, dist=None, bpp=None):
         super(PassThruRGBMapper, self).__init__(logger, bpp=bpp)
+        self.use_lut = False
 
         # ignore passed in distribution
         maxlen = self.maxc + 1
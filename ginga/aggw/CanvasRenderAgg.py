@@ -168,6 +168,8 @@ class CanvasRenderer(render.RendererBase):
         self.rgb_order = 'RGBA'
         self.surface = None
         self.dims = ()
+        # window sized buffer that the viewer renders into
+        self._buf = None
 
     def resize(self, dims):
         """Resize our drawing area to encompass a space defined by the
@@ -179,6 +181,8 @@ class CanvasRenderer(render.RendererBase):
             width, height))
         # create agg surface the size of the window
         self.surface = agg.Draw(self.rgb_order, self.dims, 'black')
+        self._buf = np.empty((height, width, len(self.rgb_order)),
+                             dtype=np.uint8)
 
     def render_image(self, rgbobj, dst_x, dst_y):
         """Render the image represented by (rgbobj) at dst_x, dst_y
@@ -189,10 +193,11 @@ class CanvasRenderer(render.RendererBase):
             return
         self.logger.debug("redraw surface")
 
-        # get window contents as a buffer and load it into the AGG surface
-        rgb_buf = self.viewer.getwin_buffer(order=self.rgb_order,
-                                            dtype=np.uint8)
-        self.surface.frombytes(rgb_buf)
+        # render window contents into our buffer and load it into the
+        # AGG surface (aggdraw accepts the array without another copy)
+        self.viewer.getwin_into(self._buf, order=self.rgb_order,
+                                dtype=np.uint8)
+        self.surface.frombytes(self._buf)
 
         # for debugging
         #self.save_rgb_image_as_file('/tmp/temp.png', format='png')
@@ -4,6 +4,9 @@
 # This is open-source software licensed under a BSD license.
 # Please see the file LICENSE.txt for details.
 #
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
 from ginga.canvas.CanvasObject import (CanvasObjectBase, _bool, _color,
@@ -12,10 +15,61 @@ from ginga.canvas.CanvasObject import (CanvasObjectBase, _bool, _color,
                                        colors_plus_none, coord_names)
 from ginga.misc.ParamSet import Param
 from ginga.misc import Bunch
-from ginga import trcalc
+from ginga import trcalc, AutoCuts
 
 from .mixins import OnePointMixin
 
+# shared pool of threads for rendering images in strips
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool(numthreads):
+    """Get the (process wide) thread pool used for rendering images in
+    horizontal strips, making sure that it has `numthreads` threads.
+    """
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None or _render_pool._max_workers != numthreads:
+            if _render_pool is not None:
+                _render_pool.shutdown(wait=False)
+            _render_pool = ThreadPoolExecutor(max_workers=numthreads,
+                                              thread_name_prefix='render')
+        return _render_pool
+
+
+def map_strips(func, arr, pool=None, num_strips=1):
+    """Apply `func` to horizontal strips of `arr`, running them in `pool`,
+    and return the results stacked into a single array.  `func` must
+    handle an empty strip, which is used to find the type and shape of
+    its results.
+    """
+    if pool is None or num_strips < 2:
+        return func(arr)
+
+    res = func(arr[:0])
+    out = np.empty((len(arr),) + res.shape[1:], dtype=res.dtype)
+    bounds = np.linspace(0, len(arr), num_strips + 1).astype(int)
+
+    def _map(y1, y2):
+        out[y1:y2] = func(arr[y1:y2])
+
+    futures = [pool.submit(_map, y1, y2)
+               for y1, y2 in zip(bounds[1:-1], bounds[2:])]
+    # do the first strip in this thread
+    _map(bounds[0], bounds[1])
+    for future in futures:
+        future.result()
+    return out
+
+
+def expand_array(arr, factor, ht, wd):
+    """Enlarge the first two dimensions of `arr` by repeating each element
+    `factor` times, cropped to `ht` by `wd`.
+    """
+    arr = arr.repeat(factor, axis=0)[:ht]
+    return arr.repeat(factor, axis=1)[:, :wd]
+
 
 class Image(OnePointMixin, CanvasObjectBase):
     """Draws an image on a ImageViewCanvas.
@@ -83,7 +137,10 @@ class Image(OnePointMixin, CanvasObjectBase):
 
         # The cache holds intermediate step results by viewer.
         # Depending on value of `whence` they may not need to be recomputed.
+        # A frame rendered in a background thread may be using the cache
+        # of a viewer, so it is replaced rather than reset in place.
         self._cache = {}
+        self._cache_lock = threading.RLock()
         self._zorder = 0
         # images are not editable by default
         self.editable = False
@@ -95,7 +152,9 @@ class Image(OnePointMixin, CanvasObjectBase):
 
     def set_zorder(self, zorder):
         self._zorder = zorder
-        for viewer in self._cache:
+        with self._cache_lock:
+            viewers = list(self._cache.keys())
+        for viewer in viewers:
             viewer.reorder_layers()
             viewer.redraw(whence=2)
 
@@ -103,17 +162,19 @@ class Image(OnePointMixin, CanvasObjectBase):
         return viewer in self._cache
 
     def get_cache(self, viewer):
-        if viewer in self._cache:
-            cache = self._cache[viewer]
-        else:
-            cache = self._reset_cache(Bunch.Bunch())
-            self._cache[viewer] = cache
-        return cache
+        with self._cache_lock:
+            if viewer in self._cache:
+                cache = self._cache[viewer]
+            else:
+                cache = self._reset_cache(Bunch.Bunch())
+                self._cache[viewer] = cache
+            return cache
 
     def invalidate_cache(self, viewer):
-        cache = self.get_cache(viewer)
-        self._reset_cache(cache)
-        return cache
+        with self._cache_lock:
+            cache = self._reset_cache(Bunch.Bunch())
+            self._cache[viewer] = cache
+            return cache
 
     def draw(self, viewer):
         """General draw method for RGB image types.
@@ -144,8 +205,16 @@ class Image(OnePointMixin, CanvasObjectBase):
 
         dst_order = viewer.get_rgb_order()
         image_order = self.image.get_order()
+        warp = viewer.t_.get('image_warp', False)
+
+        if warp and ((whence <= 0.0) or (cache.cutout is None) or
+                     (not self.optimize)):
+            # sample the image straight into window coordinates
+            cache.cutout, cache.mask = self._get_warped_cutout(
+                viewer, dstarr.shape[:2])
+            cache.cvs_pos = (0, 0)
 
-        if (whence <= 0.0) or (cache.cutout is None) or (not self.optimize):
+        elif (whence <= 0.0) or (cache.cutout is None) or (not self.optimize):
             # get extent of our data coverage in the window
             pts = np.asarray(viewer.get_pan_rect()).T
             xmin = int(np.min(pts[0]))
@@ -176,9 +245,10 @@ class Image(OnePointMixin, CanvasObjectBase):
             # scale additionally by our scale
             _scale_x, _scale_y = scale_x * self.scale_x, scale_y * self.scale_y
 
-            res = self.image.get_scaled_cutout2((a1, b1), (a2, b2),
-                                                (_scale_x, _scale_y),
-                                                method=self.interpolation)
+            data, (dx, dy) = self._get_scaled_cutout(viewer, (a1, b1),
+                                                     (a2, b2),
+                                                     (_scale_x, _scale_y))
+            dst_x, dst_y = dst_x + dx, dst_y + dy
 
             # don't ask for an alpha channel from overlaid image if it
             # doesn't have one
@@ -191,7 +261,6 @@ class Image(OnePointMixin, CanvasObjectBase):
             ##                                          image_order)
             ## else:
             ##     cache.cutout = res.data
-            data = res.data
             if self.flipy:
                 data = np.flipud(data)
             cache.cutout = data
@@ -211,20 +280,195 @@ class Image(OnePointMixin, CanvasObjectBase):
             cvs_x = int(np.round(wd / 2.0 + off_x))
             cvs_y = int(np.round(ht / 2.0 + off_y))
             cache.cvs_pos = (cvs_x, cvs_y)
+            cache.mask = None
+
+        cutout = self._convert_via_profile(viewer, cache, image_order)
+
+        if warp:
+            self._composite_warped(dstarr, cutout, cache.mask,
+                                   dst_order, image_order)
+            return
 
         # composite the image into the destination array at the
         # calculated position
-        trcalc.overlay_image(dstarr, cache.cvs_pos, cache.cutout,
+        trcalc.overlay_image(dstarr, cache.cvs_pos, cutout,
                              dst_order=dst_order, src_order=image_order,
                              alpha=self.alpha, fill=True, flipy=False)
 
+    def _convert_via_profile(self, viewer, cache, image_order):
+        """Returns the cached cutout, with its colors converted to the
+        output ICC profile of the viewer if it has one (see
+        `~ginga.ImageView.ImageViewBase.get_output_profile_lut`).  The
+        converted cutout is kept until the cutout or the profile changes.
+        """
+        cutout = cache.cutout
+        icc_lut = viewer.get_output_profile_lut()
+        if (icc_lut is None or cutout.dtype != np.uint8 or
+                cutout.ndim != 3 or len(image_order) != cutout.shape[2] or
+                not all(ch in image_order for ch in 'RGB')):
+            return cutout
+
+        src = cache.icc_src
+        if src is None or src[0] is not cutout or src[1] is not icc_lut:
+            rgb_idx = [image_order.index(ch) for ch in 'RGB']
+            res = cutout.copy()
+            res[..., rgb_idx] = icc_lut.convert(cutout[..., rgb_idx])
+            cache.icc_cutout, cache.icc_src = res, (cutout, icc_lut)
+        return cache.icc_cutout
+
+    def _get_warped_cutout(self, viewer, shape, step=1):
+        """Sample our image straight into window coordinates of the given
+        `shape`, with the viewer's mapping from window to data coordinates
+        (setting "image_warp").  With `step` > 1 only every step'th window
+        pixel is sampled (nearest neighbor), for a coarse preview.
+
+        Returns the sampled data and a mask of the pixels that fall on the
+        image, or None if they all do.
+        """
+        org, dx, dy = viewer.get_window_affine()
+        interpolation = self.interpolation
+        if step > 1:
+            shape = (-(-shape[0] // step), -(-shape[1] // step))
+            dx, dy = np.asarray(dx) * step, np.asarray(dy) * step
+            interpolation = 'basic'
+
+        # convert data coordinates to indexes into our image
+        dst_x, dst_y = self.crdmap.to_data((self.x, self.y))
+        scale = np.array([self.scale_x, self.scale_y])
+        org = (np.asarray(org) - (dst_x, dst_y)) / scale
+        dx, dy = np.asarray(dx) / scale, np.asarray(dy) / scale
+        if self.flipy:
+            org[1] = self.image.height - 1 - org[1]
+            dx[1], dy[1] = -dx[1], -dy[1]
+
+        data = self.image._get_data()
+        if viewer.t_.get('image_pyramid', False):
+            scale_x, scale_y = viewer.get_scale_xy()
+            level = self.image.get_pyramid_level(max(scale_x * self.scale_x,
+                                                     scale_y * self.scale_y))
+            if level is not None:
+                # level pixel k averages image pixels k*f to (k+1)*f - 1
+                factor = level.factor
+                org = (org - (factor - 1) / 2.0) / factor
+                dx, dy = dx / factor, dy / factor
+                data = level.data
+
+        return trcalc.warp_affine(data, shape, org, dx, dy,
+                                  interpolation=interpolation,
+                                  dtype=self._get_float_dtype(viewer, data))
+
+    def _get_float_dtype(self, viewer, data):
+        """Returns np.float32 if `data` is of a double precision floating
+        point type that the viewer works in single precision instead
+        (setting "image_float32"), otherwise None.
+        """
+        if (viewer.t_.get('image_float32', False) and
+                data.dtype.kind == 'f' and data.dtype.itemsize > 4):
+            return np.float32
+        return None
+
+    def _composite_warped(self, dstarr, srcarr, mask, dst_order, src_order):
+        """Composite `srcarr`, sampled by `_get_warped_cutout()`, into the
+        window sized `dstarr`, where `mask` allows.
+        """
+        alpha = self.alpha
+        if mask is not None:
+            if alpha >= 1.0:
+                alpha = mask
+            else:
+                alpha = mask * np.float32(alpha)
+        trcalc.composite_image(dstarr, srcarr, dst_order=dst_order,
+                               src_order=src_order, alpha=alpha, fill=True)
+
+    def _get_scaled_cutout(self, viewer, p1, p2, scales):
+        """Cut out the region of our image between `p1` and `p2` and
+        scale it by `scales`.
+
+        If the viewer has the ``image_pyramid`` setting enabled and we are
+        scaling down, the cutout is made from the coarsest reduced level
+        of the image pyramid that still covers the scale, which makes
+        zoomed out views of very large images much cheaper.
+
+        Returns the scaled data and the offset in the data coordinates of
+        the viewer of the origin of the actual cutout from `p1`.
+        """
+        a1, b1 = p1[:2]
+        a2, b2 = p2[:2]
+        scale_x, scale_y = scales[:2]
+
+        level = None
+        if viewer.t_.get('image_pyramid', False):
+            level = self.image.get_pyramid_level(max(scale_x, scale_y))
+        factor = 1 if level is None else level.factor
+        key = (a1, b1, a2, b2, scale_x, scale_y, factor)
+
+        dtype = None
+        if self.interpolation != 'basic':
+            # the data that is interpolated
+            data = self.image.get_data() if level is None else level.data
+            dtype = self._get_float_dtype(viewer, data)
+            if dtype is not None:
+                # interpolated in single precision
+                key += (np.dtype(dtype).str,)
+
+        def _get_cutout():
+            if level is not None:
+                ht, wd = level.data.shape[:2]
+                la1, lb1 = a1 // factor, b1 // factor
+                la2, lb2 = min(a2 // factor, wd - 1), min(b2 // factor, ht - 1)
+                data, _scales = trcalc.get_scaled_cutout_basic(
+                    level.data, la1, lb1, la2, lb2,
+                    scale_x * factor, scale_y * factor,
+                    interpolation=self.interpolation, logger=self.logger,
+                    dtype=dtype)
+                # offset in the data coordinates of the viewer
+                return data, ((la1 * factor - a1) * self.scale_x,
+                              (lb1 * factor - b1) * self.scale_y)
+
+            res = self.image.get_scaled_cutout2((a1, b1), (a2, b2),
+                                                (scale_x, scale_y),
+                                                method=self.interpolation,
+                                                dtype=dtype)
+            return res.data, (0, 0)
+
+        return self._get_cached_cutout(viewer, key, _get_cutout)
+
+    def _get_cached_cutout(self, viewer, key, get_cutout):
+        """Get a scaled cutout from the cutout cache of the viewer, making
+        it with `get_cutout` (returning the cutout array and an offset) if
+        it is not there.  `key` describes the cutout region, scale and
+        pyramid level.
+        """
+        if not viewer.t_.get('image_cutout_cache', False):
+            return get_cutout()
+
+        image = self.image
+        cutout_cache = viewer.get_cutout_cache()
+        key = (id(image), image.get_generation(), self.interpolation) + key
+        res = cutout_cache.get(key)
+        if res is None:
+            res = get_cutout()
+            data = res[0]
+            base = data
+            while isinstance(base.base, np.ndarray):
+                base = base.base
+            if base.nbytes > data.nbytes:
+                # a view onto a larger array (e.g. a plain slice of the
+                # image at integer scale): it is cheap to make again, and
+                # caching it would keep the whole array alive
+                return res
+            cutout_cache.put(key, res, data.nbytes)
+        return res
+
     def _reset_cache(self, cache):
-        cache.setvals(cutout=None, drawn=False, cvs_pos=(0, 0))
+        cache.setvals(cutout=None, mask=None, drawn=False, cvs_pos=(0, 0),
+                      icc_cutout=None, icc_src=None)
         return cache
 
     def reset_optimize(self):
-        for cache in self._cache.values():
-            self._reset_cache(cache)
+        with self._cache_lock:
+            for viewer in list(self._cache.keys()):
+                self._cache[viewer] = self._reset_cache(Bunch.Bunch())
 
     def get_image(self):
         return self.image
@@ -381,6 +625,10 @@ class NormImage(Image):
                                         **kwdargs)
         self.rgbmap = rgbmap
         self.autocuts = autocuts
+        # largest lookup table to build for mapping integer data directly
+        self.direct_lut_max = 2 ** 20
+        # fewest rows in a strip when rendering with multiple threads
+        self.strip_min_rows = 64
 
     def draw_image(self, viewer, dstarr, whence=0.0):
         if self.image is None:
@@ -388,7 +636,43 @@ class NormImage(Image):
 
         cache = self.get_cache(viewer)
 
-        if (whence <= 0.0) or (cache.cutout is None) or (not self.optimize):
+        if self.rgbmap is not None:
+            rgbmap = self.rgbmap
+        else:
+            rgbmap = viewer.get_rgbmap()
+        # colors are converted to the viewer's output ICC profile, if it
+        # has one, through the lookup table of the RGB mapper
+        rgbmap.set_output_profile_lut(viewer.get_output_profile_lut())
+
+        dst_order = viewer.get_rgb_order()
+        image_order = self.image.get_order()
+        get_order = dst_order
+        # note: is this still needed?  I think overlay_image will handle
+        # a mismatch of alpha channel now
+        if ('A' in dst_order) and not ('A' in image_order):
+            get_order = dst_order.replace('A', '')
+
+        if rgbmap.get_dist().hash_from_data:
+            self._fix_dist_hash(viewer, rgbmap)
+
+        shifted = False
+        warp = viewer.t_.get('image_warp', False)
+        # coarse sampling for previews during interactive gestures
+        decimate = viewer.get_render_decimation()
+
+        if warp and ((whence <= 0.0) or (cache.cutout is None) or
+                     (not self.optimize)):
+            # sample the image straight into window coordinates
+            cache.cutout, cache.mask = self._get_warped_cutout(
+                viewer, dstarr.shape[:2], step=decimate)
+            cache.expand = None
+            if decimate > 1:
+                cache.expand = (decimate,) + dstarr.shape[:2]
+            cache.lut_range = None
+            cache.grid = None
+            cache.cvs_pos = (0, 0)
+
+        elif (whence <= 0.0) or (cache.cutout is None) or (not self.optimize):
             # get extent of our data coverage in the window
             pts = np.asarray(viewer.get_pan_rect()).T
             xmin = int(np.min(pts[0]))
@@ -419,10 +703,59 @@ class NormImage(Image):
             # scale additionally by our scale
             _scale_x, _scale_y = scale_x * self.scale_x, scale_y * self.scale_y
 
-            res = self.image.get_scaled_cutout2((a1, b1), (a2, b2),
-                                                (_scale_x, _scale_y),
-                                                method=self.interpolation)
-            cache.cutout = res.data
+            cache.expand = None
+            if decimate > 1:
+                # sample only every decimate'th pixel of a nearest
+                # neighbor cutout; it is enlarged again when composited
+                view, _scales = trcalc.get_scaled_cutout_basic_view(
+                    self.image.shape, (a1, b1), (a2, b2),
+                    (_scale_x, _scale_y))
+                yi, xi = self._get_grid(view)
+                cache.cutout = self.image._slice(np.ix_(yi[::decimate],
+                                                        xi[::decimate]))
+                cache.expand = (decimate, len(yi), len(xi))
+                cache.lut_range = None
+                cache.grid = None
+
+            elif self._can_shift(viewer):
+                # sample the image ourselves, so that the sampling grid
+                # can be compared with that of the next redraw
+                view, _scales = trcalc.get_scaled_cutout_basic_view(
+                    self.image.shape, (a1, b1), (a2, b2),
+                    (_scale_x, _scale_y))
+                grid = self._get_grid(view)
+                shifted = self._shift_cutout(viewer, cache, grid, rgbmap,
+                                             dst_order, image_order,
+                                             get_order)
+                if not shifted:
+                    pool, num_strips = self._get_strips(viewer, rgbmap,
+                                                        len(grid[0]))
+
+                    def _get_cutout():
+                        if num_strips > 1 and not isinstance(view[0], slice):
+                            yi, xi = grid
+                            data = map_strips(
+                                lambda yi: self.image._slice(np.ix_(yi, xi)),
+                                yi, pool, num_strips)
+                        else:
+                            data = self.image._slice(view)
+                        return data, (0, 0)
+
+                    # same as a 'basic' cutout without a pyramid level
+                    cache.cutout, _off = self._get_cached_cutout(
+                        viewer, (a1, b1, a2, b2, _scale_x, _scale_y, 1),
+                        _get_cutout)
+                    cache.lut_range = None
+                cache.grid = grid
+
+            else:
+                data, (dx, dy) = self._get_scaled_cutout(viewer, (a1, b1),
+                                                         (a2, b2),
+                                                         (_scale_x, _scale_y))
+                dst_x, dst_y = dst_x + dx, dst_y + dy
+                cache.cutout = data
+                cache.lut_range = None
+                cache.grid = None
 
             # calculate our offset from the pan position
             pan_x, pan_y = viewer.get_pan()
@@ -439,44 +772,352 @@ class NormImage(Image):
             cvs_x = int(np.round(wd / 2.0 + off_x))
             cvs_y = int(np.round(ht / 2.0 + off_y))
             cache.cvs_pos = (cvs_x, cvs_y)
+            cache.mask = None
+
+        pool, num_strips = self._get_strips(viewer, rgbmap,
+                                            len(cache.cutout))
+
+        if shifted:
+            # cutout and RGB arrays were updated from the last ones
+            pass
+
+        elif (viewer.t_.get('image_direct_lut', True) and
+                self._can_use_direct_lut(cache, rgbmap)):
+            # integer data: map raw values straight to RGB pixels
+            if (whence <= 2.5) or (cache.rgbarr is None) or (not self.optimize):
+                cache.prergb = None
+                cache.rgbarr = map_strips(
+                    lambda data: self._get_rgb_planes(
+                        self._get_direct_rgbarray(viewer, cache, rgbmap,
+                                                  dst_order, data=data),
+                        dst_order, get_order),
+                    cache.cutout, pool, num_strips)
 
-        if self.rgbmap is not None:
-            rgbmap = self.rgbmap
         else:
-            rgbmap = viewer.get_rgbmap()
-
-        if (whence <= 1.0) or (cache.prergb is None) or (not self.optimize):
-            # apply visual changes prior to color mapping (cut levels, etc)
             vmax = rgbmap.get_hash_size() - 1
-            newdata = self.apply_visuals(viewer, cache.cutout, 0, vmax)
+            if ((whence <= 1.0) or (cache.prergb is None) or
+                    (cache.idx_max != vmax) or (not self.optimize)):
+                # apply visual changes prior to color mapping (cut levels,
+                # etc)
+
+                def _get_index(data):
+                    newdata = self.apply_visuals(viewer, data, 0, vmax)
+
+                    # result becomes an index array fed to the RGB mapper
+                    if not np.issubdtype(newdata.dtype, np.dtype('uint')):
+                        newdata = newdata.astype(np.uint)
+                    return newdata
+
+                idx = map_strips(_get_index, cache.cutout, pool, num_strips)
+
+                self.logger.debug("shape of index is %s" % (str(idx.shape)))
+                cache.prergb, cache.idx_max = idx, vmax
+
+            if ((whence <= 2.5) or (cache.rgbarr is None) or
+                    (not self.optimize)):
+                # get RGB mapped array; for color map changes (e.g.
+                # contrast drags) this is all that is redone: the index
+                # array is kept and only the lookup table is rebuilt
+                cache.rgbarr = map_strips(
+                    lambda idx: self._get_rgb_planes(
+                        rgbmap.get_rgbarray(idx, order=dst_order,
+                                            image_order=image_order).rgbarr,
+                        dst_order, get_order),
+                    cache.prergb, pool, num_strips)
+
+        if cache.grid is not None:
+            cache.rgb_key = self._get_rgb_key(viewer, cache, rgbmap,
+                                              dst_order, get_order)
+
+        rgbarr, mask = cache.rgbarr, cache.mask
+        if cache.expand is not None:
+            # coarse preview: enlarge to the full resolution size
+            rgbarr = expand_array(rgbarr, *cache.expand)
+            if mask is not None:
+                mask = expand_array(mask, *cache.expand)
+
+        if warp:
+            self._composite_warped(dstarr, rgbarr, mask,
+                                   dst_order, get_order)
+            return
 
-            # result becomes an index array fed to the RGB mapper
-            if not np.issubdtype(newdata.dtype, np.dtype('uint')):
-                newdata = newdata.astype(np.uint)
-            idx = newdata
+        # composite the image into the destination array at the
+        # calculated position
+        if num_strips < 2:
+            trcalc.overlay_image(dstarr, cache.cvs_pos, rgbarr,
+                                 dst_order=dst_order, src_order=get_order,
+                                 alpha=self.alpha, fill=True, flipy=False)
+            return
 
-            self.logger.debug("shape of index is %s" % (str(idx.shape)))
-            cache.prergb = idx
+        cvs_x, cvs_y = cache.cvs_pos
+        bounds = np.linspace(0, len(rgbarr), num_strips + 1).astype(int)
+        futures = [pool.submit(trcalc.overlay_image, dstarr,
+                               (cvs_x, cvs_y + y1), rgbarr[y1:y2],
+                               dst_order=dst_order, src_order=get_order,
+                               alpha=self.alpha, fill=True, flipy=False)
+                   for y1, y2 in zip(bounds[:-1], bounds[1:])]
+        for future in futures:
+            future.result()
+
+    def _get_strips(self, viewer, rgbmap, height):
+        """Returns the thread pool and number of horizontal strips to
+        use for rendering `height` rows of the image (setting
+        "image_render_threads").
+        """
+        numthreads = viewer.t_.get('image_render_threads', 1)
+        num_strips = min(numthreads, height // self.strip_min_rows)
+        if num_strips < 2 or rgbmap.get_dist().data_dependent:
+            # color distribution depends on all of the data
+            return None, 1
+        return get_render_pool(numthreads), num_strips
+
+    def _can_shift(self, viewer):
+        return (self.optimize and self.interpolation == 'basic' and
+                len(self.image.shape) == 2 and
+                not viewer.t_.get('image_pyramid', False))
+
+    def _get_grid(self, view):
+        """Returns the row and column indexes into the image sampled by
+        `view`, as 1D arrays.
+        """
+        yi, xi = view
+        if isinstance(yi, slice):
+            return (np.arange(yi.start, yi.stop), np.arange(xi.start, xi.stop))
+        return (yi[:, 0], xi[0, :])
+
+    def _get_rgb_key(self, viewer, cache, rgbmap, dst_order, get_order):
+        """Returns a key identifying everything, besides the data, that
+        went into the RGB mapping of the cached cutout.
+        """
+        if self.autocuts is not None:
+            autocuts = self.autocuts
+        else:
+            autocuts = viewer.autocuts
+        loval, hival = viewer.t_['cuts']
+        # direct mapping from integer data uses no index array
+        direct = cache.prergb is None
+        return (direct, viewer.t_.get('image_direct_lut', True),
+                dst_order, get_order, loval, hival, autocuts,
+                rgbmap, rgbmap.get_lut(dst_order))
+
+    def _shift_cutout(self, viewer, cache, grid, rgbmap, dst_order,
+                      image_order, get_order):
+        """If the image sampling `grid` for a new cutout is the one of the
+        cached cutout, only offset (e.g. after a pan), build the new cutout
+        and RGB arrays by copying the overlapping part of the cached ones
+        and calculating only the newly exposed strips.
+
+        Returns True if this was done, False if the cutout needs to be
+        made and mapped from scratch.
+        """
+        if (cache.grid is None or cache.rgbarr is None or
+                cache.rgb_key is None or
+                rgbmap.get_dist().data_dependent):
+            return False
+
+        key = self._get_rgb_key(viewer, cache, rgbmap, dst_order, get_order)
+        if key[:-1] != cache.rgb_key[:-1] or key[-1] is not cache.rgb_key[-1]:
+            # color mapping has changed
+            return False
+
+        yi, xi = grid
+        old_yi, old_xi = cache.grid
+        ht, wd = len(yi), len(xi)
+        old_ht, old_wd = len(old_yi), len(old_xi)
+        if ht == 0 or wd == 0 or old_ht == 0 or old_wd == 0:
+            return False
+
+        # offset of the new cutout in the old one, in cutout pixels
+        scale_x, scale_y = wd / (xi[-1] - xi[0] + 1), ht / (yi[-1] - yi[0] + 1)
+        m = int(np.round((xi[0] - old_xi[0]) * scale_x))
+        n = int(np.round((yi[0] - old_yi[0]) * scale_y))
+
+        if m == 0 and n == 0:
+            # not a pan; the data itself may have changed
+            return False
+
+        # overlapping region, in new cutout pixels
+        x0, x1 = max(0, -m), min(wd, old_wd - m)
+        y0, y1 = max(0, -n), min(ht, old_ht - n)
+        if x1 <= x0 or y1 <= y0:
+            return False
+
+        # the overlap must sample exactly the same image pixels
+        if not (np.array_equal(xi[x0:x1], old_xi[x0 + m:x1 + m]) and
+                np.array_equal(yi[y0:y1], old_yi[y0 + n:y1 + n])):
+            return False
+
+        # newly exposed strips: full width above and below the overlap,
+        # and on either side of it
+        strips = [(0, y0, 0, wd), (y1, ht, 0, wd),
+                  (y0, y1, 0, x0), (y0, y1, x1, wd)]
+        strips = [(r0, r1, c0, c1) for r0, r1, c0, c1 in strips
+                  if r1 > r0 and c1 > c0]
+        pieces = [self.image._slice(np.ix_(yi[r0:r1], xi[c0:c1]))
+                  for r0, r1, c0, c1 in strips]
+
+        direct = cache.prergb is None
+        lut_range = cache.lut_range
+        if direct and cache.cutout.dtype.itemsize > 2 and len(pieces) > 0:
+            # widen the table to cover the values in the new strips
+            offset, num = lut_range
+            lo, hi = offset, offset + num - 1
+            for piece in pieces:
+                lo, hi = min(lo, int(piece.min())), max(hi, int(piece.max()))
+            lut_range = (lo, hi + 1 - lo)
+            if lut_range[1] > self.direct_lut_max:
+                return False
+
+        def _shift(arr):
+            res = np.empty((ht, wd) + arr.shape[2:], dtype=arr.dtype)
+            res[y0:y1, x0:x1] = arr[y0 + n:y1 + n, x0 + m:x1 + m]
+            return res
+
+        cutout = _shift(cache.cutout)
+        rgbarr = _shift(cache.rgbarr)
+        prergb = None if direct else _shift(cache.prergb)
+        vmax = rgbmap.get_hash_size() - 1
+
+        for (r0, r1, c0, c1), piece in zip(strips, pieces):
+            cutout[r0:r1, c0:c1] = piece
+            if direct:
+                cache.lut_range = lut_range
+                rgbarr[r0:r1, c0:c1] = self._get_rgb_planes(
+                    self._get_direct_rgbarray(viewer, cache, rgbmap,
+                                              dst_order, data=piece),
+                    dst_order, get_order)
+            else:
+                idx = self.apply_visuals(viewer, piece, 0, vmax)
+                if not np.issubdtype(idx.dtype, np.dtype('uint')):
+                    idx = idx.astype(np.uint)
+                prergb[r0:r1, c0:c1] = idx
+                rgbobj = rgbmap.get_rgbarray(idx, order=dst_order,
+                                             image_order=image_order)
+                rgbarr[r0:r1, c0:c1] = self._get_rgb_planes(
+                    rgbobj.rgbarr, dst_order, get_order)
+
+        cache.cutout, cache.prergb, cache.rgbarr = cutout, prergb, rgbarr
+        cache.lut_range = lut_range if direct else None
+        return True
+
+    def _get_rgb_planes(self, rgbarr, rgb_order, order):
+        """Returns the color planes of `rgbarr`, in `rgb_order`, in `order`
+        instead; as a view if they are a run of its planes (e.g. "RGB" of
+        "RGBA").  Mapping to all the planes of the output order lets
+        4-byte pixels be gathered whole.
+        """
+        i = rgb_order.find(order)
+        if i < 0:
+            return trcalc.reorder_image(order, rgbarr, rgb_order)
+        return rgbarr[..., i:i + len(order)]
+
+    def _can_use_direct_lut(self, cache, rgbmap):
+        data = cache.cutout
+        if (data.ndim != 2 or data.dtype.kind not in ('i', 'u') or
+                not rgbmap.use_lut or rgbmap.get_dist().data_dependent):
+            return False
+
+        if cache.lut_range is None:
+            if data.dtype.itemsize <= 2:
+                # table covers every possible value; index by the raw bits
+                cache.lut_range = (0, 2 ** (8 * data.dtype.itemsize))
+            elif data.size == 0:
+                cache.lut_range = (0, 0)
+            else:
+                # table covers the range of values in the cutout
+                offset = int(data.min())
+                cache.lut_range = (offset, int(data.max()) + 1 - offset)
+        return 0 < cache.lut_range[1] <= self.direct_lut_max
+
+    def _get_direct_rgbarray(self, viewer, cache, rgbmap, order, data=None):
+        """Map integer data directly to RGB pixels with a lookup table
+        indexed by raw data value, which includes the cut levels, color
+        distribution and color map.  The table is only rebuilt when one
+        of those changes.  `data` defaults to the cached cutout.
+        """
+        if data is None:
+            data = cache.cutout
+        dtype = data.dtype
+        offset, num = cache.lut_range
+        if dtype.itemsize <= 2:
+            idx = data.view(dtype.str.replace('i', 'u'))
+        else:
+            idx = data
+            if offset != 0:
+                idx = np.subtract(data, offset)
+            if idx.dtype == np.uint64:
+                # np.take() needs signed indexes; values are < num
+                idx = idx.view(np.int64)
 
-        dst_order = viewer.get_rgb_order()
-        image_order = self.image.get_order()
-        get_order = dst_order
-        # note: is this still needed?  I think overlay_image will handle
-        # a mismatch of alpha channel now
-        if ('A' in dst_order) and not ('A' in image_order):
-            get_order = dst_order.replace('A', '')
+        if self.autocuts is not None:
+            autocuts = self.autocuts
+        else:
+            autocuts = viewer.autocuts
+        loval, hival = viewer.t_['cuts']
+        rgb_lut = rgbmap.get_lut(order)
+
+        vmax = rgbmap.get_hash_size() - 1
+        # the precision of the scaling (see apply_visuals()) is part of
+        # the key too
+        key = (dtype.str, offset, num, loval, hival, autocuts, vmax,
+               viewer.t_.get('image_float32', False))
+        if cache.lut_key != key:
+            # index into the color map of each data value
+            if dtype.itemsize <= 2:
+                vals = np.arange(num, dtype=idx.dtype.str[1:]).view(
+                    dtype.str[1:])
+            else:
+                vals = np.arange(offset, offset + num, dtype=dtype)
+            lut_idx = self.apply_visuals(viewer, vals, 0, vmax)
+            cache.lut_idx = lut_idx.astype(np.uint).clip(0, vmax)
+            cache.lut_key, cache.lut_src = key, None
+
+        if cache.lut_src is not rgb_lut:
+            # only the color mapping changed (e.g. during a contrast
+            # drag): just compose the new lookup table
+            cache.lut = rgb_lut[cache.lut_idx]
+            cache.lut_src = rgb_lut
+
+        lut = cache.lut
+        depth = lut.shape[1]
+        packed = depth * lut.itemsize == 4
+        if packed:
+            # packed 32-bit pixels: one gather of whole pixels
+            lut = lut.view(np.uint32)[:, 0]
+
+        if packed and dtype.itemsize <= 2:
+            # table covers every possible value; indexing is much faster
+            # than np.take()
+            rgbarr = lut[idx]
+        else:
+            rgbarr = lut.take(idx, axis=0, mode='clip')
 
-        if (whence <= 2.5) or (cache.rgbarr is None) or (not self.optimize):
-            # get RGB mapped array
-            rgbobj = rgbmap.get_rgbarray(cache.prergb, order=dst_order,
-                                         image_order=image_order)
-            cache.rgbarr = rgbobj.get_array(get_order)
+        if packed:
+            return rgbarr.view(rgbmap.dtype).reshape(idx.shape + (depth,))
+        return rgbarr
 
-        # composite the image into the destination array at the
-        # calculated position
-        trcalc.overlay_image(dstarr, cache.cvs_pos, cache.rgbarr,
-                             dst_order=dst_order, src_order=get_order,
-                             alpha=self.alpha, fill=True, flipy=False)
+    def _fix_dist_hash(self, viewer, rgbmap):
+        """Compute the hash table of a color distribution that depends on
+        the data (e.g. histogram equalization) once for the image and cut
+        levels, from a sample of the whole image, instead of from the
+        visible data on every redraw.
+        """
+        if self.autocuts is not None:
+            autocuts = self.autocuts
+        else:
+            autocuts = viewer.autocuts
+        dist = rgbmap.get_dist()
+        loval, hival = viewer.t_['cuts']
+        key = (id(self.image), self.image.get_generation(), loval, hival,
+               autocuts, dist.get_hash_size())
+        if dist.get_hash_key() == key:
+            return
+
+        sample = AutoCuts.sample_data(self.image.get_data(),
+                                      autocuts.sample_points)
+        vmax = rgbmap.get_hash_size() - 1
+        idx = self.apply_visuals(viewer, sample, 0, vmax)
+        dist.set_hash_data(idx.astype(np.uint, copy=False), key)
 
     def apply_visuals(self, viewer, data, vmin, vmax):
         if self.autocuts is not None:
@@ -486,12 +1127,20 @@ class NormImage(Image):
 
         # Apply cut levels
         loval, hival = viewer.t_['cuts']
+        if viewer.t_.get('image_float32', False):
+            # scale in single precision (setting "image_float32")
+            return autocuts.cut_levels(data, loval, hival,
+                                       vmin=vmin, vmax=vmax,
+                                       dtype=np.float32)
         newdata = autocuts.cut_levels(data, loval, hival,
                                       vmin=vmin, vmax=vmax)
         return newdata
 
     def _reset_cache(self, cache):
-        cache.setvals(cutout=None, prergb=None, rgbarr=None,
+        cache.setvals(cutout=None, prergb=None, idx_max=None, rgbarr=None,
+                      lut=None, lut_idx=None, lut_key=None, lut_src=None,
+                      lut_range=None, grid=None, rgb_key=None, mask=None,
+                      expand=None,
                       drawn=False, cvs_pos=(0, 0))
         return cache
 
@@ -142,7 +142,8 @@ class CanvasRenderer(render.RendererBase):
         self.logger.debug("redraw surface")
 
         # get window contents as an array and store it into the CV surface
-        rgb_arr = self.viewer.getwin_array(order=self.rgb_order, dtype=np.uint8)
+        rgb_arr = self.viewer.getwin_array(order=self.rgb_order, dtype=np.uint8,
+                                           pooled=True)
         # TODO: is there a faster way to copy this array in?
         self.surface[:, :, :] = rgb_arr
 
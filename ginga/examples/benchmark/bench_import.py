@@ -0,0 +1,83 @@
+#! /usr/bin/env python
+#
+# bench_import.py -- Benchmark import times of ginga modules.
+#
+# This is open-source software licensed under a BSD license.
+# Please see the file LICENSE.txt for details.
+#
+"""
+Usage:
+    $ python bench_import.py --runs=10 ginga.cmap ginga.imap
+
+Imports the given modules (by default the color and intensity map
+modules) in fresh Python interpreters with ``python -X importtime`` and
+reports, for each module, the best and average time that the module
+itself took to import and the time including the modules it imported.
+"""
+import os
+import subprocess
+import sys
+
+
+def import_times(modules):
+    """Import `modules` in a fresh interpreter and return a dict of
+    (self, cumulative) import times in microseconds by module name.
+    """
+    cmd = [sys.executable, '-X', 'importtime', '-c',
+           'import %s' % (', '.join(modules))]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, check=True,
+                          env=dict(os.environ))
+    res = {}
+    for line in proc.stderr.splitlines():
+        # e.g. "import time:       640 |     179158 | ginga.cmap"
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            t_self, t_cumul = int(fields[0]), int(fields[1])
+        except ValueError:
+            # header line
+            continue
+        res[fields[2].strip()] = (t_self, t_cumul)
+    return res
+
+
+def main(options, args):
+
+    modules = args if len(args) > 0 else ['ginga.cmap', 'ginga.imap']
+
+    # first run compiles and caches the bytecode, if it is not already
+    import_times(modules)
+
+    times = {name: [] for name in modules}
+    for i in range(options.runs):
+        res = import_times(modules)
+        for name in modules:
+            times[name].append(res[name])
+
+    print("%d runs, times in ms (self / including imported modules)" % (
+        options.runs))
+    for name in modules:
+        t_self = [t[0] / 1000.0 for t in times[name]]
+        t_cumul = [t[1] / 1000.0 for t in times[name]]
+        print("%-20s best %7.2f / %7.2f   avg %7.2f / %7.2f" % (
+            name, min(t_self), min(t_cumul),
+            sum(t_self) / len(t_self), sum(t_cumul) / len(t_cumul)))
+
+
+if __name__ == "__main__":
+
+    # Parse command line options
+    from argparse import ArgumentParser
+
+    argprs = ArgumentParser(description="Benchmark module import times")
+
+    argprs.add_argument("--runs", dest="runs", type=int, default=10,
+                        help="Number of interpreters to time")
+
+    (options, args) = argprs.parse_known_args(sys.argv[1:])
+
+    main(options, args)
+
+# END
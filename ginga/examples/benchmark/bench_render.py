@@ -0,0 +1,106 @@
+#! /usr/bin/env python
+#
+# bench_render.py -- Benchmark redraw times of a ginga viewer.
+#
+# This is open-source software licensed under a BSD license.
+# Please see the file LICENSE.txt for details.
+#
+"""
+Usage:
+    $ python bench_render.py --width=3840 --height=2160 --rot=0,90,30
+
+Renders a synthetic image in an offscreen (PIL) viewer and reports the
+average time per frame for full (whence=0) redraws, panning a little
+between frames, for each of the requested rotation angles.
+"""
+import sys
+import time
+
+import numpy as np
+
+from ginga import AstroImage
+from ginga.misc import log
+from ginga.pilw.ImageViewPil import CanvasView
+
+
+def bench(viewer, num_frames):
+    pan_x, pan_y = viewer.get_pan()
+    # warm up caches and buffers
+    viewer.redraw_now(whence=0)
+
+    start_time = time.time()
+    for i in range(num_frames):
+        # NOTE: viewer is not deferring redraws, so this redraws
+        viewer.set_pan(pan_x + (i % 2), pan_y)
+    return (time.time() - start_time) / num_frames
+
+
+def main(options, args):
+
+    logger = log.get_logger("bench_render", options=options)
+
+    viewer = CanvasView(logger=logger)
+    viewer.configure_surface(options.width, options.height)
+    viewer.enable_autozoom('off')
+    viewer.enable_autocuts('off')
+    viewer.get_settings().set(interpolation=options.interpolation,
+                              image_render_threads=options.threads,
+                              image_warp=options.warp)
+
+    rs = np.random.RandomState(42)
+    data = rs.normal(1000.0, 100.0, (options.size, options.size))
+    image = AstroImage.AstroImage(logger=logger)
+    image.set_data(data.astype(options.dtype))
+    viewer.set_image(image)
+    viewer.cut_levels(700.0, 1300.0)
+    viewer.scale_to(options.scale, options.scale)
+
+    print("window %dx%d, image %dx%d %s, scale %.2f, interpolation %s, "
+          "threads %d, warp %s" % (
+              options.width, options.height, options.size, options.size,
+              options.dtype, options.scale, options.interpolation,
+              options.threads, options.warp))
+    for rot_deg in [float(s) for s in options.rot.split(',')]:
+        viewer.rotate(rot_deg)
+        elapsed = bench(viewer, options.frames)
+        ht, wd = viewer._rgbarr.shape[:2]
+        print("rot %6.1f deg: %8.2f ms/frame (backing image %dx%d)" % (
+            rot_deg, elapsed * 1000.0, wd, ht))
+
+
+if __name__ == "__main__":
+
+    # Parse command line options
+    from argparse import ArgumentParser
+
+    argprs = ArgumentParser(description="Benchmark viewer redraws")
+
+    argprs.add_argument("--width", dest="width", type=int, default=1920,
+                        help="Width of the viewer window")
+    argprs.add_argument("--height", dest="height", type=int, default=1080,
+                        help="Height of the viewer window")
+    argprs.add_argument("--size", dest="size", type=int, default=4096,
+                        help="Size of the (square) test image")
+    argprs.add_argument("--dtype", dest="dtype", default='float32',
+                        help="Data type of the test image")
+    argprs.add_argument("--scale", dest="scale", type=float, default=1.0,
+                        help="Viewer scale")
+    argprs.add_argument("--rot", dest="rot", default='0,90,30',
+                        help="Comma separated rotation angles (deg)")
+    argprs.add_argument("--interpolation", dest="interpolation",
+                        default='basic',
+                        help="Interpolation method for scaling")
+    argprs.add_argument("--threads", dest="threads", type=int, default=1,
+                        help="Number of threads for rendering the image")
+    argprs.add_argument("--warp", dest="warp", default=False,
+                        action="store_true",
+                        help="Warp images straight into the window")
+    argprs.add_argument("--frames", dest="frames", type=int, default=20,
+                        help="Number of frames to time")
+    log.addlogopts(argprs)
+
+    (options, args) = argprs.parse_known_args(sys.argv[1:])
+
+    main(options, args)
+
+# END
@@ -0,0 +1,96 @@
+#! /usr/bin/env python
+#
+# bench_resample.py -- Benchmark image resampling methods.
+#
+# This is open-source software licensed under a BSD license.
+# Please see the file LICENSE.txt for details.
+#
+"""
+Usage:
+    $ python bench_resample.py --size=4096 --scales=0.25,0.5,2.0
+
+Times resizing a synthetic image by each of the requested scales with the
+"basic" (nearest neighbor) index slicing and the numpy "linear" and "area"
+methods in ginga.trcalc, and with cv2.resize if OpenCV is installed.
+"""
+import sys
+import time
+
+import numpy as np
+
+from ginga import trcalc
+
+try:
+    import cv2
+    have_opencv = True
+except ImportError:
+    have_opencv = False
+
+
+def time_it(fn, num_iter):
+    # warm up
+    fn()
+    start_time = time.time()
+    for i in range(num_iter):
+        fn()
+    return (time.time() - start_time) / num_iter
+
+
+def main(options, args):
+
+    rs = np.random.RandomState(42)
+    data = rs.normal(1000.0, 100.0, (options.size, options.size))
+    data = data.astype(options.dtype)
+    x2 = y2 = options.size - 1
+
+    print("image %dx%d %s, opencv %s" % (
+        options.size, options.size, options.dtype,
+        "available" if have_opencv else "not installed"))
+
+    for scale in [float(s) for s in options.scales.split(',')]:
+        new_wd = new_ht = int(round(scale * options.size))
+
+        tests = [
+            ('basic', lambda: data[trcalc.get_scaled_cutout_wdht_view(
+                data.shape, 0, 0, x2, y2, new_wd, new_ht)[0]]),
+            ('numpy linear', lambda: trcalc.get_scaled_cutout_wdht_numpy(
+                data, 0, 0, x2, y2, new_wd, new_ht, interpolation='linear')),
+            ('numpy area', lambda: trcalc.get_scaled_cutout_wdht_numpy(
+                data, 0, 0, x2, y2, new_wd, new_ht, interpolation='area')),
+        ]
+        if have_opencv:
+            for name, method in [('nearest', cv2.INTER_NEAREST),
+                                 ('linear', cv2.INTER_LINEAR),
+                                 ('area', cv2.INTER_AREA)]:
+                tests.append(('cv2 %s' % name,
+                              lambda method=method: cv2.resize(
+                                  data, (new_wd, new_ht),
+                                  interpolation=method)))
+
+        for name, fn in tests:
+            elapsed = time_it(fn, options.iterations)
+            print("scale %5.2f  %-14s %8.2f ms" % (scale, name,
+                                                   elapsed * 1000.0))
+
+
+if __name__ == "__main__":
+
+    # Parse command line options
+    from argparse import ArgumentParser
+
+    argprs = ArgumentParser(description="Benchmark image resampling")
+
+    argprs.add_argument("--size", dest="size", type=int, default=4096,
+                        help="Size of the (square) test image")
+    argprs.add_argument("--dtype", dest="dtype", default='float32',
+                        help="Data type of the test image")
+    argprs.add_argument("--scales", dest="scales", default='0.25,0.5,2.0',
+                        help="Comma separated scales to resize by")
+    argprs.add_argument("--iterations", dest="iterations", type=int,
+                        default=5, help="Number of times to resize")
+
+    (options, args) = argprs.parse_known_args(sys.argv[1:])
+
+    main(options, args)
+
+# END
@@ -7,6 +7,7 @@
 import os
 import re
 import ast
+import copy
 
 import numpy as np
 
@@ -176,6 +177,10 @@ class SettingGroup(object):
                     str(args)))
             return args[1]
 
+    def get_snapshot(self):
+        """Get a `SettingGroupSnapshot` of the current values."""
+        return SettingGroupSnapshot(self)
+
     def get_dict(self, keylist=None):
         if keylist is None:
             keylist = self.group.keys()
@@ -318,6 +323,42 @@ class SettingGroup(object):
     setDict = set_dict
 
 
+class SettingGroupSnapshot(SettingGroup):
+    """The values of a `SettingGroup` as they were when the snapshot was
+    made, for reading in another thread without seeing changes that are
+    made meanwhile.  Changes made through the snapshot are passed on to
+    the group.
+    """
+
+    def __init__(self, settings):
+        SettingGroup.__init__(self, name=settings.name,
+                              logger=settings.logger,
+                              preffile=settings.preffile)
+        self._settings = settings
+        self.group = Bunch.Bunch([(key, copy.copy(setting))
+                                  for key, setting in settings.group.items()])
+        self._group_b = settings._group_b
+
+    def add_settings(self, **kwdargs):
+        self._settings.add_settings(**kwdargs)
+        self._update(kwdargs.keys())
+
+    def get_setting(self, key):
+        return self._settings.get_setting(key)
+
+    def set_dict(self, d, callback=True):
+        self._settings.set_dict(d, callback=callback)
+        self._update(d.keys())
+
+    def __setitem__(self, key, value):
+        self._settings[key] = value
+        self._update([key])
+
+    def _update(self, keylist):
+        for key in keylist:
+            self.group[key] = copy.copy(self._settings.group[key])
+
+
 class Preferences(object):
 
     def __init__(self, basefolder=None, logger=None):
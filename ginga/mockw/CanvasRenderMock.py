@@ -4,6 +4,8 @@
 # This is open-source software licensed under a BSD license.
 # Please see the file LICENSE.txt for details.
 #
+import numpy as np
+
 from ginga.canvas import render
 from ginga.fonts import font_asst
 # force registration of all canvas types
@@ -98,8 +100,42 @@ class CanvasRenderer(render.RendererBase):
     def __init__(self, viewer):
         render.RendererBase.__init__(self, viewer)
 
+        self.kind = 'mock'
         self.rgb_order = 'BGRA'
         self.surface = None
+        self.dims = ()
+
+    def resize(self, dims):
+        """Resize our drawing area to encompass a space defined by the
+        given dimensions.
+        """
+        width, height = dims[:2]
+        self.dims = (width, height)
+        self.logger.debug("renderer reconfigured to %dx%d" % (
+            width, height))
+        # the mock surface is simply a numpy array the size of the window
+        self.surface = np.zeros((height, width, len(self.rgb_order)),
+                                dtype=np.uint8)
+
+    def render_image(self, rgbobj, dst_x, dst_y):
+        """Render the image represented by (rgbobj) at dst_x, dst_y
+        in the pixel space.
+        *** internal method-- do not use ***
+        """
+        if self.surface is None:
+            return
+        self.logger.debug("redraw surface")
+
+        # render window contents directly into the surface
+        self.viewer.getwin_into(self.surface, order=self.rgb_order,
+                                dtype=np.uint8)
+
+    def get_surface_as_array(self, order=None):
+        if self.surface is None:
+            raise render.RenderError("No mock surface defined")
+
+        # adjust according to viewer's needed order
+        return self.reorder(order, self.surface)
 
     def setup_cr(self, shape):
         cr = RenderContext(self, self.viewer, self.surface)
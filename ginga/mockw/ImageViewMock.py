@@ -102,6 +102,7 @@ class ImageViewMock(ImageView.ImageViewBase):
             width, height))
         # TODO: allocate pixmap of width x height
         self.pixmap = None
+        self.renderer.resize((width, height))
 
         self.configure(width, height)
 
@@ -132,6 +132,8 @@ class CanvasRenderer(render.RendererBase):
         self.rgb_order = 'RGBA'
         self.surface = None
         self.dims = ()
+        # window sized buffer that the viewer renders into
+        self._buf = None
 
     def resize(self, dims):
         """Resize our drawing area to encompass a space defined by the
@@ -146,6 +148,8 @@ class CanvasRenderer(render.RendererBase):
         # NOTE: pillow needs an RGB surface in order to draw with alpha
         # blending, not RGBA
         self.surface = Image.new('RGB', (width, height), color=0)
+        self._buf = np.empty((height, width, len(self.rgb_order)),
+                             dtype=np.uint8)
 
     def render_image(self, rgbobj, dst_x, dst_y):
         """Render the image represented by (rgbobj) at dst_x, dst_y
@@ -156,19 +160,17 @@ class CanvasRenderer(render.RendererBase):
             return
         self.logger.debug("redraw surface")
 
-        # get window contents as a buffer and paste it into the PIL surface
-        # TODO: allow greater bit depths when support is better in PIL
-        rgb_arr = self.viewer.getwin_array(order=self.rgb_order, dtype=np.uint8)
-        p_image = Image.fromarray(rgb_arr)
-
-        if self.surface is None or p_image.size != self.surface.size:
+        width, height = self.viewer.get_window_size()
+        if (width, height) != self.surface.size:
             # window size must have changed out from underneath us!
-            width, height = self.viewer.get_window_size()
             self.resize((width, height))
-            if p_image.size != self.surface.size:
-                raise render.RenderError("Rendered image does not match window size")
 
-        self.surface.paste(p_image)
+        # render window contents into our buffer and decode it directly
+        # into the PIL surface, dropping the alpha channel
+        # TODO: allow greater bit depths when support is better in PIL
+        self.viewer.getwin_into(self._buf, order=self.rgb_order,
+                                dtype=np.uint8)
+        self.surface.frombytes(self._buf, 'raw', 'RGBX')
 
     def get_surface_as_array(self, order=None):
         if self.surface is None:
@@ -224,6 +224,14 @@ class CanvasRenderer(render.RendererBase):
             return
         self.logger.debug("drawing to surface")
 
+        size = self.surface.size()
+        if (self.surface_type == 'qimage' and
+                (size.width(), size.height()) == self.viewer.get_window_size()):
+            # render the window contents straight into the QImage memory
+            self.viewer.getwin_into(self._get_surface_buffer(),
+                                    order=self.rgb_order, dtype=np.uint8)
+            return
+
         # Prepare array for rendering
         # TODO: what are options for high bit depth under Qt?
         data = rgbobj.get_array(self.rgb_order, dtype=np.uint8)
@@ -251,6 +259,14 @@ class CanvasRenderer(render.RendererBase):
                           qimage,
                           QtCore.QRect(0, 0, width, height))
 
+    def _get_surface_buffer(self):
+        """Return a writable buffer onto the pixels of the QImage surface."""
+        ptr = self.surface.bits()
+        if hasattr(ptr, 'setsize'):
+            # PyQt
+            ptr.setsize(self.surface.byteCount())
+        return ptr
+
     def get_surface_as_array(self, order=None):
         if self.surface_type == 'qpixmap':
             qimg = self.surface.toImage()
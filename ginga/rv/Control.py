@@ -134,6 +134,8 @@ class GingaShell(GwMain.GwMain, Widgets.Application):
                                    pixel_coords_offset=1.0,
                                    # inherit from primary header
                                    inherit_primary_header=False,
+                                   # byte swap data to native order on load
+                                   native_byteorder=False,
                                    cursor_interval=0.050,
                                    download_folder=None,
                                    save_layout=False,
@@ -592,10 +594,12 @@ class GingaShell(GwMain.GwMain, Widgets.Application):
         """
         inherit_prihdr = self.settings.get('inherit_primary_header',
                                            False)
+        native_byteorder = self.settings.get('native_byteorder', False)
         try:
             data_obj = loader.load_data(filespec, logger=self.logger,
                                         idx=idx,
-                                        inherit_primary_header=inherit_prihdr)
+                                        inherit_primary_header=inherit_prihdr,
+                                        native_byteorder=native_byteorder)
         except Exception as e:
             errmsg = "Failed to load file '%s': %s" % (
                 filespec, str(e))
@@ -816,6 +820,8 @@ class GingaShell(GwMain.GwMain, Widgets.Application):
         inherit_prihdr = self.settings.get('inherit_primary_header',
                                            False)
         kwargs['inherit_primary_header'] = inherit_prihdr
+        kwargs['native_byteorder'] = self.settings.get('native_byteorder',
+                                                       False)
 
         # open the file and load the items named by the index
         opener = opener_class(self.logger)
@@ -1917,6 +1923,10 @@ class GingaShell(GwMain.GwMain, Widgets.Application):
         canvas.enable_draw(False)
         fi.set_canvas(canvas)
 
+        # for rendering in the background (channel setting
+        # "render_background")
+        fi.set_render_threadpool(self.get_threadPool(), self.gui_do)
+
         # check general settings for default value of enter_focus
         enter_focus = settings.get('enter_focus', None)
         if enter_focus is None:
@@ -377,10 +377,12 @@ class ReferenceViewer(object):
         from ginga.rv.Control import GingaShell, GuiLogHandler
 
         if settings.get('useMatplotlibColormaps', False):
-            # Add matplotlib color maps if matplotlib is installed
+            # Add matplotlib color maps if matplotlib is installed, when
+            # they are first needed
             try:
                 from ginga import cmap
-                cmap.add_matplotlib_cmaps(fail_on_import_error=False)
+                cmap.add_matplotlib_cmaps(fail_on_import_error=False,
+                                          lazy=True)
             except Exception as e:
                 logger.warning(
                     "failed to load matplotlib colormaps: %s" % (str(e)))
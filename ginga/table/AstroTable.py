@@ -123,6 +123,8 @@ class AstroTable(ViewerObjectBase):
         # These keywords might be provided but not used.
         if 'inherit_primary_header' in kwargs:
             kwargs.pop('inherit_primary_header')
+        if 'native_byteorder' in kwargs:
+            kwargs.pop('native_byteorder')
 
         ahdr = self.get_header()
 
@@ -1,9 +1,16 @@
+import gc
 import logging
+import queue
+import weakref
 
 import numpy as np
+import pytest
 
-from ginga import AstroImage
+from ginga import AstroImage, RGBImage, ImageView
+from ginga.misc import Task
 from ginga.mockw.ImageViewCanvasMock import ImageViewCanvas
+from ginga.canvas.types import image as image_types
+from ginga.util import rgb_cms
 
 
 class TestImageView(object):
@@ -25,6 +32,668 @@ class TestImageView(object):
         zoomlevel = viewer.get_zoom()
         assert zoomlevel == zoom
 
+    def test_buffer_pool(self):
+        viewer = self.viewer
+        viewer.set_window_size(900, 1100)
+        viewer.set_image(self.image)
+        rgbobj = viewer.get_rgb_object(whence=0)
+        rgbarr = viewer._rgbarr
+
+        # redraws reuse the same buffers
+        rgbobj2 = viewer.get_rgb_object(whence=0)
+        assert viewer._rgbarr is rgbarr
+        assert rgbobj2.rgbarr is rgbobj.rgbarr
+
+        # ...until the window is resized
+        viewer.set_window_size(500, 400)
+        viewer.get_rgb_object(whence=0)
+        assert viewer._rgbarr is not rgbarr
+
+    def test_getwin_into(self):
+        viewer = self.viewer
+        viewer.configure_window(300, 200)
+        viewer.set_image(self.image)
+        viewer.redraw_now()
+        expected = viewer.getwin_array(order='RGBA', dtype=np.uint8)
+
+        # renders straight into any writable buffer-protocol object
+        buf = bytearray(300 * 200 * 4)
+        arr = viewer.getwin_into(memoryview(buf), order='RGBA',
+                                 dtype=np.uint8)
+        assert arr.shape == (200, 300, 4)
+        assert np.shares_memory(arr, np.frombuffer(buf, dtype=np.uint8))
+        assert np.array_equal(arr, expected)
+
+        # the mock renderer renders into its own surface this way
+        surface = viewer.renderer.get_surface_as_array(order='RGBA')
+        assert np.array_equal(surface, expected)
+
+        # buffer of the wrong size is rejected
+        with pytest.raises(ImageView.ImageViewError):
+            viewer.getwin_into(bytearray(10), order='RGBA', dtype=np.uint8)
+
+    def test_refresh_whence(self):
+        viewer = self.viewer
+        viewer.configure_window(300, 200)
+        viewer.set_image(self.image)
+        viewer.redraw_now()
+
+        class Timer(object):
+            def start(self, delay):
+                pass
+
+            def clear(self):
+                pass
+
+        timer = Timer()
+        viewer.rf_timer = timer
+        viewer.set_refresh_rate(1.0)
+
+        # by default every frame is a full redraw
+        viewer.start_refresh()
+        viewer.refresh_timer_cb(timer, viewer.rf_flags)
+        viewer.redraw(whence=2)
+        viewer.refresh_timer_cb(timer, viewer.rf_flags)
+        assert viewer.get_refresh_stats()['whence_counts'] == {0: 3}
+        viewer.stop_refresh()
+
+        viewer.t_.set(refresh_dirty_only=True)
+        # first frame is a full redraw
+        viewer.start_refresh()
+        assert viewer.is_refreshing()
+
+        # nothing changed
+        viewer.refresh_timer_cb(timer, viewer.rf_flags)
+
+        # changes are coalesced to the lowest whence until the next frame
+        viewer.set_color_map('rainbow')
+        viewer.redraw(whence=3)
+        viewer.refresh_timer_cb(timer, viewer.rf_flags)
+        viewer.redraw(whence=1)
+        viewer.redraw(whence=2)
+        viewer.refresh_timer_cb(timer, viewer.rf_flags)
+
+        # data modified in place is redrawn when the image says so
+        self.image.make_callback('modified')
+        viewer.refresh_timer_cb(timer, viewer.rf_flags)
+
+        stats = viewer.get_refresh_stats()
+        assert stats['whence_counts'] == {0: 2, 1: 1, 2: 1}
+        assert stats['idle'] == 1
+
+        viewer.stop_refresh()
+        assert not viewer.is_refreshing()
+        viewer.t_.set(refresh_dirty_only=False)
+
+    def test_direct_lut(self):
+        viewer = self.viewer
+        viewer.configure_window(300, 200)
+        rs = np.random.RandomState(0)
+        data = rs.randint(-1000, 3000, (150, 250))
+        image = AstroImage.AstroImage(logger=self.logger)
+
+        for dtype in ['>i2', 'u1', 'u2', 'i4', 'u8']:
+            info = np.iinfo(dtype)
+            image.set_data(data.clip(info.min, info.max).astype(dtype))
+            viewer.set_image(image)
+            viewer.set_color_map('rainbow3')
+            for cuts in [(100, 2000), (500, 500)]:
+                viewer.cut_levels(*cuts)
+                res = []
+                for direct in [False, True]:
+                    viewer.t_.set(image_direct_lut=direct)
+                    viewer.redraw_now()
+                    res.append(viewer.renderer.get_surface_as_array().copy())
+                assert np.array_equal(res[0], res[1]), dtype
+
+        # the table is rebuilt for the precision of the scaling
+        for float32 in [True, False]:
+            viewer.t_.set(image_float32=float32)
+            viewer.redraw_now()
+            cache = viewer.get_canvas_image().get_cache(viewer)
+            assert cache.lut_key[-1] == float32
+
+        viewer.t_.set(image_direct_lut=True)
+
+    def test_incremental_pan(self):
+        viewer = self.viewer
+        viewer.configure_window(300, 200)
+        rs = np.random.RandomState(0)
+        data = rs.randint(-1000, 3000, (400, 700))
+        image = AstroImage.AstroImage(logger=self.logger)
+
+        for dtype in ['u2', 'i4', 'float32']:
+            image.set_data(data.astype(dtype))
+            viewer.set_image(image)
+            viewer.cut_levels(100, 2000)
+            canvas_img = viewer.get_canvas_image()
+            for direct in [False, True]:
+                viewer.t_.set(image_direct_lut=direct)
+                for scale in [1.0, 2.0, 0.5]:
+                    viewer.scale_to(scale, scale)
+                    viewer.set_pan(350, 200)
+                    viewer.redraw_now()
+                    for dx, dy in [(3, 0), (0, -2), (-8, 6), (400, 300)]:
+                        pan_x, pan_y = viewer.get_pan()
+                        viewer.set_pan(pan_x + dx, pan_y + dy)
+                        viewer.redraw_now()
+                        res1 = viewer.renderer.get_surface_as_array().copy()
+                        # compare with a redraw from scratch
+                        canvas_img.reset_optimize()
+                        viewer.redraw_now()
+                        res2 = viewer.renderer.get_surface_as_array().copy()
+                        assert np.array_equal(res1, res2), (dtype, scale)
+
+        viewer.t_.set(image_direct_lut=True)
+
+    def test_render_threads(self):
+        viewer = self.viewer
+        viewer.configure_window(400, 300)
+        rs = np.random.RandomState(0)
+        data = rs.randint(-1000, 3000, (400, 700))
+        image = AstroImage.AstroImage(logger=self.logger)
+
+        for dtype in ['u2', 'i4', 'float32']:
+            image.set_data(data.astype(dtype))
+            viewer.set_image(image)
+            for direct in [False, True]:
+                viewer.t_.set(image_direct_lut=direct)
+                for scale in [1.0, 1.7, 0.3]:
+                    viewer.scale_to(scale, scale)
+                    for cuts, cmap in [((100, 2000), 'gray'),
+                                       ((100, 2000), 'rainbow3'),
+                                       ((0, 500), 'rainbow3')]:
+                        res = []
+                        for numthreads in [1, 4]:
+                            viewer.t_.set(image_render_threads=numthreads)
+                            viewer.redraw_now(whence=0)
+                            # partial redraws
+                            viewer.cut_levels(*cuts)
+                            viewer.redraw_now(whence=1)
+                            viewer.set_color_map(cmap)
+                            viewer.redraw_now(whence=2)
+                            res.append(
+                                viewer.renderer.get_surface_as_array().copy())
+                        assert np.array_equal(res[0], res[1]), (dtype, scale)
+
+        viewer.t_.set(image_direct_lut=True, image_render_threads=1)
+
+    def test_pyramid_offset(self):
+        viewer = ImageViewCanvas(logger=self.logger)
+        viewer.configure_window(300, 200)
+        viewer.t_.set(image_pyramid=True, interpolation='basic')
+        image = RGBImage.RGBImage(logger=self.logger,
+                                  data_np=np.zeros((128, 160, 3), np.uint8))
+        image.pyramid_min_size = 16
+        image.build_pyramid()
+        obj = image_types.Image(0, 0, image=image, scale_x=2.0, scale_y=3.0)
+        viewer.get_canvas().add(obj, redraw=False)
+
+        # the level 2 cutout starts one image pixel before the requested
+        # one, i.e. 2 and 3 data pixels of the viewer at the scale of the
+        # object
+        data, off = obj._get_scaled_cutout(viewer, (101, 33), (159, 127),
+                                           (0.5, 0.5))
+        assert off == (-2.0, -3.0)
+
+    def test_cutout_cache(self):
+        rs = np.random.RandomState(0)
+        image = AstroImage.AstroImage(logger=self.logger)
+        image.set_data(rs.randint(0, 3000, (400, 700)).astype(np.uint16))
+
+        viewers = [ImageViewCanvas(logger=self.logger) for i in range(2)]
+        for viewer in viewers:
+            viewer.configure_window(300, 200)
+            viewer.t_.set(image_cutout_cache=True)
+            viewer.set_image(image)
+            viewer.cut_levels(100, 2000)
+        # budget of a few window sized cutouts of our own
+        cutout_cache = viewers[0].get_cutout_cache()
+        assert cutout_cache.limit == 4 * 300 * 200 * 8
+        viewers[1].set_cutout_cache(cutout_cache)
+
+        for scale in [0.5, 1.7]:
+            res = []
+            misses = cutout_cache.misses
+            for i, viewer in enumerate(viewers):
+                # (scaling may redraw already, depending on the time
+                # since the last redraw)
+                viewer.scale_to(scale, scale)
+                viewer.redraw_now(whence=0)
+                res.append(viewer.renderer.get_surface_as_array().copy())
+            # second viewer reuses the cutout made for the first
+            assert cutout_cache.misses == misses + 1
+            assert np.array_equal(res[0], res[1])
+
+        # a modified image needs a new cutout
+        misses = cutout_cache.misses
+        image.get_data()[:] = 1000
+        image.make_callback('modified')
+        viewer.redraw_now(whence=0)
+        assert cutout_cache.misses > misses
+        res = viewer.renderer.get_surface_as_array().copy()
+        assert np.all(res == res[100, 150])
+
+        # not caching (the default) shows data changed in place
+        viewer = viewers[0]
+        viewer.t_.set(image_cutout_cache=False)
+        assert cutout_cache.limit == 0 and len(cutout_cache) == 0
+        for scale in [0.5, 2.0]:
+            viewer.scale_to(scale, scale)
+            image.get_data()[:] = 100
+            viewer.redraw_now(whence=0)
+            res1 = viewer.renderer.get_surface_as_array().copy()
+            image.get_data()[:] = 2000
+            viewer.redraw_now(whence=0)
+            res2 = viewer.renderer.get_surface_as_array()
+            assert not np.array_equal(res1, res2)
+
+    def test_cutout_cache_release(self):
+        viewer = ImageViewCanvas(logger=self.logger)
+        viewer.configure_window(300, 200)
+        viewer.t_.set(interpolation='basic', image_cutout_cache=True)
+        image = AstroImage.AstroImage(logger=self.logger)
+        data = np.random.RandomState(0).random_sample((400, 700))
+        image.set_data(data)
+        ref = weakref.ref(data)
+        del data
+        # at integer scales the cutout is a view of the image data
+        for scale in [1.0, 2.0]:
+            viewer.set_image(image)
+            viewer.scale_to(scale, scale)
+            viewer.redraw_now(whence=0)
+
+        # releasing the image frees its data
+        image2 = AstroImage.AstroImage(logger=self.logger)
+        image2.set_data(np.zeros((10, 10)))
+        viewer.set_image(image2)
+        viewer.redraw_now(whence=0)
+        del image
+        gc.collect()
+        assert ref() is None
+
+    def test_cutout_cache_lru(self):
+        cutout_cache = ImageView.CutoutCache(limit=1000)
+        for i in range(4):
+            cutout_cache.put(i, i, 300)
+        assert len(cutout_cache) == 3 and cutout_cache.nbytes == 900
+        assert cutout_cache.get(0) is None
+        # using an entry keeps it in the cache
+        assert cutout_cache.get(1) == 1
+        cutout_cache.put(4, 4, 300)
+        assert cutout_cache.get(1) == 1
+        assert cutout_cache.get(2) is None
+        cutout_cache.put(5, 5, 2000)
+        assert cutout_cache.get(5) is None
+        cutout_cache.set_limit(300)
+        assert len(cutout_cache) == 1 and cutout_cache.get(1) == 1
+
+    def test_progressive(self):
+        viewer = ImageViewCanvas(logger=self.logger)
+        viewer.configure_window(300, 200)
+        rs = np.random.RandomState(0)
+        image = AstroImage.AstroImage(logger=self.logger)
+        image.set_data(rs.randint(0, 3000, (400, 700)).astype(np.uint16))
+        viewer.set_image(image)
+        viewer.cut_levels(100, 2000)
+        viewer.t_.set(image_progressive=True, progressive_frame_time=1.0e-6,
+                      progressive_idle_time=10.0,
+                      progressive_max_decimation=2)
+
+        for warp in [False, True]:
+            viewer.t_.set(image_warp=warp)
+            while viewer.is_redraw_pending():
+                viewer.delayed_redraw()
+            # not part of a gesture: full resolution
+            viewer.time_last_redraw = -100.0
+            viewer.redraw_now(whence=0)
+            assert viewer.get_render_decimation() == 1
+            full = viewer.renderer.get_surface_as_array().copy()
+
+            # quick succession of redraws: coarse preview
+            viewer.redraw_now(whence=0)
+            assert viewer.get_render_decimation() == 2
+            coarse = viewer.renderer.get_surface_as_array().copy()
+            assert not np.array_equal(coarse, full)
+            # made of the pixels of the full resolution frame
+            assert np.all(np.isin(coarse.view('u4'), full.view('u4')))
+            # in blocks of 2x2 pixels
+            rows = coarse.view('u4')[:, :, 0]
+            assert np.mean(rows[:, 1:] == rows[:, :-1]) > 0.45
+            assert np.mean(rows[1:] == rows[:-1]) > 0.45
+
+            # refined when input goes idle
+            viewer.delayed_redraw()
+            assert viewer.get_render_decimation() == 1
+            assert np.array_equal(viewer.renderer.get_surface_as_array(),
+                                  full)
+
+    def test_render_background(self):
+        rs = np.random.RandomState(0)
+        image = AstroImage.AstroImage(logger=self.logger)
+        image.set_data(rs.randint(0, 3000, (400, 700)).astype(np.uint16))
+        viewers = []
+        for i in range(2):
+            viewer = ImageViewCanvas(logger=self.logger)
+            viewer.configure_window(300, 200)
+            viewer.set_image(image)
+            viewer.cut_levels(100, 2000)
+            viewers.append(viewer)
+        ref_viewer, viewer = viewers
+
+        # calls into the "GUI thread" are queued up here
+        gui_queue = queue.Queue()
+        tpool = Task.ThreadPool(numthreads=1, logger=self.logger)
+        tpool.startall(wait=True)
+        viewer.set_render_threadpool(
+            tpool, lambda method, *args: gui_queue.put((method, args)))
+        viewer.t_.set(render_background=True)
+        assert viewer.is_background_rendering()
+
+        def run_gui():
+            # process GUI calls until the worker is done with all frames
+            count = 0
+            while True:
+                try:
+                    method, args = gui_queue.get(timeout=0.05)
+                except queue.Empty:
+                    if not viewer._bg_busy:
+                        return count
+                    continue
+                method(*args)
+                count += 1
+
+        try:
+            for pan in [(200.0, 150.0), (210.5, 160.0), (230.0, 120.0)]:
+                for v in viewers:
+                    v.set_pan(*pan)
+                ref_viewer.redraw_now(whence=0)
+                viewer.redraw_now(whence=0)
+                assert run_gui() >= 1
+                assert np.array_equal(
+                    viewer.renderer.get_surface_as_array(),
+                    ref_viewer.renderer.get_surface_as_array())
+
+            # requests made while a frame is rendered are merged
+            for i in range(10):
+                viewer.set_pan(200.0 + i, 150.0)
+                viewer.redraw_now(whence=0)
+            ref_viewer.set_pan(209.0, 150.0)
+            ref_viewer.redraw_now(whence=0)
+            assert run_gui() < 10
+            assert np.array_equal(viewer.renderer.get_surface_as_array(),
+                                  ref_viewer.renderer.get_surface_as_array())
+        finally:
+            tpool.stopall(wait=True)
+
+    def test_render_background_state(self):
+        rs = np.random.RandomState(0)
+        image = AstroImage.AstroImage(logger=self.logger)
+        image.set_data(rs.randint(0, 3000, (400, 700)).astype(np.uint16))
+        viewers = []
+        for i in range(2):
+            viewer = ImageViewCanvas(logger=self.logger)
+            viewer.configure_window(300, 200)
+            viewer.set_image(image)
+            viewer.cut_levels(100, 2000)
+            viewers.append(viewer)
+        ref_viewer, viewer = viewers
+
+        # worker tasks and calls into the "GUI thread" are run by hand
+        tasks, gui_calls = [], []
+
+        class ThreadPool(object):
+            def addTask(self, task):
+                tasks.append(task)
+
+        viewer.set_render_threadpool(
+            ThreadPool(), lambda method, *args: gui_calls.append(args))
+        viewer.t_.set(render_background=True)
+        viewer._bg_present_timeout = 0.01
+
+        refs = []
+        for pan in [(200.0, 150.0), (230.0, 120.0)]:
+            ref_viewer.set_pan(*pan)
+            ref_viewer.redraw_now(whence=0)
+            refs.append(ref_viewer.renderer.get_surface_as_array().copy())
+
+            viewer.set_pan(*pan)
+            viewer.redraw_now(whence=0)
+            # changes made after the frame was requested (before they
+            # request a frame of their own) do not affect it
+            viewer.t_.set(pan=(0.0, 0.0), callback=False)
+            live = dict([(name, viewer.__dict__[name])
+                         for name in ImageView._render_attr_names])
+            tasks.pop(0).execute()
+            # the worker keeps the geometry of the frame to itself
+            assert all([viewer.__dict__[name] is value
+                        for name, value in live.items()])
+
+        # the second frame was rendered while the first one was still
+        # waiting to be shown, so it could not reuse its buffer
+        assert len(gui_calls) == 2
+        assert gui_calls[0][0].buf != gui_calls[1][0].buf
+        assert gui_calls[1][0].state.attrs['_org_x'] == 230.0 - 0.5
+        for args, ref in zip(gui_calls, refs):
+            viewer._present_frame(*args)
+            assert np.array_equal(viewer.renderer.get_surface_as_array(),
+                                  ref)
+
+    def test_output_profile_lut(self):
+        class InvertLUT(object):
+            # stands in for the lookup table of a profile transform
+            def __init__(self):
+                self.sizes = []
+
+            def convert_colors(self, colors):
+                return 255 - np.asarray(colors, dtype=np.uint8)
+
+            def convert(self, image_np):
+                self.sizes.append(image_np.size // 3)
+                return 255 - image_np
+
+        rs = np.random.RandomState(0)
+        image = AstroImage.AstroImage(logger=self.logger)
+        image.set_data(rs.randint(0, 3000, (400, 700)).astype(np.uint16))
+        rgb = RGBImage.RGBImage(logger=self.logger,
+                                data_np=rs.randint(0, 256, (50, 60, 3)).astype(
+                                    np.uint8))
+        viewer = ImageViewCanvas(logger=self.logger)
+        viewer.configure_window(300, 200)
+        viewer.set_image(image)
+        viewer.cut_levels(100, 2000)
+        Image = viewer.get_canvas().get_draw_class('image')
+        viewer.get_canvas().add(Image(20, 30, rgb))
+        viewer.redraw_now(whence=0)
+        expected = viewer.renderer.get_surface_as_array().copy()
+        expected[..., :3] = 255 - expected[..., :3]
+
+        icc_lut = InvertLUT()
+        key = ('working', 'output', 'perceptual', None, 'perceptual', False)
+        working_profile = rgb_cms.working_profile
+        rgb_cms.working_profile = 'working'
+        rgb_cms.icc_lut[key] = icc_lut
+        try:
+            viewer.t_.set(icc_output_profile='output')
+            assert viewer.get_output_profile_lut() is icc_lut
+            viewer.redraw_now(whence=0)
+            assert np.array_equal(viewer.renderer.get_surface_as_array(),
+                                  expected)
+            # the color mapped image was converted through its color map,
+            # only the (scaled) true color image pixel by pixel
+            assert len(icc_lut.sizes) == 1
+            assert icc_lut.sizes[0] <= 50 * 60
+        finally:
+            rgb_cms.working_profile = working_profile
+            del rgb_cms.icc_lut[key]
+
+    def test_warp_geometry(self):
+        viewer = ImageViewCanvas(logger=self.logger)
+        viewer.configure_window(300, 240)
+        viewer.enable_autozoom('off')
+        viewer.set_bg(0.0, 0.0, 0.0)
+        viewer.t_.set(image_warp=True)
+
+        # each pixel holds its own X and Y index
+        yi, xi = np.mgrid[0:200, 0:250]
+        rgb = np.dstack((xi, yi, np.full(xi.shape, 255))).astype(np.uint8)
+        image = RGBImage.RGBImage(data_np=rgb, logger=self.logger)
+        Image = viewer.get_canvas().get_draw_class('image')
+        viewer.get_canvas().add(Image(0, 0, image))
+        viewer.set_pan(120.3, 95.7)
+
+        wy, wx = np.mgrid[0:240, 0:300]
+        win_pts = np.array([wx.ravel() + 0.5, wy.ravel() + 0.5]).T
+        for scale, rot, flip_x, swap_xy in [(1.0, 0.0, False, False),
+                                            (1.7, 30.0, False, False),
+                                            (0.6, 217.0, True, True)]:
+            viewer.scale_to(scale, scale)
+            viewer.rotate(rot)
+            viewer.transform(flip_x, False, swap_xy)
+            viewer.redraw_now()
+            res = viewer.renderer.get_surface_as_array(order='RGB')
+
+            # every window pixel shows the image pixel under its center
+            data_pts = viewer.tform['data_to_window'].from_(win_pts)
+            idx = np.floor(data_pts + 0.5).astype(int).reshape(240, 300, 2)
+            inside = ((idx[..., 0] >= 0) & (idx[..., 0] < 250) &
+                      (idx[..., 1] >= 0) & (idx[..., 1] < 200))
+            assert np.array_equal(res[..., 2] == 255, inside)
+            assert np.array_equal(res[inside][:, :2], idx[inside])
+
+    def test_warp_matches(self):
+        viewer = self.viewer
+        viewer.configure_window(300, 240)
+        rs = np.random.RandomState(0)
+        image = AstroImage.AstroImage(logger=self.logger)
+        image.set_data(rs.randint(0, 3000, (300, 400)).astype(np.uint16))
+        viewer.set_image(image)
+        viewer.cut_levels(100, 2000)
+        viewer.scale_to(1.0, 1.0)
+        viewer.set_pan(180.3, 140.7)
+
+        # at unit scale and right angles warping samples the same pixels
+        for rot, flip_x, flip_y, swap_xy in [(0, False, False, False),
+                                             (0, True, False, True),
+                                             (90, False, True, False),
+                                             (180, True, True, False)]:
+            viewer.rotate(rot)
+            viewer.transform(flip_x, flip_y, swap_xy)
+            res = []
+            for warp in [False, True]:
+                viewer.t_.set(image_warp=warp)
+                viewer.redraw_now()
+                res.append(viewer.renderer.get_surface_as_array().copy())
+            assert np.array_equal(res[0], res[1])
+
+        viewer.rotate(0.0)
+        viewer.transform(False, False, False)
+        viewer.t_.set(image_warp=False)
+
+    def test_histeq_cached(self):
+        viewer = self.viewer
+        viewer.configure_window(300, 200)
+        rs = np.random.RandomState(0)
+        image = AstroImage.AstroImage(logger=self.logger)
+        image.set_data(rs.rand(400, 500) ** 3)
+        viewer.set_image(image)
+        viewer.set_color_algorithm('histeq')
+        viewer.cut_levels(0.0, 1.0)
+        viewer.redraw_now()
+
+        # the table is fixed for the image and cut levels
+        dist = viewer.get_rgbmap().get_dist()
+        key = dist.get_hash_key()
+        assert key is not None
+        tbl = dist.hash
+        viewer.set_pan(100, 100)
+        viewer.redraw_now()
+        assert dist.get_hash_key() == key
+        assert dist.hash is tbl
+
+        # and recomputed when they change
+        viewer.cut_levels(0.0, 0.5)
+        viewer.redraw_now()
+        assert dist.get_hash_key() != key
+        assert dist.hash is not tbl
+
+        image.set_data(image.get_data() * 0.5)
+        key = dist.get_hash_key()
+        viewer.redraw_now()
+        assert dist.get_hash_key() != key
+
+        viewer.set_color_algorithm('linear')
+
+    def test_contrast_remap(self):
+        viewer = self.viewer
+        viewer.configure_window(300, 200)
+        rs = np.random.RandomState(0)
+        for data in [rs.rand(150, 250), rs.randint(0, 3000, (150, 250))]:
+            image = AstroImage.AstroImage(logger=self.logger)
+            image.set_data(data)
+            viewer.set_image(image)
+            viewer.set_color_map('rainbow3')
+            viewer.cut_levels(data.min(), data.max())
+            viewer.redraw_now()
+            cache = viewer.get_canvas_image().get_cache(viewer)
+            prergb = cache.prergb
+
+            for scale_pct, shift_pct, hashsize in [(0.5, 0.1, 65535),
+                                                   (1.5, -0.2, 65535),
+                                                   (0.8, 0.0, 256)]:
+                viewer.get_rgbmap().set_hash_size(hashsize)
+                viewer.scale_and_shift_cmap(scale_pct, shift_pct)
+                # only the color mapping is redone
+                viewer.redraw_now(whence=2)
+                res = viewer.renderer.get_surface_as_array().copy()
+                if hashsize == 65535 and prergb is not None:
+                    assert cache.prergb is prergb
+                viewer.redraw_now(whence=0)
+                assert np.array_equal(
+                    res, viewer.renderer.get_surface_as_array())
+                prergb = cache.prergb
+
+            viewer.get_rgbmap().set_hash_size(65535)
+            viewer.restore_contrast()
+
+    def test_float32(self):
+        viewer = self.viewer
+        viewer.configure_window(300, 200)
+        viewer.set_color_map('gray')
+        rs = np.random.RandomState(0)
+        data = rs.rand(150, 250) * 3000.0
+        data[10, :3] = [np.nan, np.inf, -np.inf]
+        image = AstroImage.AstroImage(logger=self.logger)
+
+        for dtype in ['float64', 'float32', 'int32', 'int16']:
+            image.set_data(np.nan_to_num(data).astype(dtype)
+                           if dtype.startswith('int') else
+                           data.astype(dtype))
+            viewer.set_image(image)
+            viewer.cut_levels(100.0, 2000.0)
+            for interp, warp, scale in [('basic', False, 1.7),
+                                        ('linear', False, 0.6),
+                                        ('linear', True, 1.3)]:
+                viewer.t_.set(interpolation=interp)
+                viewer.t_.set(image_warp=warp)
+                viewer.scale_to(scale, scale)
+                res, idx = [], []
+                for single in [False, True]:
+                    viewer.t_.set(image_float32=single)
+                    viewer.redraw_now()
+                    cache = viewer.get_canvas_image().get_cache(viewer)
+                    if cache.prergb is not None:
+                        idx.append(cache.prergb.astype(np.int64))
+                    res.append(viewer.renderer.get_surface_as_array()
+                               .astype(np.int64))
+                # within one level of the double precision result
+                assert np.all(np.abs(res[0] - res[1]) <= 1), dtype
+                if len(idx) == 2:
+                    assert np.all(np.abs(idx[0] - idx[1]) <= 1), dtype
+
+        viewer.t_.set(image_float32=False, image_warp=False)
+        viewer.t_.set(interpolation='basic')
+
     def test_pan(self):
         viewer = self.viewer
         viewer.set_window_size(900, 1100)
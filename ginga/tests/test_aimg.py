@@ -86,4 +86,110 @@ class TestAstroImage(object):
         hdu2 = self.image.as_hdu()
         assert isinstance(hdu2, fits.PrimaryHDU)
 
+    def test_pyramid(self):
+        """Test building and invalidating the image pyramid.
+        """
+        image = AstroImage.AstroImage(logger=self.logger)
+        image.pyramid_min_size = 16
+        image.set_data(np.ones((128, 100)))
+
+        image.build_pyramid()
+        assert [level.factor for level in image._pyramid] == [2, 4]
+        assert image._pyramid[-1].data.shape == (32, 25)
+
+        # no level is suitable if we are not scaling down enough
+        assert image.get_pyramid_level(0.6) is None
+        assert image.get_pyramid_level(0.5).factor == 2
+        assert image.get_pyramid_level(0.1).factor == 4
+
+        # modifying the image drops the pyramid, and gives the data a
+        # single new generation
+        changes = len(image._changes)
+        image.set_data(np.ones((64, 64)))
+        assert len(image._pyramid) == 0
+        assert len(image._changes) == changes + 1
+
+    def test_native_byteorder(self):
+        """Test byte swapping big-endian data into native order on load.
+        """
+        data = np.arange(60, dtype='>f4').reshape((3, 4, 5))
+        image = AstroImage.AstroImage(logger=self.logger)
+
+        # data is left as is by default
+        image.load_data(data[0])
+        assert image.get_data().dtype == np.dtype('>f4')
+
+        image.load_data(data[0], native_byteorder=True)
+        assert image.get_data().dtype.isnative
+        assert image.get_mddata().dtype.isnative
+        np.testing.assert_array_equal(image.get_data(), data[0])
+
+        # cubes are swapped a slice at a time
+        image = AstroImage.AstroImage(logger=self.logger,
+                                      native_byteorder=True)
+        image.load_data(data)
+        assert image.get_mddata() is data
+        image.set_naxispath([2])
+        assert image.get_data().dtype.isnative
+        np.testing.assert_array_equal(image.get_data(), data[2])
+
+    def test_native_byteorder_fits(self, tmpdir):
+        """Test loading a FITS file into native byte order.
+        """
+        path = str(tmpdir.join('test.fits'))
+        fits.PrimaryHDU(np.arange(20, dtype=np.int16).reshape((4, 5))
+                        ).writeto(path)
+        image = AstroImage.AstroImage(logger=self.logger)
+
+        image.load_file(path)
+        assert not image.get_data().dtype.isnative
+
+        image.load_file(path, native_byteorder=True)
+        assert image.get_data().dtype == np.dtype('=i2')
+        assert image.get_data()[3, 4] == 19
+
+    def test_stats(self):
+        """Test the lazily computed, cached statistics of the data.
+        """
+        data = np.arange(20, dtype=np.float32).reshape((4, 5))
+        data[0, 0] = np.nan
+        data[1, 1] = np.inf
+        data[2, 2] = np.nan
+        image = AstroImage.AstroImage(logger=self.logger)
+        image.load_data(data)
+
+        # nothing is computed until asked for
+        assert not image.has_stats()
+        assert image.get_minmax() == (1.0, np.inf)
+        assert image.has_stats()
+        assert image.get_minmax(noinf=True) == (1.0, 19.0)
+        assert image.get_nan_count() == 2
+        mask = image.get_finite_mask()
+        assert np.count_nonzero(~mask) == 3
+        # only the counts are kept, not the mask
+        assert all(np.ndim(val) == 0 for val in image._stats.values())
+
+        stats = image.get_stats()
+        assert stats.maxval_noinf == 19.0
+        stats = image.get_stats(finite_mask=True)
+        np.testing.assert_array_equal(stats.finite_mask, mask)
+
+        # modifying the data in place and notifying invalidates the stats
+        data[1, 1] = 100.0
+        image.make_callback('modified')
+        assert not image.has_stats()
+        assert image.get_minmax() == (1.0, 100.0)
+        assert image.get_nan_count() == 2
+
+        # all finite data has no mask
+        image.set_data(np.arange(10).reshape((2, 5)))
+        assert image.get_nan_count() == 0
+        assert image.get_finite_mask() is None
+        assert image.get_minmax() == (0, 9)
+
+        # the min/max can be set, e.g. by subclasses that know them
+        image.minval, image.maxval = -1, 10
+        assert image.get_minmax() == (-1, 10)
+        assert image.get_minmax(noinf=True) == (0, 9)
+
 # END
@@ -0,0 +1,170 @@
+"""Test AutoCuts.py"""
+
+import numpy as np
+import pytest
+
+from ginga import AutoCuts, AstroImage
+from ginga.misc import log
+
+
+class TestAutoCuts(object):
+    def setup_class(self):
+        self.logger = log.get_logger("TestAutoCuts", null=True)
+
+        rs = np.random.RandomState(1)
+        self.data = rs.normal(1000.0, 50.0, (1000, 1200)).astype(np.float32)
+        # a bright band along one edge
+        self.data[:, :100] += 3000.0
+        self.image = AstroImage.AstroImage(self.data, logger=self.logger)
+
+    @pytest.mark.parametrize('method', ['grid', 'stratified'])
+    def test_sample_data(self, method):
+        sample = AutoCuts.sample_data(self.data, 10000, method=method)
+        assert 0.8 * 10000 < sample.size <= 10000
+        # covers the edges of the data
+        frac = np.count_nonzero(sample > 2500.0) / float(sample.size)
+        assert abs(frac - 100.0 / 1200.0) < 0.02
+        # repeatable
+        np.testing.assert_array_equal(
+            AutoCuts.sample_data(self.data, 10000, method=method), sample)
+
+    def test_sample_data_small(self):
+        assert AutoCuts.sample_data(self.data, None) is self.data
+        assert AutoCuts.sample_data(self.data, self.data.size) is self.data
+        with pytest.raises(AutoCuts.AutoCutsError):
+            AutoCuts.sample_data(self.data, 100, method='bogus')
+
+    @pytest.mark.parametrize('kind', ['histogram', 'stddev'])
+    def test_sampled_cut_levels(self, kind):
+        ac = AutoCuts.get_autocuts(kind)(self.logger)
+        ac.update_params(usecrop=False, sample_points=50000)
+        lo, hi = ac.calc_cut_levels(self.image)
+
+        ac.update_params(sample_points=None)
+        lo_all, hi_all = ac.calc_cut_levels(self.image)
+
+        assert abs(lo - lo_all) < 25.0
+        assert abs(hi - hi_all) < 25.0
+
+    @pytest.mark.parametrize('dtype', ['>i2', 'uint16', 'float32'])
+    def test_histogram_fixed(self, dtype):
+        data = self.data.astype(dtype)
+        lo, hi = data.min(), data.max()
+        dist, bins = AutoCuts.histogram_fixed(data, 512, lo, hi)
+        exp_dist, exp_bins = np.histogram(data, bins=512, range=(lo, hi))
+        np.testing.assert_array_equal(dist, exp_dist)
+        np.testing.assert_array_equal(bins, exp_bins)
+
+    def test_histogram_nan(self):
+        data = self.data.copy()
+        data[::7, ::3] = np.nan
+        ac = AutoCuts.Histogram(self.logger)
+        bnch = ac.calc_histogram(data, pct=0.99, numbins=1024)
+
+        # NaNs are counted as the midpoint of the range, without a copy
+        minval, maxval = np.nanmin(data), np.nanmax(data)
+        subst = data.copy()
+        subst[np.isnan(subst)] = (minval + maxval) / 2.0
+        exp_dist, exp_bins = np.histogram(subst, bins=1024)
+        np.testing.assert_array_equal(bnch.dist, exp_dist)
+
+    def test_histogram_incremental(self):
+        data = self.data.copy()
+        # keep the extremes of the data out of the modified region
+        data[-1, -1], data[-1, -2] = 500.0, 5000.0
+        image = AstroImage.AstroImage(data, logger=self.logger)
+        params = dict(usecrop=False, sample_points=None)
+        ac = AutoCuts.Histogram(self.logger)
+        ac.update_params(**params)
+        ac_inc = AutoCuts.Histogram(self.logger)
+        ac_inc.update_params(incremental=True, **params)
+        ac_inc.tile_size = 128
+
+        assert ac_inc.calc_cut_levels(image) == ac.calc_cut_levels(image)
+        tiles = ac_inc._tiles
+
+        # modify part of the data in place, within the histogram range
+        data[300:400, 500:700] = data[0:100, 1000:1200]
+        image.note_modified_region(500, 300, 700, 400)
+        image.make_callback('modified')
+        counts = tiles.counts.copy()
+        assert ac_inc.calc_cut_levels(image) == ac.calc_cut_levels(image)
+        # only the touched tiles were counted again
+        assert ac_inc._tiles is tiles
+        changed = np.any(tiles.counts != counts, axis=2)
+        assert not np.any(changed[:2]) and not np.any(changed[4:])
+
+        # modified without a region: everything is counted again
+        data[0, 0] = np.nan
+        image.make_callback('modified')
+        assert ac_inc.calc_cut_levels(image) == ac.calc_cut_levels(image)
+        assert ac_inc._tiles is not tiles
+
+    def test_zscale_cached(self):
+        image = AstroImage.AstroImage(self.data.copy(), logger=self.logger)
+        ac = AutoCuts.ZScale(self.logger)
+        levels = ac.calc_cut_levels(image)
+
+        # a new instance with the same parameters uses the cached levels
+        ac2 = AutoCuts.ZScale(self.logger)
+        ac2.calc_zscale = None
+        assert ac2.calc_cut_levels(image) == levels
+
+        # but not when the parameters or the data change
+        ac2 = AutoCuts.ZScale(self.logger, contrast=0.5)
+        assert ac2.calc_cut_levels(image) != levels
+        image.get_data()[:] *= 2.0
+        image.make_callback('modified')
+        lo, hi = ac.calc_cut_levels(image)
+        assert abs(lo - 2 * levels[0]) < 1.0e-3 * abs(lo)
+
+    def test_zscale_levels(self):
+        # samples evenly spaced over the whole image, which include the
+        # bright band; these levels changed with AutoCuts.sample_data()
+        ac = AutoCuts.ZScale(self.logger)
+        lo, hi = ac.calc_cut_levels(self.image)
+        assert np.isclose(lo, 844.7250366210938)
+        assert np.isclose(hi, 1309.7559108876785)
+
+        ac.update_params(sample_method='stratified')
+        lo, hi = ac.calc_cut_levels(self.image)
+        assert np.isclose(lo, 858.3796997070312)
+        assert np.isclose(hi, 1337.487677769892)
+
+    def test_zscale_samples(self):
+        from ginga.util import zscale
+        rs = np.random.RandomState(0)
+        samples = rs.normal(100.0, 10.0, 5000)
+        samples[:250] += 1000.0
+        z1, z2 = zscale.zscale_samples(samples, contrast=0.25)
+        assert np.isclose(z1, 62.59899362048221)
+        assert np.isclose(z2, 162.25706932964835)
+
+        # growing the rejection mask is like convolving it
+        badpix = rs.rand(200) > 0.97
+        for ngrow in (1, 2, 5, 6):
+            exp = np.convolve(badpix.astype(int), np.ones(ngrow, dtype=int),
+                              mode='same') > 0
+            np.testing.assert_array_equal(
+                zscale.zsc_grow_mask(badpix, ngrow), exp)
+
+    @pytest.mark.parametrize('klass', ['Minmax', 'Clip'])
+    @pytest.mark.parametrize('dtype', ['float64', 'float32', '>f8',
+                                       'int16', 'int32', 'uint16'])
+    def test_cut_levels_float32(self, klass, dtype):
+        ac = getattr(AutoCuts, klass)(self.logger)
+        rs = np.random.RandomState(0)
+        data = (rs.rand(300, 400) * 3000.0).astype(dtype)
+        if data.dtype.kind == 'f':
+            data[0, :3] = [np.nan, np.inf, -np.inf]
+        vmax = 65534
+
+        for loval, hival in [(100.0, 2000.0), (500.0, 500.0)]:
+            exp = ac.cut_levels(data, loval, hival, vmin=0, vmax=vmax)
+            res = ac.cut_levels(data, loval, hival, vmin=0, vmax=vmax,
+                                dtype=np.float32)
+            assert res.dtype == np.float32
+            # same color indexes, give or take one
+            exp, res = exp.astype(np.uint), res.astype(np.uint)
+            assert np.all(np.abs(exp.astype(np.int64) -
+                                 res.astype(np.int64)) <= 1)
@@ -92,6 +92,21 @@ class TestCmap(object):
         actual = set(ginga.cmap.get_names())  # Can include matplotlib names
         assert expected <= actual
 
+    def test_builtin_cmap(self):
+        cm = ginga.cmap.PackedColorMap('gray')
+        # color list is only read when first used
+        assert 'clst' not in cm.__dict__
+
+        assert len(cm.clst) == ginga.cmap.min_cmap_len
+        assert cm.clst[0] == (0.0, 0.0, 0.0)
+        assert cm.clst[-1] == (1.0, 1.0, 1.0)
+        assert ginga.cmap.get_cmap('gray').clst == cm.clst
+        assert ginga.cmap.cmap_gray == cm.clst
+        assert ginga.cmap.cmap_ramp == cm.clst
+
+        with pytest.raises(AttributeError):
+            ginga.cmap.cmap_non_existent_name
+
     # TODO: Add tests for matplotlib functions
 
 # END
@@ -61,3 +61,23 @@ class TestColorDist(object):
         y = dist.hash_array(self.data)
         expected_y = self.scale_and_rescale(dist_name, self.data)
         np.testing.assert_allclose(y, expected_y)
+
+    def test_histeq_hash_data(self):
+        dist = cd.get_dist('histeq')(self.hashsize, colorlen=self.colorlen)
+        assert dist.data_dependent
+        rs = np.random.RandomState(0)
+        idx = (rs.rand(10000) ** 2 * (self.hashsize - 1)).astype(np.uint)
+        expected = dist.hash_array(idx)
+
+        # once fixed, the table no longer depends on the data hashed
+        dist.set_hash_data(idx, 'key')
+        assert dist.get_hash_key() == 'key'
+        assert not dist.data_dependent
+        np.testing.assert_array_equal(dist.hash_array(idx), expected)
+        np.testing.assert_array_equal(dist.hash_array(idx[:10]),
+                                      expected[:10])
+
+        # changing the hash size resets the table
+        dist.set_hash_size(self.hashsize)
+        assert dist.get_hash_key() is None
+        assert dist.data_dependent
@@ -84,4 +84,16 @@ class TestCmap(object):
         actual = ginga.imap.get_names()
         assert expected == actual
 
+    def test_builtin_imap(self):
+        im = ginga.imap.PackedIntensityMap('ramp')
+        # intensity list is only read when first used
+        assert 'ilst' not in im.__dict__
+
+        np.testing.assert_allclose(im.ilst,
+                                   np.linspace(0, 1, ginga.imap.min_imap_len),
+                                   atol=0.005)
+        assert ginga.imap.get_imap('ramp').ilst == im.ilst
+        assert ginga.imap.imap_ramp == im.ilst
+        assert ginga.imap.iamp_equa == ginga.imap.get_imap('equa').ilst
+
 # END
@@ -0,0 +1,71 @@
+"""Test rgb_cms.py"""
+
+import logging
+
+import numpy as np
+import pytest
+
+from ginga import RGBMap
+from ginga.util import rgb_cms
+
+pytestmark = pytest.mark.skipif(not rgb_cms.have_cms,
+                                reason="PIL.ImageCms is not installed")
+
+
+class TestColorLUT(object):
+    def setup_class(self):
+        from PIL import ImageCms
+        srgb = ImageCms.createProfile('sRGB')
+        self.transform = ImageCms.buildTransform(srgb, srgb, 'RGB', 'RGB')
+
+        rs = np.random.RandomState(0)
+        self.palette = rs.randint(0, 256, (300, 3)).astype(np.uint8)
+        self.data = self.palette[rs.randint(0, 300, (40, 60))]
+
+    def test_matches_transform(self):
+        lut = rgb_cms.ColorLUT(self.transform)
+        expected = rgb_cms.convert_profile_numpy_transform(self.data,
+                                                           self.transform)
+        res = lut.convert(self.data)
+        assert res.shape == self.data.shape
+        np.testing.assert_array_equal(res, expected)
+
+    def test_table_reuse(self):
+        lut = rgb_cms.ColorLUT(self.transform)
+        lut.convert(self.data)
+        assert lut.valid.sum() == len(np.unique(self.palette, axis=0))
+        # only the pages of the table with colors seen are allocated
+        blocks = np.unique(self.palette >> 4, axis=0)
+        assert lut.num_pages == len(blocks)
+        assert len(lut.valid) < 1 << 24
+
+        # a frame of colors already seen is converted from the table alone
+        lut.transform = None
+        res = lut.convert(self.data[::-1])
+        expected = rgb_cms.convert_profile_numpy_transform(self.data[::-1],
+                                                           self.transform)
+        np.testing.assert_array_equal(res, expected)
+
+    def test_convert_colors(self):
+        lut = rgb_cms.ColorLUT(self.transform)
+        expected = rgb_cms.convert_profile_numpy_transform(self.data,
+                                                           self.transform)
+        res = lut.convert_colors(self.data)
+        np.testing.assert_array_equal(res, expected)
+        # the color table is not needed for this
+        assert lut.num_pages == 0
+
+    def test_rgbmap_lut(self):
+        rgbmap = RGBMap.RGBMapper(logging.getLogger('TestColorLUT'))
+        rgbmap.set_color_map('rainbow')
+        lut = rgb_cms.ColorLUT(self.transform)
+        expected = rgb_cms.convert_profile_numpy_transform(
+            rgbmap.get_lut('RGB').reshape((1, -1, 3)), self.transform)
+
+        # the transform is baked into the lookup table of the mapper
+        rgbmap.set_output_profile_lut(lut)
+        res = rgbmap.get_lut('BGRA')
+        np.testing.assert_array_equal(res[:, 2::-1], expected[0])
+        assert np.all(res[:, 3] == 255)
+        assert rgbmap.get_lut('BGRA') is res
+        assert lut.num_pages == 0
@@ -0,0 +1,54 @@
+"""Test RGBMap.py"""
+
+import logging
+
+import numpy as np
+import pytest
+
+from ginga import RGBMap
+
+
+class TestRGBMap(object):
+    def setup_class(self):
+        self.logger = logging.getLogger("TestRGBMap")
+        rs = np.random.RandomState(0)
+        self.idx = rs.randint(0, 65536, (60, 80)).astype(np.uint)
+        # out of range values must be clipped, as with the non-LUT path
+        self.idx[0, :10] = 2 ** 63
+
+    def get_both(self, rgbmap, order):
+        rgbmap.use_lut = False
+        res1 = rgbmap.get_rgbarray(self.idx, order=order).rgbarr
+        rgbmap.use_lut = True
+        res2 = rgbmap.get_rgbarray(self.idx, order=order).rgbarr
+        return res1, res2
+
+    @pytest.mark.parametrize('order', ['RGBA', 'BGRA', 'ARGB', 'RGB'])
+    @pytest.mark.parametrize('dist', ['linear', 'log', 'histeq'])
+    def test_lut_matches(self, order, dist):
+        rgbmap = RGBMap.RGBMapper(self.logger)
+        rgbmap.set_color_map('rainbow3')
+        rgbmap.set_intensity_map('neg')
+        rgbmap.set_hash_algorithm(dist)
+        rgbmap.scale_and_shift(0.6, 0.1)
+
+        res1, res2 = self.get_both(rgbmap, order)
+        assert res1.shape == res2.shape == self.idx.shape + (len(order),)
+        assert np.array_equal(res1, res2)
+
+    def test_lut_rebuild(self):
+        rgbmap = RGBMap.RGBMapper(self.logger)
+        lut = rgbmap.get_lut('RGBA')
+        # table is reused until an input changes
+        assert rgbmap.get_lut('RGBA') is lut
+
+        rgbmap.set_color_map('heat')
+        assert rgbmap.get_lut('RGBA') is not lut
+        res1, res2 = self.get_both(rgbmap, 'RGBA')
+        assert np.array_equal(res1, res2)
+
+        lut = rgbmap.get_lut('RGBA')
+        rgbmap.shift(0.2)
+        assert rgbmap.get_lut('RGBA') is not lut
+        res1, res2 = self.get_both(rgbmap, 'RGBA')
+        assert np.array_equal(res1, res2)
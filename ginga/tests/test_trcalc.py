@@ -0,0 +1,182 @@
+"""Test trcalc.py"""
+
+import numpy as np
+
+from ginga import trcalc
+
+
+class TestTrcalc(object):
+
+    def test_block_reduce(self):
+        data = np.arange(36, dtype=np.float32).reshape((6, 6))
+        res = trcalc.block_reduce(data, 2, 2)
+        assert res.shape == (3, 3)
+        assert res.dtype == data.dtype
+        assert res[0, 0] == np.mean([0, 1, 6, 7])
+        assert res[2, 2] == np.mean([28, 29, 34, 35])
+
+    def test_block_reduce_partial(self):
+        # partial blocks at the edges are dropped, integer types are kept
+        data = np.arange(35, dtype=np.uint16).reshape((5, 7))
+        res = trcalc.block_reduce(data, 2, 2)
+        assert res.shape == (2, 3)
+        assert res.dtype == np.uint16
+        assert res[1, 2] == np.rint(np.mean([18, 19, 25, 26]))
+
+    def test_block_reduce_rgb(self):
+        data = np.zeros((4, 4, 3), dtype=np.uint8)
+        data[..., 1] = 200
+        res = trcalc.block_reduce(data, 2, 2)
+        assert res.shape == (2, 2, 3)
+        assert np.all(res[..., 1] == 200)
+        assert np.all(res[..., 0] == 0)
+
+    def test_fill_array(self):
+        for order in ['RGB', 'BGRA', 'ARGB']:
+            arr = np.zeros((5, 7, len(order)), dtype=np.uint8)
+            trcalc.fill_array(arr, order, 1.0, 0.5, 0.0, 1.0)
+            vals = dict(R=255, G=127, B=0, A=255)
+            assert np.all(arr == [vals[c] for c in order])
+
+    def test_resize_linear(self):
+        # linear interpolation of a linear ramp is exact (away from edges)
+        yi, xi = np.mgrid[0:10, 0:20]
+        data = (3.0 * xi + 5.0 * yi).astype(np.float32)
+        res = trcalc.get_scaled_cutout_wdht_numpy(data, 0, 0, 19, 9, 80, 40,
+                                                  interpolation='linear')
+        assert res.shape == (40, 80)
+        assert res.dtype == np.float32
+        pos_x = (np.arange(80) + 0.5) / 4.0 - 0.5
+        pos_y = (np.arange(40) + 0.5) / 4.0 - 0.5
+        ref = 3.0 * pos_x.clip(0, 19) + 5.0 * pos_y.clip(0, 9)[:, None]
+        assert np.allclose(res, ref, atol=1e-4)
+
+    def test_resize_linear_int_rgb(self):
+        data = np.zeros((4, 4, 3), dtype=np.uint8)
+        data[:, 2:, 0] = 100
+        res = trcalc.get_scaled_cutout_wdht_numpy(data, 0, 0, 3, 3, 8, 8,
+                                                  interpolation='linear')
+        assert res.shape == (8, 8, 3)
+        assert res.dtype == np.uint8
+        assert np.all(res[:, :3, 0] == 0)
+        assert np.all(res[:, 3, 0] == 25)
+        assert np.all(res[:, 4, 0] == 75)
+        assert np.all(res[:, 5:, 0] == 100)
+        assert np.all(res[..., 1:] == 0)
+
+    def test_resize_area(self):
+        data = np.arange(48, dtype=np.uint16).reshape((6, 8))
+        res = trcalc.get_scaled_cutout_wdht_numpy(data, 0, 0, 7, 5, 4, 3,
+                                                  interpolation='area')
+        assert np.array_equal(res, trcalc.block_reduce(data, 2, 2))
+
+        # non-integer reduction: average by the integer part, then sample
+        res = trcalc.get_scaled_cutout_wdht_numpy(data, 0, 0, 7, 5, 3, 2,
+                                                  interpolation='area')
+        assert res.shape == (2, 3)
+        assert res[0, 0] == np.rint(np.mean(data[0:3, 0:2]))
+
+    def test_resize_methods(self):
+        data = np.random.RandomState(0).rand(30, 40)
+        for method in ['basic', 'linear', 'area']:
+            assert method in trcalc.interpolation_methods
+            res, scales = trcalc.get_scaled_cutout_basic(
+                data, 5, 2, 34, 25, 0.5, 0.5, interpolation=method)
+            assert res.shape == (12, 15)
+            assert scales == (0.5, 0.5)
+
+    def test_warp_affine_nearest(self):
+        data = np.arange(20, dtype=np.int16).reshape((4, 5))
+
+        # identity, with the part off the data masked
+        res, mask = trcalc.warp_affine(data, (4, 6), (-1, 0), (1, 0), (0, 1))
+        assert res.dtype == data.dtype
+        assert np.array_equal(res[:, 1:], data)
+        assert np.array_equal(mask[0], np.arange(6) > 0)
+        assert np.array_equal(mask, np.broadcast_to(mask[0], (4, 6)))
+
+        # rotation by 90 deg
+        res, mask = trcalc.warp_affine(data, (5, 4), (4, 0), (0, 1), (-1, 0))
+        assert mask is None
+        assert np.array_equal(res, np.rot90(data))
+
+        # general mapping, sampling pixel centers
+        res, mask = trcalc.warp_affine(data, (3, 3), (0.2, 0.4),
+                                       (0.9, 0.45), (0.1, 0.9))
+        assert mask is None
+        # (x, y) = (2.2, 3.1) at the last output pixel
+        assert res[0, 0] == data[0, 0]
+        assert res[2, 2] == data[3, 2]
+
+    def test_warp_affine_linear(self):
+        yi, xi = np.mgrid[0:10, 0:12]
+        data = np.dstack((2.0 * xi + 3.0 * yi, xi)).astype(np.float32)
+        org, dx, dy = (2.3, 1.6), (0.7, 0.2), (-0.3, 0.8)
+        res, mask = trcalc.warp_affine(data, (5, 6), org, dx, dy,
+                                       interpolation='linear')
+        assert res.shape == (5, 6, 2)
+        assert mask is None
+        rows, cols = np.mgrid[0:5, 0:6]
+        x = org[0] + cols * dx[0] + rows * dy[0]
+        y = org[1] + cols * dx[1] + rows * dy[1]
+        assert np.allclose(res[..., 0], 2.0 * x + 3.0 * y, atol=1e-4)
+        assert np.allclose(res[..., 1], x, atol=1e-4)
+
+    def _blend_ref(self, dst, src, alpha):
+        # float64 reference for blending the color channels
+        return src[..., :3] * alpha + dst[..., :3] * (1.0 - alpha)
+
+    def test_overlay_alpha_channel(self):
+        rs = np.random.RandomState(0)
+        dst = rs.randint(0, 256, (20, 30, 4)).astype(np.uint8)
+        src = rs.randint(0, 256, (10, 12, 4)).astype(np.uint8)
+        res = trcalc.overlay_image(dst.copy(), (5, 3), src,
+                                   dst_order='RGBA', src_order='RGBA',
+                                   fill=True)
+        alpha = src[..., 3:4] / 255.0
+        ref = self._blend_ref(dst[3:13, 5:17], src, alpha)
+        assert np.abs(res[3:13, 5:17, :3] - ref).max() <= 0.5
+        assert np.all(res[3:13, 5:17, 3] == 255)
+        # outside of the source is untouched
+        assert np.array_equal(res[:3], dst[:3])
+        assert np.array_equal(res[:, :5], dst[:, :5])
+
+    def test_overlay_scalar_alpha(self):
+        rs = np.random.RandomState(1)
+        dst = rs.randint(0, 256, (20, 30, 4)).astype(np.uint8)
+        src = rs.randint(0, 256, (10, 12, 3)).astype(np.uint8)
+        res = trcalc.overlay_image(dst.copy(), (-2, 15), src,
+                                   dst_order='BGRA', src_order='RGB',
+                                   alpha=0.3)
+        ref = self._blend_ref(dst[15:, :10, 2::-1], src[:5, 2:], 0.3)
+        # alpha is quantized to 1/255 in the fixed point calculation
+        assert np.abs(res[15:, :10, 2::-1] - ref).max() <= 1.0
+        assert np.array_equal(res[15:, :10, 3], dst[15:, :10, 3])
+
+    def test_overlay_short_circuit(self):
+        dst = np.full((10, 10, 4), 7, dtype=np.uint8)
+        src = np.full((4, 4, 4), 200, dtype=np.uint8)
+
+        # fully opaque source is copied
+        src[..., 3] = 255
+        res = trcalc.overlay_image(dst.copy(), (1, 1), src,
+                                   dst_order='ARGB', src_order='RGBA')
+        assert np.all(res[1:5, 1:5, 1:] == 200)
+        assert np.all(res[1:5, 1:5, 0] == 7)
+
+        # fully transparent source is skipped
+        src[..., 3] = 0
+        res = trcalc.overlay_image(dst.copy(), (1, 1), src,
+                                   dst_order='ARGB', src_order='RGBA')
+        assert np.array_equal(res, dst)
+
+    def test_overlay_float32(self):
+        rs = np.random.RandomState(2)
+        dst = rs.randint(0, 65536, (8, 8, 3)).astype(np.uint16)
+        src = rs.randint(0, 65536, (8, 8, 4)).astype(np.uint16)
+        res = trcalc.overlay_image(dst.copy(), (0, 0), src,
+                                   dst_order='RGB', src_order='RGBA')
+        ref = self._blend_ref(dst, src, src[..., 3:4] / 65535.0)
+        assert np.abs(res - ref).max() <= 1.0
+
+# END
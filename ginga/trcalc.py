@@ -7,7 +7,8 @@
 import math
 import numpy as np
 
-interpolation_methods = ['basic']
+# methods supported without any optional packages
+interpolation_methods = ['area', 'basic', 'linear']
 
 
 def use(pkgname):
@@ -265,6 +266,125 @@ def rotate(data_np, theta_deg, rotctr_x=None, rotctr_y=None, pad=20,
     return newdata
 
 
+def _warp_sample(data_np, x, y, linear, out, mask):
+    # sample `data_np` at index coordinates `x`, `y` into `out`, and set
+    # `mask` for the coordinates that fall on the data
+    ht, wd = data_np.shape[:2]
+    xi = np.floor(x + 0.5).astype(np.intp)
+    yi = np.floor(y + 0.5).astype(np.intp)
+    np.logical_and((xi >= 0) & (xi < wd), (yi >= 0) & (yi < ht), out=mask)
+
+    if not linear:
+        xi.clip(0, wd - 1, out=xi)
+        yi.clip(0, ht - 1, out=yi)
+        out[...] = data_np[yi, xi]
+        return
+
+    # bilinear interpolation between the four surrounding samples
+    x = x.clip(0, wd - 1)
+    y = y.clip(0, ht - 1)
+    x0, y0 = x.astype(np.intp), y.astype(np.intp)
+    x1, y1 = np.minimum(x0 + 1, wd - 1), np.minimum(y0 + 1, ht - 1)
+    ext = (np.newaxis,) * (data_np.ndim - 2)
+    fx = (x - x0).astype(np.float32)[(Ellipsis,) + ext]
+    fy = (y - y0).astype(np.float32)[(Ellipsis,) + ext]
+
+    # interpolate at no greater precision than the output needs
+    acc_type = np.result_type(data_np.dtype, np.float32)
+    if out.dtype.kind == 'f':
+        acc_type = np.result_type(out.dtype, np.float32)
+    top = data_np[y0, x0].astype(acc_type)
+    res = data_np[y0, x1].astype(acc_type, copy=False)
+    res -= top
+    res *= fx
+    top += res
+    bot = data_np[y1, x0].astype(acc_type)
+    res = data_np[y1, x1].astype(acc_type, copy=False)
+    res -= bot
+    res *= fx
+    bot += res
+    bot -= top
+    bot *= fy
+    top += bot
+    if not np.issubdtype(out.dtype, np.floating):
+        np.rint(top, out=top)
+    out[...] = top
+
+
+def _get_index_slice(idx, num):
+    # clip indexes to an axis of length `num`, or make a slice of them
+    # if they are all consecutive on the axis
+    if (len(idx) > 0 and idx[0] >= 0 and idx[-1] < num and
+            idx[-1] - idx[0] == len(idx) - 1 and np.all(np.diff(idx) == 1)):
+        return slice(idx[0], idx[-1] + 1)
+    return idx.clip(0, num - 1)
+
+
+def warp_affine(data_np, shape, origin, dx, dy, interpolation='nearest',
+                dtype=None, chunk_rows=256):
+    """
+    Sample `data_np` onto an output array of `shape` (ht, wd) with a
+    single inverse affine mapping: output pixel (row, col) samples the
+    data at the index coordinates ``origin + col * dx + row * dy``, where
+    each of these is an (x, y) pair and pixel centers are at integer
+    coordinates.  This can combine scaling, rotation and flips in one
+    pass, without any intermediate arrays the size of the output.
+
+    `interpolation` is 'nearest' (or 'basic'), or else bilinear
+    interpolation is used.  Any dimensions of `data_np` beyond the first
+    two (e.g. color channels) are preserved.
+
+    Returns the output array and a boolean mask of the output pixels
+    that fall on the data, or None if they all do.
+    """
+    ht, wd = int(shape[0]), int(shape[1])
+    data_ht, data_wd = data_np.shape[:2]
+    if dtype is None:
+        dtype = data_np.dtype
+    ox, oy = origin[:2]
+    dxx, dxy = dx[:2]
+    dyx, dyy = dy[:2]
+    linear = interpolation not in ('basic', 'nearest')
+    rows, cols = np.arange(ht), np.arange(wd)
+
+    if not linear and (dxy == 0 and dyx == 0 or dxx == 0 and dyy == 0):
+        # not rotated: sample rows and columns independently
+        swapped = (dxx == 0 and dyy == 0)
+        if swapped:
+            xi = np.floor(ox + rows * dyx + 0.5).astype(np.intp)
+            yi = np.floor(oy + cols * dxy + 0.5).astype(np.intp)
+        else:
+            xi = np.floor(ox + cols * dxx + 0.5).astype(np.intp)
+            yi = np.floor(oy + rows * dyy + 0.5).astype(np.intp)
+        mx = (xi >= 0) & (xi < data_wd)
+        my = (yi >= 0) & (yi < data_ht)
+        xi, yi = _get_index_slice(xi, data_wd), _get_index_slice(yi, data_ht)
+        if not isinstance(yi, slice) and not isinstance(xi, slice):
+            yi = yi[:, np.newaxis]
+        out = data_np[yi, xi]
+        if swapped:
+            out = np.ascontiguousarray(out.swapaxes(0, 1))
+            mask = np.logical_and.outer(mx, my)
+        else:
+            mask = np.logical_and.outer(my, mx)
+        if mask.all():
+            mask = None
+        return out.astype(dtype, copy=False), mask
+
+    out = np.empty((ht, wd) + data_np.shape[2:], dtype=dtype)
+    mask = np.empty((ht, wd), dtype=np.bool_)
+    for r1 in range(0, ht, chunk_rows):
+        r2 = min(r1 + chunk_rows, ht)
+        r = rows[r1:r2, np.newaxis]
+        x = ox + cols * dxx + r * dyx
+        y = oy + cols * dxy + r * dyy
+        _warp_sample(data_np, x, y, linear, out[r1:r2], mask[r1:r2])
+
+    if mask.all():
+        mask = None
+    return out, mask
+
+
 def get_scaled_cutout_wdht_view(shp, x1, y1, x2, y2, new_wd, new_ht):
     """
     Like get_scaled_cutout_wdht, but returns the view/slice to extract
@@ -281,13 +401,13 @@ def get_scaled_cutout_wdht_view(shp, x1, y1, x2, y2, new_wd, new_ht):
     if (new_wd != old_wd) or (new_ht != old_ht):
         # Make indexes and scale them
         # Is there a more efficient way to do this?
-        yi = np.mgrid[0:new_ht].reshape(-1, 1)
-        xi = np.mgrid[0:new_wd].reshape(1, -1)
+        yi = np.arange(new_ht).reshape(-1, 1)
+        xi = np.arange(new_wd).reshape(1, -1)
         iscale_x = float(old_wd) / float(new_wd)
         iscale_y = float(old_ht) / float(new_ht)
 
-        xi = (x1 + xi * iscale_x).clip(0, max_x).astype(np.int, copy=False)
-        yi = (y1 + yi * iscale_y).clip(0, max_y).astype(np.int, copy=False)
+        xi = (x1 + xi * iscale_x).clip(0, max_x).astype(np.int_, copy=False)
+        yi = (y1 + yi * iscale_y).clip(0, max_y).astype(np.int_, copy=False)
         wd, ht = xi.shape[1], yi.shape[0]
 
         # bounds check against shape (to protect future data access)
@@ -367,6 +487,91 @@ def get_scaled_cutout_wdhtdp_view(shp, p1, p2, new_dims):
     return (view, (scale_x, scale_y, scale_z))
 
 
+def _get_linear_samples(old_n, new_n):
+    """Returns the lower and upper indexes and the weights of the upper
+    samples for resizing an axis of `old_n` pixels to `new_n` pixels by
+    linear interpolation, with the pixel centers aligned.
+    """
+    pos = (np.arange(new_n) + 0.5) * (float(old_n) / new_n) - 0.5
+    pos = pos.clip(0, old_n - 1)
+    i0 = pos.astype(np.intp)
+    i1 = np.minimum(i0 + 1, old_n - 1)
+    return i0, i1, (pos - i0).astype(np.float32)
+
+
+def get_scaled_cutout_wdht_numpy(data_np, x1, y1, x2, y2, new_wd, new_ht,
+                                 interpolation='linear', dtype=None):
+    """
+    Cut out the region (x1, y1) to (x2, y2) of `data_np` and resize it to
+    (new_wd x new_ht), without any optional packages.
+
+    'linear' interpolates separably (rows, then columns) between the
+    nearest samples.  'area' averages over blocks of pixels for the
+    integer part of the reduction, sampling the rest (and any enlargement)
+    by nearest neighbor.  Any dimensions beyond the first two (e.g. color
+    channels) are preserved.  The result is of type `dtype` (defaults to
+    the type of `data_np`), and a floating point `dtype` limits the
+    precision of the interpolation.
+    """
+    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+    new_wd, new_ht = int(new_wd), int(new_ht)
+
+    cutout = data_np[y1:y2 + 1, x1:x2 + 1]
+    old_ht, old_wd = cutout.shape[:2]
+    rdim = cutout.shape[2:]
+    if dtype is None:
+        dtype = cutout.dtype
+    dtype = np.dtype(dtype)
+
+    if min(new_wd, new_ht, old_wd, old_ht) <= 0:
+        return np.empty((max(new_ht, 0), max(new_wd, 0)) + rdim,
+                        dtype=dtype)
+
+    if interpolation == 'area':
+        factor_x, factor_y = max(old_wd // new_wd, 1), max(old_ht // new_ht, 1)
+        if factor_x > 1 or factor_y > 1:
+            cutout = block_reduce(cutout, factor_x, factor_y, dtype=dtype)
+            old_ht, old_wd = cutout.shape[:2]
+
+        if (old_wd, old_ht) != (new_wd, new_ht):
+            view, scales = get_scaled_cutout_wdht_view(
+                cutout.shape, 0, 0, old_wd - 1, old_ht - 1, new_wd, new_ht)
+            cutout = cutout[view]
+        return cutout.astype(dtype, copy=False)
+
+    if interpolation != 'linear':
+        raise ValueError("Interpolation method not supported: '%s'" % (
+            interpolation))
+
+    # interpolate in floating point, at no greater precision than necessary
+    acc_type = np.result_type(cutout.dtype, np.float32)
+    if dtype.kind == 'f':
+        acc_type = np.result_type(dtype, np.float32)
+    ext = (1,) * len(rdim)
+
+    if new_ht != old_ht:
+        i0, i1, wt = _get_linear_samples(old_ht, new_ht)
+        top = cutout[i0].astype(acc_type)
+        res = cutout[i1].astype(acc_type, copy=False)
+        res -= top
+        res *= wt.reshape((-1, 1) + ext)
+        res += top
+        cutout = res
+
+    if new_wd != old_wd:
+        i0, i1, wt = _get_linear_samples(old_wd, new_wd)
+        left = cutout[:, i0].astype(acc_type, copy=False)
+        res = cutout[:, i1].astype(acc_type, copy=False)
+        res -= left
+        res *= wt.reshape((1, -1) + ext)
+        res += left
+        cutout = res
+
+    if not np.issubdtype(dtype, np.floating):
+        cutout = np.rint(cutout)
+    return cutout.astype(dtype, copy=False)
+
+
 def get_scaled_cutout_wdht(data_np, x1, y1, x2, y2, new_wd, new_ht,
                            interpolation='basic', logger=None,
                            dtype=None):
@@ -413,6 +618,18 @@ def get_scaled_cutout_wdht(data_np, x1, y1, x2, y2, new_wd, new_ht,
                                                                         x1, y1, x2, y2,
                                                                         scale_x, scale_y)
 
+    elif interpolation in ('linear', 'area'):
+        if logger is not None:
+            logger.debug("resizing with numpy (%s)" % (interpolation))
+        newdata = get_scaled_cutout_wdht_numpy(data_np, x1, y1, x2, y2,
+                                               new_wd, new_ht,
+                                               interpolation=interpolation,
+                                               dtype=dtype)
+
+        old_wd, old_ht = max(x2 - x1 + 1, 1), max(y2 - y1 + 1, 1)
+        ht, wd = newdata.shape[:2]
+        scale_x, scale_y = float(wd) / old_wd, float(ht) / old_ht
+
     elif interpolation not in ('basic', 'nearest'):
         raise ValueError("Interpolation method not supported: '%s'" % (
             interpolation))
@@ -506,6 +723,20 @@ def get_scaled_cutout_basic(data_np, x1, y1, x2, y2, scale_x, scale_y,
         newdata, (scale_x, scale_y) = trcalc_cl.get_scaled_cutout_basic(
             data_np, x1, y1, x2, y2, scale_x, scale_y)
 
+    elif interpolation in ('linear', 'area'):
+        if logger is not None:
+            logger.debug("resizing with numpy (%s)" % (interpolation))
+        old_wd, old_ht = max(x2 - x1 + 1, 1), max(y2 - y1 + 1, 1)
+        new_wd = int(round(scale_x * old_wd))
+        new_ht = int(round(scale_y * old_ht))
+        newdata = get_scaled_cutout_wdht_numpy(data_np, x1, y1, x2, y2,
+                                               new_wd, new_ht,
+                                               interpolation=interpolation,
+                                               dtype=dtype)
+
+        ht, wd = newdata.shape[:2]
+        scale_x, scale_y = float(wd) / old_wd, float(ht) / old_ht
+
     elif interpolation not in ('basic', 'nearest'):
         raise ValueError("Interpolation method not supported: '%s'" % (
             interpolation))
@@ -540,6 +771,37 @@ def get_scaled_cutout_basic2(data_np, p1, p2, scales,
     return newdata, scales
 
 
+def block_reduce(data_np, factor_x, factor_y, dtype=None):
+    """
+    Reduce `data_np` in size by averaging over blocks of
+    (factor_x x factor_y) pixels.  Any partial blocks at the right and
+    top edges are dropped.  Any dimensions beyond the first two (e.g.
+    color channels) are preserved.
+
+    The result is cast to `dtype` (defaults to the type of `data_np`).
+    """
+    factor_x, factor_y = int(factor_x), int(factor_y)
+    if dtype is None:
+        dtype = data_np.dtype
+
+    ht, wd = data_np.shape[:2]
+    new_wd, new_ht = wd // factor_x, ht // factor_y
+    rdim = data_np.shape[2:]
+
+    cutout = data_np[0:new_ht * factor_y, 0:new_wd * factor_x]
+    cutout = cutout.reshape((new_ht, factor_y, new_wd, factor_x) + rdim)
+
+    # average in floating point, at no greater precision than necessary
+    acc_type = np.result_type(data_np.dtype, np.float32)
+    newdata = cutout.mean(axis=(1, 3), dtype=acc_type)
+
+    if not np.issubdtype(dtype, np.floating):
+        np.rint(newdata, out=newdata)
+    newdata = newdata.astype(dtype, copy=False)
+
+    return newdata
+
+
 def transform(data_np, flip_x=False, flip_y=False, swap_xy=False):
 
     # Do transforms as necessary
@@ -617,16 +879,132 @@ def calc_image_merge_clip(p1, p2, dst, q1, q2):
         return ((dst_x, dst_y), (a1, b1), (a2, b2))
 
 
+def composite_image(dstarr, srcarr, dst_order='RGBA', src_order='RGBA',
+                    alpha=1.0, fill=False):
+    """Composite `srcarr` onto `dstarr` in place, where both arrays have
+    the same shape except for the last (color channel) axis.
+
+    The opacity of the source is given by its alpha channel, if it has
+    one, otherwise by the scalar `alpha`.  `alpha` can also be an array
+    of per-pixel opacities (0-1), which is combined with any source alpha
+    channel, or a boolean mask of the pixels to copy.  Fully opaque
+    sources are copied and fully transparent ones skipped.  Otherwise the
+    blending is done in 16-bit fixed point for 8-bit arrays, or in
+    float32.  If `fill` is True, the destination alpha channel (if any)
+    is set to fully opaque.
+    """
+    dst_max_val = np.iinfo(dstarr.dtype).max
+    src_max_val = np.iinfo(srcarr.dtype).max
+
+    if 'A' in dst_order:
+        da_idx = dst_order.index('A')
+        # Currently we assume that alpha channel is in position 0 or 3
+        if da_idx not in (0, 3):
+            raise ValueError("Alpha channel not in expected position (0 or 4) in dstarr")
+
+        # fill alpha channel in destination in the area we will be
+        # dropping the image
+        if fill:
+            dstarr[..., da_idx] = dst_max_val
+
+    if dstarr.size == 0 or srcarr.size == 0:
+        return dstarr
+
+    if (srcarr.shape[-1] > 3) and ('A' in src_order):
+        # if overlay source contains an alpha channel, use it,
+        # otherwise use scalar keyword parameter
+        src_alpha = srcarr[..., src_order.index('A')]
+        if np.isscalar(alpha):
+            alpha = src_alpha
+        else:
+            src_alpha = src_alpha * np.float32(1.0 / src_max_val)
+            src_alpha *= alpha
+            alpha = src_alpha
+
+    if not np.isscalar(alpha):
+        # alpha of integer type is in source units
+        max_val = 1.0 if alpha.dtype.kind in ('f', 'b') else src_max_val
+        if alpha.min() >= max_val:
+            alpha = 1.0
+        elif alpha.max() <= 0:
+            alpha = 0.0
+
+    if np.isscalar(alpha):
+        if alpha <= 0.0:
+            # fully transparent
+            return dstarr
+        if alpha >= 1.0:
+            alpha = None
+
+    # pair up the color channels of destination and source, as views;
+    # numpy handles single channels of interleaved pixels much faster
+    # than several
+    pairs = [(dstarr[..., dst_order.index(c)], srcarr[..., src_order.index(c)])
+             for c in dst_order.replace('A', '')]
+
+    if alpha is None:
+        # fully opaque: place our srcarr into this dstarr
+        for d_arr, s_arr in pairs:
+            d_arr[...] = s_arr
+        return dstarr
+
+    if not np.isscalar(alpha) and alpha.dtype == np.bool_:
+        # copy only the masked pixels
+        for d_arr, s_arr in pairs:
+            np.copyto(d_arr, s_arr, casting='unsafe', where=alpha)
+        return dstarr
+
+    # calculate alpha blending
+    #   Co = CaAa + CbAb(1 - Aa)
+    if dstarr.dtype == np.uint8 and srcarr.dtype == np.uint8:
+        # 16-bit fixed point, with alpha in [0, 255]
+        if np.isscalar(alpha):
+            a = int(round(alpha * 255))
+            na = 255 - a
+        else:
+            a = alpha
+            if a.dtype.kind == 'f':
+                a = np.rint(a * 255).astype(np.uint8)
+            na = np.subtract(255, a, dtype=np.uint8)
+
+        for d_arr, s_arr in pairs:
+            res = s_arr.astype(np.uint16)
+            res *= a
+            tmp = d_arr.astype(np.uint16)
+            tmp *= na
+            res += tmp
+            # divide by 255, rounded
+            res += 128
+            np.right_shift(res, 8, out=tmp)
+            res += tmp
+            res >>= 8
+            d_arr[...] = res
+        return dstarr
+
+    if np.isscalar(alpha):
+        a = np.float32(alpha)
+    elif alpha.dtype.kind in ('u', 'i'):
+        a = alpha.astype(np.float32)
+        a /= src_max_val
+    else:
+        a = alpha.astype(np.float32, copy=False)
+
+    for d_arr, s_arr in pairs:
+        res = s_arr.astype(np.float32)
+        res -= d_arr
+        res *= a
+        res += d_arr
+        res += 0.5
+        d_arr[...] = res
+    return dstarr
+
+
 def overlay_image_2d(dstarr, pos, srcarr, dst_order='RGBA',
                      src_order='RGBA',
                      alpha=1.0, copy=False, fill=False, flipy=False):
 
     dst_ht, dst_wd, dst_ch = dstarr.shape
-    dst_type = dstarr.dtype
-    dst_max_val = np.iinfo(dst_type).max
     src_ht, src_wd, src_ch = srcarr.shape
-    src_type = srcarr.dtype
-    src_max_val = np.iinfo(src_type).max
     dst_x, dst_y = int(round(pos[0])), int(round(pos[1]))
 
     if flipy:
@@ -661,57 +1039,16 @@ def overlay_image_2d(dstarr, pos, srcarr, dst_order='RGBA',
         srcarr = srcarr[:, :dst_wd, :]
         src_wd -= ex
 
+    if src_wd <= 0 or src_ht <= 0:
+        return dstarr
+
     if copy:
         dstarr = np.copy(dstarr, order='C')
 
-    da_idx = -1
-    slc = slice(0, 3)
-    if 'A' in dst_order:
-        da_idx = dst_order.index('A')
-
-        # Currently we assume that alpha channel is in position 0 or 3 in dstarr
-        if da_idx == 0:
-            slc = slice(1, 4)
-        elif da_idx != 3:
-            raise ValueError("Alpha channel not in expected position (0 or 4) in dstarr")
-
-    # fill alpha channel in destination in the area we will be dropping
-    # the image
-    if fill and (da_idx >= 0):
-        dstarr[dst_y:dst_y + src_ht, dst_x:dst_x + src_wd, da_idx] = dst_max_val
-
-    if (src_ch > 3) and ('A' in src_order):
-        sa_idx = src_order.index('A')
-        # if overlay source contains an alpha channel, extract it
-        # and use it, otherwise use scalar keyword parameter
-        alpha = srcarr[0:src_ht, 0:src_wd, sa_idx] / float(src_max_val)
-        alpha = np.dstack((alpha, alpha, alpha))
-
-    # reorder srcarr if necessary to match dstarr for alpha merge
-    get_order = dst_order
-    if ('A' in dst_order) and not ('A' in src_order):
-        get_order = dst_order.replace('A', '')
-    if get_order != src_order:
-        srcarr = reorder_image(get_order, srcarr, src_order)
-
-    if np.isscalar(alpha) and alpha == 1.0:
-        # optimization to avoid alpha blending
-        # Place our srcarr into this dstarr at dst offsets
-        dstarr[dst_y:dst_y + src_ht, dst_x:dst_x + src_wd, slc] = (
-            srcarr[0:src_ht, 0:src_wd, slc])
-    else:
-        # calculate alpha blending
-        #   Co = CaAa + CbAb(1 - Aa)
-        a_arr = (alpha * srcarr[0:src_ht, 0:src_wd, slc]).astype(dst_type,
-                                                                 copy=False)
-        b_arr = ((1.0 - alpha) * dstarr[dst_y:dst_y + src_ht,
-                                        dst_x:dst_x + src_wd,
-                                        slc]).astype(dst_type, copy=False)
-
-        # Place our srcarr into this dstarr at dst offsets
-        dstarr[dst_y:dst_y + src_ht, dst_x:dst_x + src_wd, slc] = (
-            a_arr[0:src_ht, 0:src_wd, slc] + b_arr[0:src_ht, 0:src_wd, slc])
-
+    composite_image(dstarr[dst_y:dst_y + src_ht, dst_x:dst_x + src_wd],
+                    srcarr[0:src_ht, 0:src_wd],
+                    dst_order=dst_order, src_order=src_order,
+                    alpha=alpha, fill=fill)
     return dstarr
 
 
@@ -720,11 +1057,7 @@ def overlay_image_3d(dstarr, pos, srcarr, dst_order='RGBA', src_order='RGBA',
 
     dst_x, dst_y, dst_z = pos
     dst_ht, dst_wd, dst_dp, dst_ch = dstarr.shape
-    dst_type = dstarr.dtype
-    dst_max_val = np.iinfo(dst_type).max
     src_ht, src_wd, src_dp, src_ch = srcarr.shape
-    src_type = srcarr.dtype
-    src_max_val = np.iinfo(src_type).max
 
     if flipy:
         srcarr = np.flipud(srcarr)
@@ -775,62 +1108,11 @@ def overlay_image_3d(dstarr, pos, srcarr, dst_order='RGBA', src_order='RGBA',
     if copy:
         dstarr = np.copy(dstarr, order='C')
 
-    da_idx = -1
-    slc = slice(0, 3)
-    if 'A' in dst_order:
-        da_idx = dst_order.index('A')
-
-        # Currently we assume that alpha channel is in position 0 or 3 in dstarr
-        if da_idx == 0:
-            slc = slice(1, 4)
-        elif da_idx != 3:
-            raise ValueError("Alpha channel not in expected position (0 or 4) in dstarr")
-
-    # fill alpha channel in destination in the area we will be dropping
-    # the image
-    if fill and (da_idx >= 0):
-        dstarr[dst_y:dst_y + src_ht, dst_x:dst_x + src_wd,
-               dst_z:dst_z + src_dp, da_idx] = dst_max_val
-
-    if (src_ch > 3) and ('A' in src_order):
-        sa_idx = src_order.index('A')
-        # if overlay source contains an alpha channel, extract it
-        # and use it, otherwise use scalar keyword parameter
-        alpha = srcarr[0:src_ht, 0:src_wd, 0:src_dp, sa_idx] / float(src_max_val)
-        alpha = np.concatenate([alpha[..., np.newaxis],
-                                alpha[..., np.newaxis],
-                                alpha[..., np.newaxis]],
-                               axis=-1)
-
-    # reorder srcarr if necessary to match dstarr for alpha merge
-    get_order = dst_order
-    if ('A' in dst_order) and not ('A' in src_order):
-        get_order = dst_order.replace('A', '')
-    if get_order != src_order:
-        srcarr = reorder_image(get_order, srcarr, src_order)
-
-    if np.isscalar(alpha) and alpha == 1.0:
-        # optimization to avoid alpha blending
-        # Place our srcarr into this dstarr at dst offsets
-        dstarr[dst_y:dst_y + src_ht, dst_x:dst_x + src_wd,
-               dst_z:dst_z + src_dp, slc] = (
-            srcarr[0:src_ht, 0:src_wd, 0:src_dp, slc])
-    else:
-        # calculate alpha blending
-        #   Co = CaAa + CbAb(1 - Aa)
-        a_arr = (alpha * srcarr[0:src_ht, 0:src_wd,
-                                0:src_dp, slc]).astype(dst_type, copy=False)
-        b_arr = ((1.0 - alpha) * dstarr[dst_y:dst_y + src_ht,
-                                        dst_x:dst_x + src_wd,
-                                        dst_z:dst_z + src_dp,
-                                        slc]).astype(dst_type, copy=False)
-
-        # Place our srcarr into this dstarr at dst offsets
-        dstarr[dst_y:dst_y + src_ht, dst_x:dst_x + src_wd,
-               dst_z:dst_z + src_dp, slc] = (
-            a_arr[0:src_ht, 0:src_wd, 0:src_dp, slc] +
-            b_arr[0:src_ht, 0:src_wd, 0:src_dp, slc])
-
+    composite_image(dstarr[dst_y:dst_y + src_ht, dst_x:dst_x + src_wd,
+                           dst_z:dst_z + src_dp],
+                    srcarr[0:src_ht, 0:src_wd, 0:src_dp],
+                    dst_order=dst_order, src_order=src_order,
+                    alpha=alpha, fill=fill)
     return dstarr
 
 
@@ -908,17 +1190,24 @@ def fill_array(dstarr, order, r, g, b, a):
 
     dstarr can be a 2D or 3D array.
     """
-    # TODO: can we make this more efficient?
     dtype = dstarr.dtype
     maxv = np.iinfo(dtype).max
     bgval = dict(A=int(maxv * a), R=int(maxv * r), G=int(maxv * g),
                  B=int(maxv * b))
     bgtup = tuple([bgval[order[i]] for i in range(len(order))])
-    if dtype is np.uint8 and len(bgtup) == 4:
-        # optimiztion
+    if (dtype == np.uint8 and len(bgtup) == 4 and
+            dstarr.flags['C_CONTIGUOUS']):
+        # optimization when dealing with 32-bit RGBA arrays
         bgtup = np.array(bgtup, dtype=dtype).view(np.uint32)[0]
         dstarr = dstarr.view(np.uint32)
 
+    elif dstarr.ndim == 3 and dstarr.size > 0:
+        # numpy broadcasts whole rows much faster than a tuple of
+        # channel values
+        dstarr[0, ...] = bgtup
+        dstarr[1:] = dstarr[0]
+        return
+
     dstarr[..., :] = bgtup
 
 
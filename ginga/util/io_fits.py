@@ -280,12 +280,14 @@ class PyFitsFileHandler(BaseFitsFileHandler):
     def load_file(self, filespec, numhdu=None, dstobj=None, memmap=None,
                   **kwargs):
         inherit_primary_header = kwargs.pop('inherit_primary_header', False)
+        native_byteorder = kwargs.pop('native_byteorder', None)
         opener = self.get_factory()
         opener.open_file(filespec, memmap=memmap, **kwargs)
         try:
             return opener.get_hdu(
                 numhdu, dstobj=dstobj,
-                inherit_primary_header=inherit_primary_header)
+                inherit_primary_header=inherit_primary_header,
+                native_byteorder=native_byteorder)
         finally:
             opener.close()
 
@@ -516,7 +518,9 @@ class FitsioFileHandler(BaseFitsFileHandler):
 
                 dstobj = obj_class(logger=self.logger)
 
-            dstobj.load_data(data, metadata=metadata)
+            dstobj.load_data(data, metadata=metadata,
+                             native_byteorder=kwargs.get('native_byteorder',
+                                                         None))
 
         elif typ == 'table':
             # <-- data is a table
@@ -528,12 +532,14 @@ class FitsioFileHandler(BaseFitsFileHandler):
     def load_file(self, filespec, numhdu=None, dstobj=None, memmap=None,
                   **kwargs):
         inherit_primary_header = kwargs.pop('inherit_primary_header', False)
+        native_byteorder = kwargs.pop('native_byteorder', None)
         opener = self.get_factory()
         opener.open_file(filespec, memmap=memmap, **kwargs)
         try:
             return opener.get_hdu(
                 numhdu, dstobj=dstobj,
-                inherit_primary_header=inherit_primary_header)
+                inherit_primary_header=inherit_primary_header,
+                native_byteorder=native_byteorder)
         finally:
             opener.close()
 
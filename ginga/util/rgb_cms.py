@@ -8,6 +8,9 @@
 import os
 import glob
 import hashlib
+import threading
+
+import numpy as np
 
 from ginga.misc import Bunch
 
@@ -15,6 +18,7 @@ from . import paths
 
 # How about color management (ICC profile) support?
 try:
+    import PIL.Image as PILimage
     import PIL.ImageCms as ImageCms
     have_cms = True
 except ImportError:
@@ -40,6 +44,9 @@ working_profile = None
 # Holds transforms
 icc_transform = {}
 
+# Holds color lookup tables for transforms
+icc_lut = {}
+
 
 class ColorManager(object):
 
@@ -137,10 +144,114 @@ class ColorManager(object):
 
     def profile_to_working_numpy(self, image_np, kwds, intent=None):
 
-        image_in = toimage(image_np)
+        image_in = to_pil(image_np)
         image_out = self.profile_to_working_pil(image_in, kwds,
                                                 intent=intent)
-        return fromimage(image_out)
+        return from_pil(image_out)
+
+
+class ColorLUT(object):
+    """A lookup table for an RGB to RGB profile transform.
+
+    Color mapped images are converted by baking the transform into the
+    (small) lookup table of their RGB mapper with `convert_colors`
+    (see `~ginga.RGBMap.RGBMapper.set_output_profile_lut`).
+
+    For true color images, `convert` uses a table of the 2**24 colors of
+    8-bit RGB data, which is filled in lazily: only colors not seen
+    before are passed through the transform, so once an image's colors
+    are in the table converting it costs a gather, and the result is
+    exactly that of the transform.  The table is sparse: the RGB color
+    cube is split into 16x16x16 blocks of 4096 colors, which are only
+    allocated when one of their colors is first seen.  The colors of
+    most images fill only a small part of the cube.
+    """
+
+    def __init__(self, transform):
+        self.transform = transform
+        # page of the table by block of the color cube (-1 if it is not
+        # allocated), and the pages allocated so far
+        self.page_idx = np.full(4096, -1, dtype=np.intp)
+        self.num_pages = 0
+        self.table = np.zeros((0, 3), dtype=np.uint8)
+        self.valid = np.zeros(0, dtype=np.bool_)
+        self.lock = threading.RLock()
+
+    def convert_colors(self, colors):
+        """Convert an RGB uint8 array of colors of shape (..., 3) straight
+        through the transform (without the table) and return the
+        converted array.  This is meant for small arrays, such as color
+        lookup tables.
+        """
+        colors = np.asarray(colors, dtype=np.uint8)
+        shape = colors.shape
+        if colors.size == 0:
+            return colors.copy()
+        out_np = convert_profile_numpy_transform(colors.reshape((1, -1, 3)),
+                                                 self.transform)
+        return np.asarray(out_np, dtype=np.uint8).reshape(shape)
+
+    def convert(self, image_np):
+        """Convert an RGB uint8 array of shape (..., 3) through the
+        transform and return the converted array.
+        """
+        image_np = np.asarray(image_np)
+        if image_np.dtype != np.uint8:
+            image_np = image_np.clip(0, 255).astype(np.uint8)
+
+        # block of the color cube of each color (the top 4 bits of each
+        # channel), and the index of the color within its block (the
+        # bottom 4 bits)
+        r, g, b = image_np[..., 0], image_np[..., 1], image_np[..., 2]
+        tmp = np.empty(r.shape, dtype=np.uint8)
+        block = np.right_shift(r, 4).astype(np.uint16)
+        block <<= 8
+        block |= np.bitwise_and(g, 0xf0, out=tmp)
+        block |= np.right_shift(b, 4, out=tmp)
+        idx = np.bitwise_and(r, 0xf).astype(np.intp)
+        idx <<= 8
+        idx |= np.left_shift(g, 4, out=tmp)
+        idx |= np.bitwise_and(b, 0xf, out=tmp)
+
+        with self.lock:
+            # allocate the pages of blocks not seen before
+            used = np.bincount(block.ravel(), minlength=len(self.page_idx))
+            self._add_pages(np.flatnonzero((used > 0) &
+                                           (self.page_idx < 0)))
+
+            # index into the allocated pages
+            idx += self.page_idx[block] << 12
+
+            missing = ~self.valid[idx]
+            if np.any(missing):
+                # pass only pixels with new colors through the transform
+                new_idx = idx[missing]
+                in_np = image_np[..., :3][missing].reshape((1, -1, 3))
+                out_np = convert_profile_numpy_transform(in_np,
+                                                         self.transform)
+                self.table[new_idx] = out_np.reshape((-1, 3))
+                self.valid[new_idx] = True
+
+            return self.table.take(idx, axis=0)
+
+    def _add_pages(self, blocks):
+        """Allocate table pages for the blocks `blocks` of the color cube.
+        """
+        num = self.num_pages + len(blocks)
+        if num == self.num_pages:
+            return
+        size = num * 4096
+        if size > len(self.valid):
+            # grow the table by at least doubling it, so that it is only
+            # copied a few times
+            size = max(size, min(2 * len(self.valid), 1 << 24))
+            table = np.zeros((size, 3), dtype=np.uint8)
+            table[:len(self.table)] = self.table
+            valid = np.zeros(size, dtype=np.bool_)
+            valid[:len(self.valid)] = self.valid
+            self.table, self.valid = table, valid
+        self.page_idx[blocks] = np.arange(self.num_pages, num)
+        self.num_pages = num
 
 
 # --- Color Management conversion functions ---
@@ -170,24 +281,39 @@ def convert_profile_pil_transform(image_pil, transform, inPlace=False):
     return image_out
 
 
+def to_pil(image_np):
+    """Make a PIL image from an RGB numpy array."""
+    if have_pilutil:
+        return toimage(image_np)
+    image_np = np.ascontiguousarray(image_np, dtype=np.uint8)
+    return PILimage.fromarray(image_np)
+
+
+def from_pil(image_pil):
+    """Make a numpy array from a PIL image."""
+    if have_pilutil:
+        return fromimage(image_pil)
+    return np.array(image_pil)
+
+
 def convert_profile_numpy(image_np, inprof_path, outprof_path, intent_name):
-    if (not have_pilutil) or (not have_cms):
+    if not have_cms:
         return image_np
 
-    in_image_pil = toimage(image_np)
+    in_image_pil = to_pil(image_np)
     out_image_pil = convert_profile_pil(in_image_pil,
                                         inprof_path, outprof_path, intent_name)
-    image_out = fromimage(out_image_pil)
+    image_out = from_pil(out_image_pil)
     return image_out
 
 
 def convert_profile_numpy_transform(image_np, transform):
-    if (not have_pilutil) or (not have_cms):
+    if not have_cms:
         return image_np
 
-    in_image_pil = toimage(image_np)
+    in_image_pil = to_pil(image_np)
     convert_profile_pil_transform(in_image_pil, transform, inPlace=True)
-    image_out = fromimage(in_image_pil)
+    image_out = from_pil(in_image_pil)
     return image_out
 
 
@@ -248,12 +374,43 @@ def get_transform(from_name, to_name, to_intent='perceptual',
     return output_transform
 
 
+def get_transform_lut(from_name, to_name, to_intent='perceptual',
+                      proof_name=None, proof_intent=None,
+                      use_black_pt=False):
+    """Like :func:`get_transform`, but returns a (cached)
+    :class:`ColorLUT` for the transform.
+    """
+    key = (from_name, to_name, to_intent, proof_name, proof_intent,
+           use_black_pt)
+    try:
+        return icc_lut[key]
+
+    except KeyError:
+        output_transform = get_transform(from_name, to_name,
+                                         to_intent=to_intent,
+                                         proof_name=proof_name,
+                                         proof_intent=proof_intent,
+                                         use_black_pt=use_black_pt)
+        lut = ColorLUT(output_transform)
+        icc_lut[key] = lut
+        return lut
+
+
 def convert_profile_fromto(image_np, from_name, to_name,
                            to_intent='perceptual',
                            proof_name=None, proof_intent=None,
-                           use_black_pt=False, logger=None):
+                           use_black_pt=False, logger=None,
+                           use_lut=False):
 
     try:
+        if use_lut:
+            lut = get_transform_lut(from_name, to_name,
+                                    to_intent=to_intent,
+                                    proof_name=proof_name,
+                                    proof_intent=proof_intent,
+                                    use_black_pt=use_black_pt)
+            return lut.convert(image_np)
+
         output_transform = get_transform(from_name, to_name,
                                          to_intent=to_intent,
                                          proof_name=proof_name,
@@ -73,9 +73,10 @@ def zsc_sample(image, maxpix, bpmask=None, zmask=None):
 
 
 def zscale_samples(samples, contrast=0.25):
-    samples = np.asarray(samples, dtype=np.float)
+    # the samples are sorted once here and reused by all iterations of
+    # the line fit
+    samples = np.sort(np.asarray(samples, dtype=np.float64).ravel())
     npix = len(samples)
-    samples.sort()
     zmin = samples[0]
     zmax = samples[-1]
     # For a zero-indexed array
@@ -91,7 +92,6 @@ def zscale_samples(samples, contrast=0.25):
     ngrow = max(1, int(npix * 0.01))
     ngoodpix, zstart, zslope = zsc_fit_line(samples, npix, KREJ, ngrow,
                                             MAX_ITERATIONS)
-    #print "slope=%f intercept=%f" % (zslope, zstart)
 
     if ngoodpix < minpix:
         z1 = zmin
@@ -104,6 +104,22 @@ def zscale_samples(samples, contrast=0.25):
     return z1, z2
 
 
+def zsc_grow_mask(badpix, ngrow):
+    """Grow the rejected pixels in the boolean mask `badpix` to their
+    neighbors within a window of length `ngrow`, as convolving it with
+    a kernel of that length would, in time independent of `ngrow`.
+    """
+    npix = len(badpix)
+    # a pixel is bad if any pixel in [i - ngrow // 2, i + (ngrow - 1) // 2]
+    # is bad
+    csum = np.zeros(npix + 1, dtype=np.intp)
+    np.cumsum(badpix, out=csum[1:])
+    idx = np.arange(npix)
+    lo = np.clip(idx - ngrow // 2, 0, npix)
+    hi = np.clip(idx + (ngrow - 1) // 2 + 1, 0, npix)
+    return (csum[hi] - csum[lo]) > 0
+
+
 def zsc_fit_line(samples, npix, krej, ngrow, maxiter):
     if npix <= 1:
         return npix, 0, 1
@@ -118,8 +134,8 @@ def zsc_fit_line(samples, npix, krej, ngrow, maxiter):
     minpix = max(MIN_NPIXELS, int(npix * MAX_REJECT))
     last_ngoodpix = npix + 1
 
-    # This is the mask used in k-sigma clipping.  0 is good, 1 is bad
-    badpix = np.zeros(npix, dtype=np.int)
+    # This is the mask used in k-sigma clipping.  True is bad
+    badpix = np.zeros(npix, dtype=np.bool_)
 
     #
     #  Iterate
@@ -130,12 +146,14 @@ def zsc_fit_line(samples, npix, krej, ngrow, maxiter):
             break
 
         # Accumulate sums to calculate straight line fit
-        goodpixels = np.where(badpix == GOOD_PIXEL)
-        sumx = xnorm[goodpixels].sum()
-        sumxx = (xnorm[goodpixels] * xnorm[goodpixels]).sum()
-        sumxy = (xnorm[goodpixels] * samples[goodpixels]).sum()
-        sumy = samples[goodpixels].sum()
-        sum = len(goodpixels[0])
+        good = ~badpix
+        xgood = xnorm[good]
+        ygood = samples[good]
+        sumx = xgood.sum()
+        sumxx = np.dot(xgood, xgood)
+        sumxy = np.dot(xgood, ygood)
+        sumy = ygood.sum()
+        sum = len(xgood)
 
         delta = sum * sumxx - sumx * sumx
         # Slope and intercept
@@ -152,21 +170,12 @@ def zsc_fit_line(samples, npix, krej, ngrow, maxiter):
         threshold = sigma * krej
 
         # Detect and reject pixels further than k*sigma from the fitted line
-        lcut = -threshold
-        hcut = threshold
-        below = np.where(flat < lcut)
-        above = np.where(flat > hcut)
-
-        badpix[below] = BAD_PIXEL
-        badpix[above] = BAD_PIXEL
-
-        # Convolve with a kernel of length ngrow
-        kernel = np.ones(ngrow, dtype=np.int)
-        badpix = np.convolve(badpix, kernel, mode='same')
+        badpix |= (flat < -threshold) | (flat > threshold)
 
-        ngoodpix = len(np.where(badpix == GOOD_PIXEL)[0])
+        # Grow the rejected pixels by a window of length ngrow
+        badpix = zsc_grow_mask(badpix, ngrow)
 
-        niter += 1
+        ngoodpix = npix - np.count_nonzero(badpix)
 
     # Transform the line coefficients back to the X range [0:npix-1]
     zstart = intercept - slope
@@ -178,13 +187,13 @@ def zsc_fit_line(samples, npix, krej, ngrow, maxiter):
 def zsc_compute_sigma(flat, badpix, npix):
 
     # Compute the rms deviation from the mean of a flattened array.
-    # Ignore rejected pixels
+    # Ignore rejected pixels (nonzero in badpix)
 
     # Accumulate sum and sum of squares
-    goodpixels = np.where(badpix == GOOD_PIXEL)
-    sumz = flat[goodpixels].sum()
-    sumsq = (flat[goodpixels] * flat[goodpixels]).sum()
-    ngoodpix = len(goodpixels[0])
+    goodflat = flat[badpix == GOOD_PIXEL]
+    sumz = goodflat.sum()
+    sumsq = np.dot(goodflat, goodflat)
+    ngoodpix = len(goodflat)
     if ngoodpix == 0:
         mean = None
         sigma = None
@@ -68,6 +68,7 @@ package_info['package_data'].setdefault(PACKAGENAME, [])
 package_info['package_data'][PACKAGENAME].append('examples/*/*')
 package_info['package_data'][PACKAGENAME].append('web/pgw/js/*.js')
 package_info['package_data'][PACKAGENAME].append('web/pgw/js/*.css')
+package_info['package_data'][PACKAGENAME].append('*.npz')
 
 # Define entry points for command-line scripts
 entry_points = {'console_scripts': []}